@@ -10,11 +10,16 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# `manage.py test` : cache local et stockage statique simple (voir CACHES, STORAGES)
+TESTING = sys.argv[1:2] == ['test']
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -37,6 +42,11 @@ EMAIL_HOST_PASSWORD = 'aexn wubx hzju vfsk '
 DEFAULT_FROM_EMAIL = 'laruevirgil@gmail.com'
 SERVER_EMAIL = 'laruevirgil@gmail.com'
 
+# File d'envoi des actions en masse (stages.emails.send_queued, commande send_queued_emails)
+EMAIL_QUEUE_MAX_ATTEMPTS = int(os.environ.get('EMAIL_QUEUE_MAX_ATTEMPTS', 5))
+# Nombre maximal d'éléments par requête d'action en masse
+BULK_ACTION_MAX_ITEMS = int(os.environ.get('BULK_ACTION_MAX_ITEMS', 1000))
+
 # CSRF Configuration for cross-origin
 CSRF_TRUSTED_ORIGINS = [
     'http://localhost:5173',
@@ -62,6 +72,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'stages.middleware.MetricsMiddleware',
+    'stages.middleware.ServerTimingMiddleware',
+    'stages.middleware.SlowQueryMiddleware',
+    'stages.middleware.ReportRoutingMiddleware',
+    'stages.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -70,13 +85,76 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'stages.middleware.NPlusOneMiddleware',
 ]
 
+# Détection des requêtes N+1 (voir stages/nplusone.py) : en-tête X-NPlusOne en développement,
+# exception si NPLUSONE_RAISE. Une forme de requête répétée NPLUSONE_THRESHOLD fois est signalée.
+# NPLUSONE_ENABLED = None : actif si DEBUG
+NPLUSONE_ENABLED = None
+NPLUSONE_RAISE = False
+NPLUSONE_THRESHOLD = 5
+
+# Métriques Prometheus (/metrics, voir stages/metrics.py). Accès : compte staff ou
+# en-tête « Authorization: Bearer <METRICS_TOKEN> ». Avec un serveur préforké (gunicorn),
+# METRICS_DIR doit pointer vers un répertoire partagé par les workers, vidé au démarrage.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = 1.0
+
+# Requêtes SQL lentes (voir stages/slowqueries.py) : seuil en millisecondes (vide = désactivé),
+# journal tournant relu par la page admin/slow-queries/
+SLOW_QUERY_THRESHOLD_MS = os.environ.get('SLOW_QUERY_THRESHOLD_MS', '100')
+SLOW_QUERY_THRESHOLD_MS = float(SLOW_QUERY_THRESHOLD_MS) if SLOW_QUERY_THRESHOLD_MS else None
+LOG_DIR = Path(os.environ.get('LOG_DIR') or BASE_DIR / 'logs')
+SLOW_QUERY_LOG = LOG_DIR / 'slow_queries.log'
+os.makedirs(LOG_DIR, exist_ok=True)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'delay': True,
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'stages.slowqueries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+# Fraction des requêtes mesurées (en-tête Server-Timing + log JSON 'stages.timing', voir stages/timing.py)
+SERVER_TIMING_SAMPLE_RATE = float(os.environ.get('SERVER_TIMING_SAMPLE_RATE', 1.0 if DEBUG else 0.01))
+
+# Compression des réponses de l'API (stages/middleware.py, CompressionMiddleware) : codages
+# par ordre de préférence (zstd et br si zstandard / Brotli sont installés), niveaux, taille minimale
+COMPRESSION_PATH_PREFIXES = ('/api/',)
+COMPRESSION_ENCODINGS = os.environ.get('COMPRESSION_ENCODINGS', 'zstd,br,gzip').split(',')
+COMPRESSION_LEVELS = {'zstd': 3, 'br': 4, 'gzip': 6}
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+
 ROOT_URLCONF = 'config.urls'
 
+# Budget d'import de l'URLconf au démarrage d'un worker (commande check_import_time)
+IMPORT_TIME_BUDGET_MS = float(os.environ.get('IMPORT_TIME_BUDGET_MS', 300))
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates avec mesure du temps de rendu (Server-Timing)
+        'BACKEND': 'stages.timing.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -95,12 +173,96 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# SQLite : journal WAL (les lectures ne bloquent plus derrière une écriture), attente du verrou
+# (busy_timeout) au lieu d'une erreur immédiate, et transactions IMMEDIATE : le verrou d'écriture est
+# pris dès le BEGIN, sans échec lors du passage lecture -> écriture. Réglages par variables d'environnement.
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 128 * 1024 * 1024)),
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_SIZE_KB', 20 * 1024)),  # négatif : en Kio, par connexion
+    'temp_store': 'MEMORY',
+}
+
+# DB_ENGINE=postgresql : PostgreSQL (pip install 'psycopg[binary]'), connexions persistantes
+# (DB_CONN_MAX_AGE secondes, vérifiées avant réutilisation) ou, si DB_POOL_MAX_SIZE > 0,
+# pool psycopg (pip install 'psycopg[pool]') ; CONN_MAX_AGE est alors forcé à 0.
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'stages'),
+            'USER': os.environ.get('DB_USER', 'stages'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
+            'OPTIONS': {},
+        }
+    }
+    DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 0))
+    if DB_POOL_MAX_SIZE:
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME') or BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                'transaction_mode': os.environ.get('SQLITE_TRANSACTION_MODE', 'IMMEDIATE'),
+                'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            },
+        }
+    }
+
+# Lectures des rapports sur l'alias 'reports' (voir stages/dbrouter.py) : réplique PostgreSQL
+# (DB_REPLICA_HOST / DB_REPLICA_PORT) ou, sous SQLite, instantané recopié par
+# `refresh_reports_snapshot --loop` (toutes les REPORTS_SNAPSHOT_MAX_AGE / 2 secondes par défaut).
+# Sans réplique configurée, ou tant que l'instantané n'existe pas, tout reste sur 'default'.
+REPORTS_SNAPSHOT_MAX_AGE = int(os.environ.get('REPORTS_SNAPSHOT_MAX_AGE', 300))
+if DB_ENGINE == 'postgresql':
+    REPORTS_SNAPSHOT_PATH = None
+    DATABASES['reports'] = {
+        **DATABASES['default'],
+        'HOST': os.environ.get('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+    }
+else:
+    REPORTS_SNAPSHOT_PATH = os.environ.get('REPORTS_SNAPSHOT_PATH') or str(BASE_DIR / 'db.reports.sqlite3')
+    DATABASES['reports'] = {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': REPORTS_SNAPSHOT_PATH,
+        'OPTIONS': {'init_command': f"PRAGMA query_only=ON;PRAGMA mmap_size={SQLITE_PRAGMAS['mmap_size']}"},
     }
-}
+DATABASES['reports']['TEST'] = {'MIRROR': 'default'}
+DATABASE_ROUTERS = ['stages.dbrouter.ReportRouter']
+
+# Vues dont les lectures passent par 'reports', et durée pendant laquelle un client qui
+# vient d'écrire relit la base principale (au moins l'âge maximal de l'instantané)
+REPORT_VIEWS = [
+    'api-dashboard-stats',
+    'api-async-dashboard-stats',
+    'api-report-candidatures-per-student',
+    'api-candidature-export-all-pdf',
+    'api-offer-export-pdf',
+    'admin_dashboard',
+    'admin_student_report',
+    'export_candidates_csv',
+]
+REPORTS_STICKY_SECONDS = int(os.environ.get('REPORTS_STICKY_SECONDS', REPORTS_SNAPSHOT_MAX_AGE))
+
+# Vues d'écriture rejouées sur « database is locked » (voir stages/dbretry.py)
+DB_LOCK_RETRY_ATTEMPTS = int(os.environ.get('DB_LOCK_RETRY_ATTEMPTS', 5))
+DB_LOCK_RETRY_DELAY = float(os.environ.get('DB_LOCK_RETRY_DELAY', 0.05))
 
 
 # Password validation
@@ -141,6 +303,22 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# collectstatic écrit des noms à empreinte et leurs variantes .gz / .br (stages/assets.py),
+# servis par Django avec Cache-Control immutable. Les tests rendent les gabarits sans
+# avoir lancé collectstatic : stockage simple.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage' if TESTING
+        else 'stages.assets.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Application React construite (VITE_BASE=/app/ npm run build && python manage.py precompress_assets)
+SPA_ROOT = BASE_DIR / 'dist'
+SPA_URL = 'app/'
+SPA_INDEX_MAX_AGE = int(os.environ.get('SPA_INDEX_MAX_AGE', 60))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -150,6 +328,49 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'home'
 
+# Cache à deux niveaux (stages/cache.py) : LRU par processus devant un cache partagé
+# entre les workers. CACHE_BACKEND : 'file' (CACHE_LOCATION : répertoire), 'redis'
+# (CACHE_LOCATION : URL redis://) ou 'locmem' (un seul processus ; par défaut sous `manage.py test`,
+# pour que les tests ne relisent pas le cache d'une exécution précédente).
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem' if TESTING else 'file')
+SHARED_CACHES = {
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION') or str(BASE_DIR / 'cache'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'redis://127.0.0.1:6379/1'),
+    },
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'stages-shared',
+    },
+}
+CACHES = {
+    'default': {
+        'BACKEND': 'stages.cache.TieredCache',
+        'LOCATION': 'shared',
+        'TIMEOUT': int(os.environ.get('CACHE_TIMEOUT', 300)),
+        'OPTIONS': {
+            'LOCAL_TIMEOUT': float(os.environ.get('CACHE_LOCAL_TIMEOUT', 5)),
+            'LOCAL_MAX_ENTRIES': int(os.environ.get('CACHE_LOCAL_MAX_ENTRIES', 1000)),
+        },
+    },
+    'shared': {**SHARED_CACHES[CACHE_BACKEND], 'KEY_PREFIX': 'stages'},
+}
+
+# Sessions : 'cached_db' (cache + base en secours), 'signed_cookies' (aucun accès base),
+# 'cache' ou 'db' (comportement historique)
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + os.environ.get('SESSION_BACKEND', 'cached_db')
+# Directement sur le niveau partagé : une déconnexion doit valoir tout de suite pour tous les workers
+SESSION_CACHE_ALIAS = 'shared'
+
+# Durée de validité (secondes) du profil utilisateur mis en cache dans la session
+# (id, rôle, champs d'affichage) servi par /api/auth/me/
+SESSION_USER_CACHE_TTL = int(os.environ.get('SESSION_USER_CACHE_TTL', 300))
+
 # Cookie settings for same-site (same IP, different ports)
 SESSION_COOKIE_SAMESITE = 'Lax'
 SESSION_COOKIE_HTTPONLY = True
@@ -161,6 +382,12 @@ CSRF_COOKIE_SAMESITE = 'Lax'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Téléchargement protégé des CV : 'python' (FileResponse), 'nginx' (X-Accel-Redirect)
+# ou 'xsendfile' (X-Sendfile, Apache/lighttpd). Pour nginx :
+#   location /protected-media/ { internal; alias /chemin/vers/media/; }
+SENDFILE_BACKEND = os.environ.get('SENDFILE_BACKEND', 'python')
+SENDFILE_URL_PREFIX = os.environ.get('SENDFILE_URL_PREFIX', '/protected-media/')
+
 # CORS Configuration
 CORS_ALLOWED_ORIGINS = [
     'http://localhost:5173',
@@ -196,10 +423,26 @@ CORS_ALLOW_METHODS = [
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'stages.authentication.SignedTokenAuthentication',
         'stages.authentication.CsrfExemptSessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
+    # orjson si installé, même JSON que les classes de DRF (voir stages/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'stages.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'stages.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
-MEDIA_ROOT = BASE_DIR / 'media'
\ No newline at end of file
+
+# Jetons signés (HMAC SECRET_KEY) pour l'API : durée de vie en secondes
+ACCESS_TOKEN_TTL = int(os.environ.get('ACCESS_TOKEN_TTL', 15 * 60))
+REFRESH_TOKEN_TTL = int(os.environ.get('REFRESH_TOKEN_TTL', 7 * 24 * 3600))
+
+MEDIA_ROOT = BASE_DIR / 'media'
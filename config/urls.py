@@ -1,14 +1,20 @@
 from django.contrib import admin
-from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
+from django.urls import path, re_path, include
+from stages import assets
+from stages.views import metrics
 
 urlpatterns = [
     path('', include('stages.urls')),
+    path('api/async/', include('stages.async_urls')),
     path('api/', include('stages.api_urls')),
     path('admin/', admin.site.urls),
     path('accounts/', include('django.contrib.auth.urls')),
+    path('metrics', metrics, name='metrics'),
+    # Précompressés, sans proxy (stages/assets.py) ; sous runserver, staticfiles sert STATIC_URL avant
+    re_path(rf'^{settings.STATIC_URL.strip("/")}/(?P<path>.+)$', assets.static_file, name='static-file'),
+    re_path(rf'^{settings.SPA_URL.strip("/")}/(?P<path>.*)$', assets.spa, name='spa'),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+# Les fichiers media (CV) ne sont plus servis publiquement :
+# voir stages.views.download_student_cv (X-Accel-Redirect / X-Sendfile / FileResponse)
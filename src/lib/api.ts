@@ -23,6 +23,7 @@ export interface StageOffer {
   closing_reason: string | null;
   candidature_count: number;
   has_applied: boolean;
+  is_favorite: boolean;
   company: number | null;
   company_name: string | null;
   city?: string;
@@ -56,6 +57,20 @@ export interface DashboardStats {
   candidatures_by_month: Array<{ month: string; count: number }>;
 }
 
+export interface BulkResult<R extends string> {
+  updated: number;
+  results: Array<{ id: number; result: R }>;
+}
+
+export interface BulkModerationResult extends BulkResult<'updated' | 'unchanged' | 'not_found'> {
+  action: 'validate' | 'refuse';
+  state: StageOffer['state'];
+}
+
+export interface BulkStatusResult extends BulkResult<'updated' | 'unchanged' | 'not_found'> {
+  status: Candidature['status'];
+}
+
 class ApiClient {
   private baseUrl: string;
   private csrfToken: string | null = null;
@@ -196,6 +211,13 @@ class ApiClient {
     });
   }
 
+  async bulkModerateOffers(ids: number[], action: 'validate' | 'refuse'): Promise<BulkModerationResult> {
+    return this.request<BulkModerationResult>('/offers/bulk-moderate/', {
+      method: 'POST',
+      body: JSON.stringify({ ids, action }),
+    });
+  }
+
   async getOfferCandidates(offerId: number): Promise<Candidature[]> {
     return this.request<Candidature[]>(`/offers/${offerId}/candidates/`);
   }
@@ -221,6 +243,13 @@ class ApiClient {
     });
   }
 
+  async bulkUpdateCandidatureStatus(ids: number[], status: Candidature['status']): Promise<BulkStatusResult> {
+    return this.request<BulkStatusResult>('/candidatures/bulk-status/', {
+      method: 'POST',
+      body: JSON.stringify({ ids, status }),
+    });
+  }
+
   async exportAllCandidaturesPDF(): Promise<Blob> {
     const response = await fetch(`${this.baseUrl}/candidatures/export_all_pdf/`, {
       method: 'GET',
@@ -259,6 +288,10 @@ class ApiClient {
     return this.request<StageOffer[]>('/favorites/');
   }
 
+  async getFavoriteIds(): Promise<{ ids: number[] }> {
+    return this.request<{ ids: number[] }>('/favorites/ids/');
+  }
+
   async toggleFavorite(offerId: number): Promise<{ message: string; is_favorite: boolean }> {
     return this.request<{ message: string; is_favorite: boolean }>(`/favorites/${offerId}/toggle/`, {
       method: 'POST',
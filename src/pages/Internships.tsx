@@ -39,6 +39,8 @@ const Internships = () => {
       
       const data = await api.getOffers(params.toString() ? `?${params.toString()}` : '');
       setOffers(data);
+      // is_favorite est calculé par l'API pour l'étudiant connecté
+      setFavorites(new Set(data.filter((offer: StageOffer) => offer.is_favorite).map((offer: StageOffer) => offer.id)));
     } catch (error: any) {
       console.error("Failed to load offers:", error);
       if (error.message.includes("Authentication")) {
@@ -55,21 +57,8 @@ const Internships = () => {
 
   useEffect(() => {
     loadOffers();
-    if (user && user.role === 'Etudiant') {
-      loadFavorites();
-    }
   }, []);
 
-  const loadFavorites = async () => {
-    try {
-      const data = await api.getFavorites();
-      const favoriteIds = new Set(data.map((offer: StageOffer) => offer.id));
-      setFavorites(favoriteIds);
-    } catch (error) {
-      console.error('Failed to load favorites:', error);
-    }
-  };
-
   const toggleFavorite = async (offerId: number) => {
     try {
       const result = await api.toggleFavorite(offerId);
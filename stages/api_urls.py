@@ -12,10 +12,14 @@ urlpatterns = [
     path('auth/register/', api_views.register_user, name='api-register'),
     path('auth/login/', api_views.login_user, name='api-login'),
     path('auth/logout/', api_views.logout_user, name='api-logout'),
+    path('auth/token/', api_views.obtain_token, name='api-token'),
+    path('auth/token/refresh/', api_views.refresh_token, name='api-token-refresh'),
     path('auth/me/', api_views.current_user, name='api-current-user'),
     path('profile/', api_views.student_profile, name='api-student-profile'),
     path('dashboard/stats/', api_views.dashboard_stats, name='api-dashboard-stats'),
+    path('reports/candidatures-per-student/', api_views.candidatures_per_student_report, name='api-report-candidatures-per-student'),
     path('favorites/', api_views.favorites_view, name='api-favorites'),
+    path('favorites/ids/', api_views.favorite_ids, name='api-favorite-ids'),
     path('favorites/<int:offer_id>/check/', api_views.is_favorite, name='api-is-favorite'),
     path('favorites/<int:offer_id>/toggle/', api_views.toggle_favorite, name='api-toggle-favorite'),
 ]
@@ -1,18 +1,134 @@
 from rest_framework import viewsets, status, permissions
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes, authentication_classes
 from rest_framework.response import Response
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from django.conf import settings
 from django.contrib.auth.models import User, Group
-from django.contrib.auth import authenticate, login, logout
-from django.db.models import Count, Q
+from django.contrib.auth import authenticate, login, logout, get_user
+from django.db import transaction
+from django.db.models import BooleanField, Count, Exists, OuterRef, Q, Value
 from django.utils import timezone
 from django.middleware.csrf import get_token
 from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from datetime import timedelta
+import hashlib
 from .models import StageOffer, Candidature, StudentProfile, Favorite
 from .serializers import StageOfferSerializer, CandidatureSerializer, UserSerializer, StudentProfileSerializer
-from . import emails
-from .pdf_generator import generate_offer_pdf, generate_candidatures_summary_pdf
+from . import reports, cv_index
+from .authentication import (
+    SignedTokenAuthentication, cache_user_payload, get_cached_user_payload,
+    get_user_role, issue_tokens, refresh_tokens,
+)
+from .metrics import OFFER_VALIDATIONS
+from .dbretry import retry_on_lock
+from .cache import STUDENT_FAVORITES_NAMESPACE, bump_for_model, cached
+from .lazy import lazy_import
+
+# Chargés au premier envoi / export : ReportLab ne ralentit pas le démarrage des workers
+emails = lazy_import('stages.emails')
+pdf_generator = lazy_import('stages.pdf_generator')
+
+# Actions de modération : action -> nouvel état de l'offre
+OFFER_MODERATION_STATES = {'validate': 'Validée', 'refuse': 'Refusée'}
+
+
+def bulk_ids(data):
+    """
+    Identifiants d'une action en masse : liste non vide d'entiers (au plus
+    BULK_ACTION_MAX_ITEMS), dédoublonnée dans l'ordre. ValueError sinon.
+    """
+    ids = data.get('ids')
+    if not isinstance(ids, list) or not ids:
+        raise ValueError("'ids' doit être une liste non vide d'identifiants")
+    if len(ids) > settings.BULK_ACTION_MAX_ITEMS:
+        raise ValueError(f'Au plus {settings.BULK_ACTION_MAX_ITEMS} identifiants par requête')
+    try:
+        parsed = [int(pk) for pk in ids if not isinstance(pk, bool)]
+    except (TypeError, ValueError):
+        raise ValueError('Identifiants invalides')
+    if len(parsed) != len(ids):
+        raise ValueError('Identifiants invalides')
+    return list(dict.fromkeys(parsed))
+
+
+def offer_queryset(user, role, params):
+    """
+    Offres visibles par l'utilisateur selon son rôle, filtrées par les paramètres
+    de recherche (search, city, duration, domain, remote). Partagé par
+    StageOfferViewSet et les vues asynchrones (async_views.py).
+    """
+    queryset = StageOffer.objects.all()
+    
+    # Search functionality (apply first)
+    search = params.get('search', None)
+    if search:
+        queryset = queryset.filter(
+            Q(title__icontains=search) |
+            Q(description__icontains=search) |
+            Q(organisme__icontains=search)
+        )
+    
+    # Advanced filters
+    city = params.get('city', None)
+    if city:
+        queryset = queryset.filter(city__icontains=city)
+    
+    duration = params.get('duration', None)
+    if duration:
+        queryset = queryset.filter(duration=duration)
+    
+    domain = params.get('domain', None)
+    if domain:
+        queryset = queryset.filter(domain=domain)
+    
+    remote = params.get('remote', None)
+    if remote and remote.lower() == 'true':
+        queryset = queryset.filter(remote=True)
+    elif remote and remote.lower() == 'false':
+        queryset = queryset.filter(remote=False)
+    
+    if not user.is_authenticated:
+        # Return all validated offers for anonymous users
+        return queryset.filter(state='Validée').order_by('-date_depot')
+    
+    # Filter based on role
+    if role == 'Etudiant':
+        queryset = queryset.filter(state='Validée')
+    elif role == 'Responsable':
+        queryset = queryset.filter(Q(state='En attente validation') | Q(state='Validée'))
+    elif role == 'Entreprise':
+        # Show offers where company=user OR contact_email=user.email
+        queryset = queryset.filter(Q(company=user) | Q(contact_email=user.email))
+    
+    return queryset.order_by('-date_depot')
+
+
+def annotate_favorited(queryset, user):
+    """
+    is_favorite des offres en une sous-requête EXISTS. Sans condition de rôle : seuls les
+    membres du groupe Etudiant créent des favoris, quel que soit leur premier groupe.
+    """
+    if user.is_authenticated:
+        favorited = Exists(Favorite.objects.filter(offer=OuterRef('pk'), student=user))
+    else:
+        favorited = Value(False, output_field=BooleanField())
+    return queryset.annotate(favorited=favorited)
+
+
+def annotate_offers(queryset, user):
+    """
+    Ajoute ce que StageOfferSerializer lirait offre par offre (entreprise, nombre de
+    candidatures, candidature existante, favori)
+    """
+    if user.is_authenticated:
+        applied = Exists(Candidature.objects.filter(offer=OuterRef('pk'), student=user))
+    else:
+        applied = Value(False, output_field=BooleanField())
+    queryset = queryset.select_related('company').annotate(num_candidatures=Count('candidature'), applied=applied)
+    return annotate_favorited(queryset, user)
 
 
 class StageOfferViewSet(viewsets.ModelViewSet):
@@ -25,55 +141,12 @@ class StageOfferViewSet(viewsets.ModelViewSet):
         return [IsAuthenticated()]
     
     def get_queryset(self):
-        queryset = StageOffer.objects.all()
         user = self.request.user
-        
-        # Search functionality (apply first)
-        search = self.request.query_params.get('search', None)
-        if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search) |
-                Q(description__icontains=search) |
-                Q(organisme__icontains=search)
-            )
-        
-        # Advanced filters
-        city = self.request.query_params.get('city', None)
-        if city:
-            queryset = queryset.filter(city__icontains=city)
-        
-        duration = self.request.query_params.get('duration', None)
-        if duration:
-            queryset = queryset.filter(duration=duration)
-        
-        domain = self.request.query_params.get('domain', None)
-        if domain:
-            queryset = queryset.filter(domain=domain)
-        
-        remote = self.request.query_params.get('remote', None)
-        if remote and remote.lower() == 'true':
-            queryset = queryset.filter(remote=True)
-        elif remote and remote.lower() == 'false':
-            queryset = queryset.filter(remote=False)
-        
-        if not user.is_authenticated:
-            # Return all validated offers for anonymous users
-            return queryset.filter(state='Validée').order_by('-date_depot')
-        
-        # Get user role
-        user_groups = user.groups.all()
-        user_role = user_groups[0].name if user_groups.exists() else None
-        
-        # Filter based on role
-        if user_role == 'Etudiant':
-            queryset = queryset.filter(state='Validée')
-        elif user_role == 'Responsable':
-            queryset = queryset.filter(Q(state='En attente validation') | Q(state='Validée'))
-        elif user_role == 'Entreprise':
-            # Show offers where company=user OR contact_email=user.email
-            queryset = queryset.filter(Q(company=user) | Q(contact_email=user.email))
-        
-        return queryset.order_by('-date_depot')
+        queryset = offer_queryset(user, get_user_role(user), self.request.query_params)
+        # Lectures seulement : les actions qui écrivent verrouillent l'offre (pas de GROUP BY)
+        if self.action in ('list', 'retrieve'):
+            return annotate_offers(queryset, user)
+        return annotate_favorited(queryset, user)
     
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -81,8 +154,7 @@ class StageOfferViewSet(viewsets.ModelViewSet):
         
         # If user is authenticated and is a company, link the offer
         if request.user.is_authenticated:
-            user_groups = request.user.groups.all()
-            if user_groups.exists() and user_groups[0].name == 'Entreprise':
+            if get_user_role(request.user) == 'Entreprise':
                 serializer.save(company=request.user)
             else:
                 serializer.save()
@@ -100,42 +172,53 @@ class StageOfferViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
     
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    @retry_on_lock
     def apply(self, request, pk=None):
         offer = self.get_object()
         user = request.user
         
         # Check if user is a student
-        user_groups = user.groups.all()
-        if not user_groups.exists() or user_groups[0].name != 'Etudiant':
+        if get_user_role(user) != 'Etudiant':
             return Response(
                 {'error': 'Seuls les étudiants peuvent candidater'},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # Check if offer is validated
-        if offer.state != 'Validée':
-            return Response(
-                {'error': "Cette offre n'est pas disponible pour candidature"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Check if already applied
-        if Candidature.objects.filter(student=user, offer=offer).exists():
-            return Response(
-                {'error': 'Vous avez déjà candidaté à cette offre'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Check if offer has less than 5 candidates
-        candidature_count = offer.candidature_set.count()
-        if candidature_count >= 5:
-            return Response(
-                {'error': 'Cette offre a atteint le nombre maximum de candidatures'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Create candidature
-        candidature = Candidature.objects.create(student=user, offer=offer)
+        # Checks and creation in one transaction (IMMEDIATE under SQLite, row lock under
+        # PostgreSQL): two concurrent applications cannot both pass the 5-candidature cap
+        with transaction.atomic():
+            offer = StageOffer.objects.select_for_update().get(pk=offer.pk)
+            
+            # Check if offer is validated
+            if offer.state != 'Validée':
+                return Response(
+                    {'error': "Cette offre n'est pas disponible pour candidature"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            # Check if already applied
+            if Candidature.objects.filter(student=user, offer=offer).exists():
+                return Response(
+                    {'error': 'Vous avez déjà candidaté à cette offre'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            # Check if offer has less than 5 candidates
+            candidature_count = offer.candidature_set.count()
+            if candidature_count >= 5:
+                return Response(
+                    {'error': 'Cette offre a atteint le nombre maximum de candidatures'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            # Create candidature, and close the offer on the 5th one
+            candidature = Candidature.objects.create(student=user, offer=offer)
+            closed = candidature_count + 1 >= 5
+            if closed:
+                offer.state = 'Clôturée'
+                offer.closing_reason = 'Nombre maximum de candidatures atteint (5)'
+                # Only these fields: a concurrent edit of the offer is kept
+                offer.save(update_fields=['state', 'closing_reason'])
         
         # Send confirmation emails
         try:
@@ -144,11 +227,7 @@ class StageOfferViewSet(viewsets.ModelViewSet):
         except Exception as e:
             print(f"Failed to send emails: {e}")
         
-        # Check if this is the 5th candidature and close the offer
-        if offer.candidature_set.count() >= 5:
-            offer.state = 'Clôturée'
-            offer.closing_reason = 'Nombre maximum de candidatures atteint (5)'
-            offer.save()
+        if closed:
             # Send email to company
             try:
                 emails.send_offer_closed_email(offer)
@@ -174,6 +253,7 @@ class StageOfferViewSet(viewsets.ModelViewSet):
         if action_type == 'validate':
             offer.state = 'Validée'
             offer.save()
+            OFFER_VALIDATIONS.inc(action='validate')
             # Send validation email
             try:
                 emails.send_offer_validated_email(offer)
@@ -182,6 +262,7 @@ class StageOfferViewSet(viewsets.ModelViewSet):
         elif action_type == 'refuse':
             offer.state = 'Refusée'
             offer.save()
+            OFFER_VALIDATIONS.inc(action='refuse')
             # Send refusal email
             try:
                 emails.send_offer_refused_email(offer)
@@ -196,14 +277,65 @@ class StageOfferViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(offer)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['post'], url_path='bulk-moderate', permission_classes=[IsAuthenticated])
+    @retry_on_lock
+    def bulk_moderate(self, request):
+        """
+        Validation ou refus de plusieurs offres : {"ids": [...], "action": "validate" | "refuse"}.
+        Un seul UPDATE dans une transaction, e-mails mis en file (commande send_queued_emails).
+        Résultat par offre : "updated", "unchanged" (déjà dans cet état) ou "not_found".
+        """
+        if not request.user.is_staff:
+            return Response(
+                {'error': 'Seuls les administrateurs peuvent valider des offres'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        action_type = request.data.get('action')
+        new_state = OFFER_MODERATION_STATES.get(action_type)
+        if new_state is None:
+            return Response(
+                {'error': 'Action invalide'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            ids = bulk_ids(request.data)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        with transaction.atomic():
+            # Lignes verrouillées jusqu'au COMMIT (PostgreSQL) : une modération concurrente
+            # attend, puis voit l'état déjà changé
+            offers = {
+                offer.pk: offer
+                for offer in StageOffer.objects.select_for_update().filter(pk__in=ids)
+                .only('pk', 'state', 'title', 'organisme', 'contact_name', 'contact_email')
+            }
+            to_update = [pk for pk in ids if pk in offers and offers[pk].state != new_state]
+            if to_update:
+                StageOffer.objects.filter(pk__in=to_update).update(state=new_state)
+                # update() ne déclenche pas post_save
+                bump_for_model(StageOffer)
+                build_message = (emails.offer_validated_message if action_type == 'validate'
+                                 else emails.offer_refused_message)
+                emails.queue_emails(f'offer_{action_type}d',
+                                    [build_message(offers[pk]) for pk in to_update])
+        OFFER_VALIDATIONS.inc(len(to_update), action=action_type)
+        
+        updated = set(to_update)
+        results = [
+            {'id': pk, 'result': 'updated' if pk in updated else 'unchanged' if pk in offers else 'not_found'}
+            for pk in ids
+        ]
+        return Response({'action': action_type, 'state': new_state, 'updated': len(to_update), 'results': results})
+    
     @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
     def candidates(self, request, pk=None):
         offer = self.get_object()
         user = request.user
         
         # Check permissions
-        user_groups = user.groups.all()
-        user_role = user_groups[0].name if user_groups.exists() else None
+        user_role = get_user_role(user)
         
         if user_role not in ['Responsable', 'Entreprise', 'Administrateur'] and not user.is_superuser:
             if user_role != 'Entreprise' or offer.company != user:
@@ -213,6 +345,12 @@ class StageOfferViewSet(viewsets.ModelViewSet):
                 )
         
         candidatures = offer.candidature_set.all()
+        
+        # Optional keyword search in extracted CV text, ranked by relevance
+        q = request.query_params.get('q')
+        if q:
+            candidatures = cv_index.rank_candidatures(candidatures, q)
+        
         serializer = CandidatureSerializer(candidatures, many=True, context={'request': request})
         return Response(serializer.data)
     
@@ -223,8 +361,7 @@ class StageOfferViewSet(viewsets.ModelViewSet):
         user = request.user
         
         # Check permissions - only admin or company manager can export
-        user_groups = user.groups.all()
-        user_role = user_groups[0].name if user_groups.exists() else None
+        user_role = get_user_role(user)
         
         if not (user.is_staff or user_role in ['Entreprise', 'Administrateur']):
             return Response(
@@ -233,7 +370,7 @@ class StageOfferViewSet(viewsets.ModelViewSet):
             )
         
         # Generate PDF
-        pdf = generate_offer_pdf(offer)
+        pdf = pdf_generator.generate_offer_pdf(offer)
         
         # Return PDF as response
         response = HttpResponse(pdf, content_type='application/pdf')
@@ -250,8 +387,7 @@ class CandidatureViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         user = self.request.user
-        user_groups = user.groups.all()
-        user_role = user_groups[0].name if user_groups.exists() else None
+        user_role = get_user_role(user)
         
         if user_role == 'Etudiant':
             return Candidature.objects.filter(student=user).order_by('-date_candidature')
@@ -271,6 +407,7 @@ class CandidatureViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
     
     @action(detail=True, methods=['post'])
+    @retry_on_lock
     def withdraw(self, request, pk=None):
         candidature = self.get_object()
         
@@ -281,24 +418,25 @@ class CandidatureViewSet(viewsets.ModelViewSet):
             )
         
         offer = candidature.offer
-        candidature.delete()
-        
-        # If offer was closed, reopen it
-        if offer.state == 'Clôturée' and offer.candidature_set.count() < 5:
-            offer.state = 'Validée'
-            offer.closing_reason = ''
-            offer.save()
+        with transaction.atomic():
+            candidature.delete()
+            
+            # If offer was closed, reopen it
+            if offer.state == 'Clôturée' and offer.candidature_set.count() < 5:
+                offer.state = 'Validée'
+                offer.closing_reason = ''
+                offer.save()
         
         return Response(status=status.HTTP_204_NO_CONTENT)
     
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    @retry_on_lock
     def update_status(self, request, pk=None):
         candidature = self.get_object()
         user = request.user
         
         # Check permissions (company or admin)
-        user_groups = user.groups.all()
-        user_role = user_groups[0].name if user_groups.exists() else None
+        user_role = get_user_role(user)
         
         if user_role not in ['Entreprise', 'Administrateur'] and not user.is_superuser:
             return Response(
@@ -333,6 +471,63 @@ class CandidatureViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(candidature)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['post'], url_path='bulk-status', permission_classes=[IsAuthenticated])
+    @retry_on_lock
+    def bulk_status(self, request):
+        """
+        Changement de statut de plusieurs candidatures : {"ids": [...], "status": "Acceptée" | ...}.
+        Propriété vérifiée par la requête elle-même (get_queryset), un seul UPDATE, e-mails mis en file.
+        Résultat par candidature : "updated", "unchanged" (déjà ce statut) ou "not_found"
+        (inexistante ou hors des offres de l'entreprise, comme pour update_status).
+        """
+        user = request.user
+        user_role = get_user_role(user)
+        
+        if user_role not in ['Entreprise', 'Administrateur'] and not user.is_superuser:
+            return Response(
+                {'error': 'Vous n\'avez pas la permission de modifier le statut'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        new_status = request.data.get('status')
+        if new_status not in ['Acceptée', 'Refusée', 'En attente']:
+            return Response(
+                {'error': 'Statut invalide'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            ids = bulk_ids(request.data)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        with transaction.atomic():
+            # Lignes verrouillées jusqu'au COMMIT (PostgreSQL ; sous SQLite, une écriture
+            # concurrente fait échouer la transaction, rejouée par retry_on_lock) :
+            # le statut lu ici est celui que l'UPDATE remplace
+            candidatures = {
+                candidature.pk: candidature
+                for candidature in self.get_queryset().order_by().filter(pk__in=ids)
+                .select_for_update(of=('self',)).select_related('offer', 'student')
+                .only('pk', 'status', 'offer__title', 'offer__organisme', 'offer__contact_email',
+                      'student__username', 'student__email')
+            }
+            to_update = [pk for pk in ids if pk in candidatures and candidatures[pk].status != new_status]
+            if to_update:
+                Candidature.objects.filter(pk__in=to_update).update(status=new_status)
+                # update() ne déclenche pas post_save
+                bump_for_model(Candidature)
+                for pk in to_update:
+                    candidatures[pk].status = new_status
+                emails.queue_emails('application_status',
+                                    [emails.application_status_message(candidatures[pk]) for pk in to_update])
+        
+        updated = set(to_update)
+        results = [
+            {'id': pk, 'result': 'updated' if pk in updated else 'unchanged' if pk in candidatures else 'not_found'}
+            for pk in ids
+        ]
+        return Response({'status': new_status, 'updated': len(to_update), 'results': results})
+    
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def export_all_pdf(self, request):
         """Export all candidatures as PDF (Admin only)"""
@@ -349,7 +544,7 @@ class CandidatureViewSet(viewsets.ModelViewSet):
         queryset = self.get_queryset()
         
         # Generate PDF
-        pdf = generate_candidatures_summary_pdf(queryset)
+        pdf = pdf_generator.generate_candidatures_summary_pdf(queryset)
         
         # Return PDF as response
         response = HttpResponse(pdf, content_type='application/pdf')
@@ -405,6 +600,7 @@ def register_user(request):
     login(request, user)
     
     serializer = UserSerializer(user)
+    cache_user_payload(request, serializer.data)
     return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
@@ -419,6 +615,7 @@ def login_user(request):
     if user is not None:
         login(request, user)
         serializer = UserSerializer(user)
+        cache_user_payload(request, serializer.data)
         return Response(serializer.data)
     else:
         return Response(
@@ -442,10 +639,64 @@ def logout_user(request):
     return Response({'message': 'Déconnexion réussie'})
 
 
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def obtain_token(request):
+    """Stateless auth: exchange credentials for a signed access/refresh token pair"""
+    user = authenticate(request, username=request.data.get('username'), password=request.data.get('password'))
+    if user is None:
+        return Response(
+            {'error': 'Identifiants invalides'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+    tokens = issue_tokens(user)
+    tokens['user'] = UserSerializer(user).data
+    return Response(tokens)
+
+
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def refresh_token(request):
+    token = request.data.get('refresh')
+    if not token:
+        return Response(
+            {'error': 'refresh est requis'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        return Response(refresh_tokens(token))
+    except AuthenticationFailed as e:
+        return Response(
+            {'error': str(e.detail)},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+
+
 @api_view(['GET'])
-@permission_classes([IsAuthenticated])
+@authentication_classes([SignedTokenAuthentication])
+@permission_classes([AllowAny])
 def current_user(request):
-    serializer = UserSerializer(request.user)
+    """
+    Answered from the signed access token, or from the payload cached in the
+    session at login/register time, so the most frequent authenticated call
+    does not touch auth_user / groups.
+    """
+    if request.user.is_authenticated:
+        return Response(UserSerializer(request.user).data)
+    
+    payload = get_cached_user_payload(request)
+    if payload is not None:
+        return Response(payload)
+    
+    # Old session or expired payload: resolve the user once and refresh the cache
+    user = get_user(request._request)
+    if not user.is_authenticated:
+        raise NotAuthenticated()
+    
+    serializer = UserSerializer(user)
+    cache_user_payload(request, serializer.data)
     return Response(serializer.data)
 
 
@@ -459,11 +710,11 @@ def student_profile(request):
         profile = StudentProfile.objects.create(user=request.user)
     
     if request.method == 'GET':
-        serializer = StudentProfileSerializer(profile)
+        serializer = StudentProfileSerializer(profile, context={'request': request})
         return Response(serializer.data)
     
     elif request.method == 'POST':
-        serializer = StudentProfileSerializer(profile, data=request.data, partial=True)
+        serializer = StudentProfileSerializer(profile, data=request.data, partial=True, context={'request': request})
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
@@ -474,8 +725,7 @@ def student_profile(request):
 @permission_classes([IsAuthenticated])
 def dashboard_stats(request):
     user = request.user
-    user_groups = user.groups.all()
-    user_role = user_groups[0].name if user_groups.exists() else None
+    user_role = get_user_role(user)
     
     if user_role not in ['Administrateur', 'Responsable'] and not user.is_superuser:
         return Response(
@@ -483,90 +733,131 @@ def dashboard_stats(request):
             status=status.HTTP_403_FORBIDDEN
         )
     
-    # Calculate statistics
-    total_offers = StageOffer.objects.count()
-    pending_offers = StageOffer.objects.filter(state='En attente validation').count()
-    validated_offers = StageOffer.objects.filter(state='Validée').count()
-    closed_offers = StageOffer.objects.filter(state='Clôturée').count()
-    refused_offers = StageOffer.objects.filter(state='Refusée').count()
-    
-    total_candidatures = Candidature.objects.count()
-    pending_candidatures = Candidature.objects.filter(status='En attente').count()
-    accepted_candidatures = Candidature.objects.filter(status='Acceptée').count()
-    refused_candidatures = Candidature.objects.filter(status='Refusée').count()
-    
-    # Candidatures by month for last 12 months
-    from datetime import datetime
-    from dateutil.relativedelta import relativedelta
-    
-    today = timezone.now()
-    candidatures_by_month = []
-    offers_by_month = []
-    
-    for i in range(12):
-        month_date = today - relativedelta(months=11-i)
-        month_start = month_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        month_end = (month_start + relativedelta(months=1))
-        
-        candidatures_count = Candidature.objects.filter(
-            date_candidature__gte=month_start,
-            date_candidature__lt=month_end
-        ).count()
-        
-        offers_count = StageOffer.objects.filter(
-            date_depot__gte=month_start,
-            date_depot__lt=month_end
-        ).count()
-        
-        candidatures_by_month.append({
-            'month': month_start.strftime('%b %Y'),
-            'count': candidatures_count
-        })
-        
-        offers_by_month.append({
-            'month': month_start.strftime('%b %Y'),
-            'count': offers_count
-        })
-    
-    # Top 5 des offres avec le plus de candidatures
-    top_offers = StageOffer.objects.annotate(
-        num_candidatures=Count('candidature')
-    ).order_by('-num_candidatures')[:5]
-    
-    top_offers_data = [
-        {
-            'title': offer.title,
-            'count': offer.num_candidatures
+    def compute():
+        # Calculate statistics
+        total_offers = StageOffer.objects.count()
+        pending_offers = StageOffer.objects.filter(state='En attente validation').count()
+        validated_offers = StageOffer.objects.filter(state='Validée').count()
+        closed_offers = StageOffer.objects.filter(state='Clôturée').count()
+        refused_offers = StageOffer.objects.filter(state='Refusée').count()
+
+        total_candidatures = Candidature.objects.count()
+        pending_candidatures = Candidature.objects.filter(status='En attente').count()
+        accepted_candidatures = Candidature.objects.filter(status='Acceptée').count()
+        refused_candidatures = Candidature.objects.filter(status='Refusée').count()
+
+        # Candidatures by month for last 12 months
+        from datetime import datetime
+        from dateutil.relativedelta import relativedelta
+
+        today = timezone.now()
+        candidatures_by_month = []
+        offers_by_month = []
+
+        for i in range(12):
+            month_date = today - relativedelta(months=11-i)
+            month_start = month_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            month_end = (month_start + relativedelta(months=1))
+
+            candidatures_count = Candidature.objects.filter(
+                date_candidature__gte=month_start,
+                date_candidature__lt=month_end
+            ).count()
+
+            offers_count = StageOffer.objects.filter(
+                date_depot__gte=month_start,
+                date_depot__lt=month_end
+            ).count()
+
+            candidatures_by_month.append({
+                'month': month_start.strftime('%b %Y'),
+                'count': candidatures_count
+            })
+
+            offers_by_month.append({
+                'month': month_start.strftime('%b %Y'),
+                'count': offers_count
+            })
+
+        # Top 5 des offres avec le plus de candidatures
+        top_offers = StageOffer.objects.annotate(
+            num_candidatures=Count('candidature')
+        ).order_by('-num_candidatures')[:5]
+
+        top_offers_data = [
+            {
+                'title': offer.title,
+                'count': offer.num_candidatures
+            }
+            for offer in top_offers
+        ]
+
+        # Stats par état de candidature
+        candidatures_by_status = [
+            {'status': 'En attente', 'count': pending_candidatures},
+            {'status': 'Acceptée', 'count': accepted_candidatures},
+            {'status': 'Refusée', 'count': refused_candidatures},
+        ]
+
+        return {
+            'total_offers': total_offers,
+            'pending_offers': pending_offers,
+            'validated_offers': validated_offers,
+            'closed_offers': closed_offers,
+            'refused_offers': refused_offers,
+            'total_candidatures': total_candidatures,
+            'pending_candidatures': pending_candidatures,
+            'accepted_candidatures': accepted_candidatures,
+            'refused_candidatures': refused_candidatures,
+            'candidatures_by_month': candidatures_by_month,
+            'offers_by_month': offers_by_month,
+            'top_offers': top_offers_data,
+            'candidatures_by_status': candidatures_by_status,
         }
-        for offer in top_offers
-    ]
+
+    # Recalculé après toute écriture sur les offres ou les candidatures (stages/cache.py)
+    return Response(cached(('offers', 'candidatures'), 'dashboard_stats', compute))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def candidatures_per_student_report(request):
+    """
+    Rapport paginé des candidatures par étudiant (?q=, ?sort=, ?page=, ?page_size=)
+    """
+    user = request.user
+    user_role = get_user_role(user)
+    
+    if user_role != 'Administrateur' and not user.is_superuser:
+        return Response(
+            {'error': 'Accès non autorisé'},
+            status=status.HTTP_403_FORBIDDEN
+        )
     
-    # Stats par état de candidature
-    candidatures_by_status = [
-        {'status': 'En attente', 'count': pending_candidatures},
-        {'status': 'Acceptée', 'count': accepted_candidatures},
-        {'status': 'Refusée', 'count': refused_candidatures},
-    ]
+    page, sort, search = reports.paginate_student_report(request.query_params)
     
     return Response({
-        'total_offers': total_offers,
-        'pending_offers': pending_offers,
-        'validated_offers': validated_offers,
-        'closed_offers': closed_offers,
-        'refused_offers': refused_offers,
-        'total_candidatures': total_candidatures,
-        'pending_candidatures': pending_candidatures,
-        'accepted_candidatures': accepted_candidatures,
-        'refused_candidatures': refused_candidatures,
-        'candidatures_by_month': candidatures_by_month,
-        'offers_by_month': offers_by_month,
-        'top_offers': top_offers_data,
-        'candidatures_by_status': candidatures_by_status,
+        'count': page.paginator.count,
+        'page': page.number,
+        'num_pages': page.paginator.num_pages,
+        'sort': sort,
+        'search': search,
+        'results': [
+            {
+                'student_id': stat.student_id,
+                'username': stat.student.username,
+                'email': stat.student.email,
+                'total': stat.total,
+                'last_candidature': stat.last_candidature,
+            }
+            for stat in page.object_list
+        ],
     })
 
 
 @api_view(['GET', 'POST', 'DELETE'])
 @permission_classes([IsAuthenticated])
+@retry_on_lock
 def favorites_view(request):
     """
     GET: Retourne la liste des offres favorites de l'étudiant
@@ -586,6 +877,8 @@ def favorites_view(request):
         # Récupérer tous les favoris avec les détails des offres
         favorites = Favorite.objects.filter(student=user).select_related('offer')
         offers = [fav.offer for fav in favorites]
+        for offer in offers:
+            offer.favorited = True
         serializer = StageOfferSerializer(offers, many=True)
         return Response(serializer.data)
     
@@ -644,6 +937,28 @@ def favorites_view(request):
             )
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def favorite_ids(request):
+    """
+    Identifiants des offres favorites de l'étudiant, en un seul appel.
+    Mis en cache jusqu'au prochain changement de ses favoris ; ETag (If-None-Match → 304).
+    """
+    user = request.user
+    
+    # Vide pour qui n'est pas dans le groupe Etudiant (aucun favori possible)
+    ids = cached(
+        (STUDENT_FAVORITES_NAMESPACE.format(user.pk),), f'favorite_ids:{user.pk}',
+        lambda: sorted(Favorite.objects.filter(student=user).values_list('offer_id', flat=True)),
+    )
+    
+    etag = quote_etag(hashlib.sha1(f'{user.pk}:{ids}'.encode()).hexdigest()[:20])
+    response = Response({"ids": ids})
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return get_conditional_response(request, etag=etag, response=response)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def is_favorite(request, offer_id):
@@ -661,6 +976,7 @@ def is_favorite(request, offer_id):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@retry_on_lock
 def toggle_favorite(request, offer_id):
     """
     Ajoute ou retire une offre des favoris
@@ -0,0 +1,167 @@
+"""
+Fichiers statiques et application React servis par Django, précompressés.
+
+- collectstatic (CompressedManifestStaticFilesStorage) écrit des noms à empreinte
+  (academic.3f2a9c1e0b7d.css) puis leurs variantes .gz et .br ;
+- après `npm run build` (noms à empreinte produits par Vite dans dist/assets),
+  `python manage.py precompress_assets` écrit les mêmes variantes pour dist/.
+
+serve_asset choisit la variante selon Accept-Encoding (br, puis gzip), sans
+compresser à la volée. Les fichiers à empreinte sont servis `immutable` pour un an ;
+index.html de l'application est mis en cache SPA_INDEX_MAX_AGE secondes, puis
+revalidé par ETag.
+"""
+import gzip
+import mimetypes
+import os
+import re
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+from .compression import parse_accept_encoding
+
+try:
+    import brotli
+except ImportError:  # dépendance optionnelle : seules les variantes gzip sont produites
+    brotli = None
+
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'public, no-cache'
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.mjs', '.map', '.json', '.svg', '.html', '.txt', '.xml', '.ico', '.ttf', '.eot'}
+# En dessous, l'en-tête Content-Encoding coûte plus qu'il ne rapporte
+COMPRESS_MIN_SIZE = 256
+
+# Ordre de préférence : (codage, extension de la variante)
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+# Empreinte ajoutée par ManifestStaticFilesStorage : nom.0123456789ab.ext
+MANIFEST_HASH_RE = re.compile(r'\.[0-9a-f]{12}\.[^.]+$')
+
+
+def compress_file(path):
+    """
+    Écrit path.gz (et path.br si brotli est installé) quand la variante est plus petite.
+    Retourne la liste des variantes écrites ; une variante plus récente que path est conservée.
+    """
+    if os.path.splitext(path)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+        return []
+    stat = os.stat(path)
+    if stat.st_size < COMPRESS_MIN_SIZE:
+        return []
+    compressors = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        compressors.append(('.br', lambda data: brotli.compress(data, quality=11)))
+
+    written = []
+    data = None
+    for extension, compress in compressors:
+        target = path + extension
+        try:
+            if os.stat(target).st_mtime >= stat.st_mtime:
+                continue
+        except FileNotFoundError:
+            pass
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        compressed = compress(data)
+        if len(compressed) >= len(data) * 0.95:
+            continue
+        with open(target, 'wb') as f:
+            f.write(compressed)
+        written.append(target)
+    return written
+
+
+def compress_tree(root):
+    """Compresse tous les fichiers de root ; retourne (fichiers, octets avant, octets gzip)"""
+    files = original = compressed = 0
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if name.endswith(('.gz', '.br')):
+                continue
+            path = os.path.join(directory, name)
+            compress_file(path)
+            if os.path.exists(path + '.gz'):
+                files += 1
+                original += os.path.getsize(path)
+                compressed += os.path.getsize(path + '.gz')
+    return files, original, compressed
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Noms à empreinte (manifeste) et variantes .gz / .br écrites par collectstatic"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in set(self.hashed_files.values()):
+            if self.exists(name):
+                compress_file(self.path(name))
+
+
+def accepted_encodings(request):
+    return {coding for coding, quality in parse_accept_encoding(request.headers.get('Accept-Encoding')).items() if quality > 0}
+
+
+def serve_asset(request, root, path, cache_control):
+    """Sert root/path, ou sa variante précompressée acceptée par le client"""
+    try:
+        full_path = safe_join(root, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    encoding = None
+    served_path = full_path
+    accepted = accepted_encodings(request)
+    for coding, extension in ENCODINGS:
+        if coding in accepted and os.path.isfile(full_path + extension):
+            encoding, served_path = coding, full_path + extension
+            break
+
+    stat = os.stat(full_path)
+    etag = quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}' + (f'-{encoding}' if encoding else ''))
+    if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponseNotModified()
+    else:
+        content_type, _ = mimetypes.guess_type(full_path)
+        response = FileResponse(open(served_path, 'rb'), content_type=content_type or 'application/octet-stream')
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+@require_safe
+def static_file(request, path):
+    """STATIC_ROOT (après collectstatic) : immutable pour les noms à empreinte"""
+    cache_control = IMMUTABLE_CACHE_CONTROL if MANIFEST_HASH_RE.search(path) else REVALIDATE_CACHE_CONTROL
+    return serve_asset(request, settings.STATIC_ROOT, path, cache_control)
+
+
+@require_safe
+def spa(request, path=''):
+    """
+    Application React (SPA_ROOT, construite avec VITE_BASE=/<SPA_URL>) : dist/assets à
+    empreinte, fichiers de dist/ tels quels, et index.html pour toute autre route du client.
+    """
+    root = settings.SPA_ROOT
+    if path.startswith('assets/'):
+        return serve_asset(request, root, path, IMMUTABLE_CACHE_CONTROL)
+    index_cache_control = f'public, max-age={settings.SPA_INDEX_MAX_AGE}, must-revalidate'
+    if path and os.path.isfile(os.path.join(root, path)):
+        return serve_asset(request, root, path, index_cache_control)
+    return serve_asset(request, root, 'index.html', index_cache_control)
@@ -0,0 +1,12 @@
+from django.urls import path
+from . import async_views
+
+# Variantes asynchrones (ASGI) des points d'accès en lecture de api_urls.py
+urlpatterns = [
+    path('offers/', async_views.offer_list, name='api-async-offer-list'),
+    path('offers/<int:pk>/', async_views.offer_detail, name='api-async-offer-detail'),
+    path('auth/me/', async_views.current_user, name='api-async-current-user'),
+    path('dashboard/stats/', async_views.dashboard_stats, name='api-async-dashboard-stats'),
+    path('favorites/', async_views.favorites, name='api-async-favorites'),
+    path('favorites/<int:offer_id>/check/', async_views.is_favorite, name='api-async-is-favorite'),
+]
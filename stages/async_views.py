@@ -0,0 +1,197 @@
+"""
+Variantes asynchrones (ASGI) des points d'accès en lecture les plus sollicités.
+
+DRF n'a pas de vues asynchrones : ce sont des vues Django async def qui utilisent
+l'ORM asynchrone et renvoient le même JSON que leurs équivalents de api_views.py
+(mêmes sérialiseurs, appliqués à des querysets annotés pour qu'aucun champ ne
+déclenche de requête pendant la sérialisation). Servies par un serveur ASGI
+(config.asgi), elles n'occupent pas de thread pendant les attentes.
+"""
+import datetime
+import functools
+from django.db.models import BooleanField, Count, Q, Value
+from django.db.models.functions import TruncMonth
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+from dateutil.relativedelta import relativedelta
+from rest_framework import exceptions
+from .api_views import annotate_offers, offer_queryset
+from .authentication import (
+    SignedTokenAuthentication, acache_user_payload, aget_cached_user_payload, aget_user_role,
+)
+from .cache import acached
+from .models import StageOffer, Candidature, Favorite
+from .serializers import StageOfferSerializer, UserSerializer
+
+
+def error(detail, status, key='detail'):
+    response = JsonResponse({key: detail}, status=status)
+    if status == 401:
+        response['WWW-Authenticate'] = SignedTokenAuthentication().authenticate_header(None)
+    return response
+
+
+async def authenticate(request):
+    """
+    Jeton Bearer (SignedTokenAuthentication) puis session, comme les classes
+    d'authentification par défaut de REST_FRAMEWORK. Lève AuthenticationFailed.
+    """
+    result = SignedTokenAuthentication().authenticate(request)
+    if result is not None:
+        return result[0]
+    return await request.auser()
+
+
+def authenticated(view):
+    """Équivalent de IsAuthenticated : 401 si la requête n'est pas authentifiée"""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            user = await authenticate(request)
+        except exceptions.AuthenticationFailed as e:
+            return error(str(e.detail), 401)
+        if not user.is_authenticated:
+            return error('Authentication credentials were not provided.', 401)
+        return await view(request, user, *args, **kwargs)
+    return wrapper
+
+
+async def serialize_offers(queryset):
+    return [StageOfferSerializer(offer).data async for offer in queryset]
+
+
+@require_GET
+async def offer_list(request):
+    try:
+        user = await authenticate(request)
+    except exceptions.AuthenticationFailed as e:
+        return error(str(e.detail), 401)
+    queryset = offer_queryset(user, await aget_user_role(user), request.GET)
+    return JsonResponse(await serialize_offers(annotate_offers(queryset, user)), safe=False)
+
+
+@require_GET
+async def offer_detail(request, pk):
+    try:
+        user = await authenticate(request)
+    except exceptions.AuthenticationFailed as e:
+        return error(str(e.detail), 401)
+    queryset = offer_queryset(user, await aget_user_role(user), request.GET)
+    offer = await annotate_offers(queryset, user).filter(pk=pk).afirst()
+    if offer is None:
+        return error('No StageOffer matches the given query.', 404)
+    return JsonResponse(StageOfferSerializer(offer).data)
+
+
+@require_GET
+async def current_user(request):
+    """Jeton d'accès, puis profil mis en cache en session, puis utilisateur de la session"""
+    try:
+        result = SignedTokenAuthentication().authenticate(request)
+    except exceptions.AuthenticationFailed as e:
+        return error(str(e.detail), 401)
+    if result is not None:
+        return JsonResponse(UserSerializer(result[0]).data)
+
+    payload = await aget_cached_user_payload(request)
+    if payload is not None:
+        return JsonResponse(payload)
+
+    user = await request.auser()
+    if not user.is_authenticated:
+        return error('Authentication credentials were not provided.', 401)
+    await aget_user_role(user)
+    data = UserSerializer(user).data
+    await acache_user_payload(request, data)
+    return JsonResponse(data)
+
+
+@require_GET
+@authenticated
+async def favorites(request, user):
+    if not await user.groups.filter(name='Etudiant').aexists():
+        return error('Seuls les étudiants peuvent gérer des favoris', 403, key='error')
+    # Ordre des favoris comme api_views.favorites_view ; has_applied y est toujours faux (pas de requête dans le contexte)
+    queryset = (
+        StageOffer.objects.filter(favorited_by__student=user)
+        .order_by('favorited_by__pk')
+        .select_related('company')
+        .annotate(
+            num_candidatures=Count('candidature', distinct=True),
+            applied=Value(False, output_field=BooleanField()),
+            favorited=Value(True, output_field=BooleanField()),
+        )
+    )
+    return JsonResponse(await serialize_offers(queryset), safe=False)
+
+
+@require_GET
+@authenticated
+async def is_favorite(request, user, offer_id):
+    if not await user.groups.filter(name='Etudiant').aexists():
+        return JsonResponse({'is_favorite': False})
+    return JsonResponse({'is_favorite': await Favorite.objects.filter(student=user, offer_id=offer_id).aexists()})
+
+
+@require_GET
+@authenticated
+async def dashboard_stats(request, user):
+    """Mêmes chiffres que api_views.dashboard_stats, en 5 requêtes agrégées, mis en cache de la même façon"""
+    if await aget_user_role(user) not in ['Administrateur', 'Responsable'] and not user.is_superuser:
+        return error('Accès non autorisé', 403, key='error')
+
+    async def compute():
+        offers = await StageOffer.objects.aaggregate(
+            total=Count('pk'),
+            pending=Count('pk', filter=Q(state='En attente validation')),
+            validated=Count('pk', filter=Q(state='Validée')),
+            closed=Count('pk', filter=Q(state='Clôturée')),
+            refused=Count('pk', filter=Q(state='Refusée')),
+        )
+        candidatures = await Candidature.objects.aaggregate(
+            total=Count('pk'),
+            pending=Count('pk', filter=Q(status='En attente')),
+            accepted=Count('pk', filter=Q(status='Acceptée')),
+            refused=Count('pk', filter=Q(status='Refusée')),
+        )
+
+        # 12 derniers mois (mois courant inclus), bornes calculées en UTC comme la vue synchrone
+        current_month = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        months = [current_month - relativedelta(months=11 - i) for i in range(12)]
+        period = (months[0], current_month + relativedelta(months=1))
+
+        async def by_month(queryset, field):
+            counts = {}
+            rows = (
+                queryset.filter(**{f'{field}__gte': period[0], f'{field}__lt': period[1]})
+                .annotate(month=TruncMonth(field, tzinfo=datetime.timezone.utc))
+                .values('month').annotate(count=Count('pk')).order_by()
+            )
+            async for row in rows:
+                counts[row['month']] = row['count']
+            return [{'month': month.strftime('%b %Y'), 'count': counts.get(month, 0)} for month in months]
+
+        top_offers = StageOffer.objects.annotate(num_candidatures=Count('candidature')).order_by('-num_candidatures')[:5]
+
+        return {
+            'total_offers': offers['total'],
+            'pending_offers': offers['pending'],
+            'validated_offers': offers['validated'],
+            'closed_offers': offers['closed'],
+            'refused_offers': offers['refused'],
+            'total_candidatures': candidatures['total'],
+            'pending_candidatures': candidatures['pending'],
+            'accepted_candidatures': candidatures['accepted'],
+            'refused_candidatures': candidatures['refused'],
+            'candidatures_by_month': await by_month(Candidature.objects.all(), 'date_candidature'),
+            'offers_by_month': await by_month(StageOffer.objects.all(), 'date_depot'),
+            'top_offers': [{'title': offer.title, 'count': offer.num_candidatures} async for offer in top_offers],
+            'candidatures_by_status': [
+                {'status': 'En attente', 'count': candidatures['pending']},
+                {'status': 'Acceptée', 'count': candidatures['accepted']},
+                {'status': 'Refusée', 'count': candidatures['refused']},
+            ],
+        }
+
+    return JsonResponse(await acached(('offers', 'candidatures'), 'async_dashboard_stats', compute))
@@ -1,4 +1,23 @@
-from rest_framework.authentication import SessionAuthentication
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core import signing
+from django.utils.crypto import constant_time_compare, salted_hmac
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, SessionAuthentication, get_authorization_header
+from .cache import USER_NAMESPACE, namespace_versions
+
+ACCESS_TOKEN_SALT = 'stages.access-token'
+REFRESH_TOKEN_SALT = 'stages.refresh-token'
+
+# Champs de User embarqués dans le jeton d'accès (reconstruits sans requête SQL)
+TOKEN_USER_FIELDS = ['id', 'username', 'email', 'first_name', 'last_name', 'is_staff', 'is_superuser', 'is_active']
+
+# Clé de session contenant le profil "léger" de l'utilisateur (id, rôle, champs d'affichage)
+SESSION_USER_KEY = '_stages_user'
+
 
 class CsrfExemptSessionAuthentication(SessionAuthentication):
     """
@@ -6,3 +25,171 @@ class CsrfExemptSessionAuthentication(SessionAuthentication):
     """
     def enforce_csrf(self, request):
         return  # Skip CSRF check
+
+
+# Champs techniques du profil en session, retirés de la réponse
+PAYLOAD_META_FIELDS = ('cached_at', 'auth_hash', 'version')
+
+
+def user_version(user_id):
+    """Version du profil de l'utilisateur (cache partagé, aucune requête SQL)"""
+    return namespace_versions([USER_NAMESPACE.format(user_id)])[0]
+
+
+def cache_user_payload(request, data):
+    """Mémorise en session les données de UserSerializer après login/register"""
+    request.session[SESSION_USER_KEY] = {
+        **data, 'cached_at': time.time(),
+        'auth_hash': request.session.get(HASH_SESSION_KEY), 'version': user_version(data['id']),
+    }
+
+
+async def acache_user_payload(request, data):
+    await request.session.aset(SESSION_USER_KEY, {
+        **data, 'cached_at': time.time(),
+        'auth_hash': await request.session.aget(HASH_SESSION_KEY),
+        'version': await sync_to_async(user_version)(data['id']),
+    })
+
+
+def _valid_payload(payload, session_user_id, session_hash):
+    if not payload:
+        return None
+    if str(payload.get('id')) != str(session_user_id):
+        return None
+    # Session réécrite depuis (mot de passe changé via update_session_auth_hash...)
+    if payload.get('auth_hash') != session_hash:
+        return None
+    ttl = getattr(settings, 'SESSION_USER_CACHE_TTL', 300)
+    if time.time() - payload.get('cached_at', 0) > ttl:
+        return None
+    return {k: v for k, v in payload.items() if k not in PAYLOAD_META_FIELDS}
+
+
+def get_cached_user_payload(request):
+    """
+    Retourne le profil mis en cache en session, ou None s'il est absent, expiré
+    (SESSION_USER_CACHE_TTL), s'il ne correspond pas à l'utilisateur authentifié ou si
+    celui-ci a changé depuis (mot de passe, is_active, groupes : version USER_NAMESPACE).
+    Ne fait aucune requête SQL au-delà du chargement de la session.
+    """
+    session = request.session
+    payload = _valid_payload(session.get(SESSION_USER_KEY), session.get(SESSION_KEY), session.get(HASH_SESSION_KEY))
+    if payload is None or session[SESSION_USER_KEY].get('version') != user_version(payload['id']):
+        return None
+    return payload
+
+
+async def aget_cached_user_payload(request):
+    session = request.session
+    cached_payload = await session.aget(SESSION_USER_KEY)
+    payload = _valid_payload(cached_payload, await session.aget(SESSION_KEY), await session.aget(HASH_SESSION_KEY))
+    if payload is None or cached_payload.get('version') != await sync_to_async(user_version)(payload['id']):
+        return None
+    return payload
+
+
+def get_user_role(user):
+    """
+    Nom du premier groupe de l'utilisateur (Etudiant, Entreprise, Responsable, Administrateur).
+    Le rôle embarqué dans un jeton d'accès est réutilisé ; sinon une requête, mémorisée sur l'instance.
+    """
+    if not user.is_authenticated:
+        return None
+    if not hasattr(user, '_stages_role'):
+        user._stages_role = user.groups.values_list('name', flat=True).first()
+    return user._stages_role
+
+
+async def aget_user_role(user):
+    if not user.is_authenticated:
+        return None
+    if not hasattr(user, '_stages_role'):
+        user._stages_role = await user.groups.values_list('name', flat=True).afirst()
+    return user._stages_role
+
+
+def password_fingerprint(user):
+    """Empreinte du mot de passe : un changement de mot de passe invalide les jetons de rafraîchissement"""
+    return salted_hmac(REFRESH_TOKEN_SALT, user.password).hexdigest()[:16]
+
+
+def issue_tokens(user, role=None):
+    """
+    Génère un couple (access, refresh) signé HMAC avec SECRET_KEY.
+    Le jeton d'accès (court) embarque l'utilisateur et son rôle ; le jeton de
+    rafraîchissement (long) ne contient que l'id et l'empreinte du mot de passe.
+    """
+    if role is None:
+        role = get_user_role(user)
+    access = signing.dumps(
+        {'u': [getattr(user, field) for field in TOKEN_USER_FIELDS], 'r': role},
+        salt=ACCESS_TOKEN_SALT,
+        compress=True,
+    )
+    refresh = signing.dumps(
+        {'uid': user.pk, 'pw': password_fingerprint(user)},
+        salt=REFRESH_TOKEN_SALT,
+    )
+    return {
+        'access': access,
+        'refresh': refresh,
+        'expires_in': settings.ACCESS_TOKEN_TTL,
+        'token_type': 'Bearer',
+    }
+
+
+def refresh_tokens(refresh_token):
+    """Vérifie un jeton de rafraîchissement et renvoie un nouveau couple (relit l'utilisateur en base)"""
+    try:
+        payload = signing.loads(refresh_token, salt=REFRESH_TOKEN_SALT, max_age=settings.REFRESH_TOKEN_TTL)
+    except signing.SignatureExpired:
+        raise exceptions.AuthenticationFailed('Jeton de rafraîchissement expiré')
+    except signing.BadSignature:
+        raise exceptions.AuthenticationFailed('Jeton de rafraîchissement invalide')
+
+    user = User.objects.filter(pk=payload.get('uid'), is_active=True).first()
+    if user is None or not constant_time_compare(payload.get('pw', ''), password_fingerprint(user)):
+        raise exceptions.AuthenticationFailed('Jeton de rafraîchissement révoqué')
+    return issue_tokens(user)
+
+
+def user_from_access_token(payload):
+    """
+    Reconstruit un User sans requête SQL. Les champs absents du jeton sont différés :
+    y accéder les charge depuis la base, et save() ne réécrit que les champs chargés.
+    """
+    user = User.from_db('default', TOKEN_USER_FIELDS, payload['u'])
+    user._stages_role = payload.get('r')
+    return user
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Authentification sans état : `Authorization: Bearer <jeton d'accès>`.
+    Le jeton est vérifié par HMAC et expire après ACCESS_TOKEN_TTL secondes ;
+    aucune requête en base ni session n'est nécessaire.
+    """
+    keyword = b'bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword:
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('En-tête Authorization invalide')
+
+        try:
+            payload = signing.loads(auth[1].decode(), salt=ACCESS_TOKEN_SALT, max_age=settings.ACCESS_TOKEN_TTL)
+        except signing.SignatureExpired:
+            raise exceptions.AuthenticationFailed('Jeton expiré')
+        except (signing.BadSignature, UnicodeDecodeError):
+            raise exceptions.AuthenticationFailed('Jeton invalide')
+
+        user = user_from_access_token(payload)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('Compte désactivé')
+        return (user, payload)
+
+    def authenticate_header(self, request):
+        return 'Bearer realm="api"'
@@ -0,0 +1,144 @@
+"""
+Backfills par lots : parcours par clé (pk > dernier pk traité), bulk_update par lot,
+une transaction courte par lot, reprise sur point de contrôle et mode dry-run.
+
+Les lignes sont lues et transformées hors transaction ; seule l'écriture du lot
+(bulk_update + point de contrôle) prend le verrou d'écriture, ce qui permet de
+lancer un backfill en production sans bloquer SQLite pendant des minutes.
+bulk_update ne déclenchant aucun signal, chaque lot écrit invalide lui-même les
+espaces de noms du cache associés au modèle (bump_for_model).
+"""
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from .cache import bump_for_model
+from .models import BackfillCheckpoint
+
+
+class Backfill:
+    """
+    Décrit un backfill. Les sous-classes définissent `name`, `model`, `fields`
+    et implémentent process(obj), qui modifie l'objet et retourne True s'il doit être enregistré.
+    prepare(checkpoint) est appelé avant le premier lot (reprises comprises).
+    """
+    name = None
+    model = None
+    fields = []
+    batch_size = 1000
+
+    def get_queryset(self):
+        return self.model._default_manager.all()
+
+    def prepare(self, checkpoint):
+        pass
+
+    def process(self, obj):
+        raise NotImplementedError
+
+
+class BackfillRunner:
+    def __init__(self, backfill, batch_size=None, dry_run=False, restart=False, sleep=0, limit=None, stdout=None):
+        self.backfill = backfill
+        self.batch_size = batch_size or backfill.batch_size
+        self.dry_run = dry_run
+        self.restart = restart
+        self.sleep = sleep
+        self.limit = limit
+        self.stdout = stdout
+
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+
+    def run(self):
+        backfill = self.backfill
+        if self.dry_run:
+            # Aucune écriture, pas même celle du point de contrôle
+            checkpoint = (BackfillCheckpoint.objects.filter(name=backfill.name).first()
+                          or BackfillCheckpoint(name=backfill.name))
+        else:
+            checkpoint, _ = BackfillCheckpoint.objects.get_or_create(name=backfill.name)
+        if self.restart:
+            checkpoint.last_pk = checkpoint.processed = checkpoint.updated = 0
+            checkpoint.started_at = checkpoint.completed_at = None
+        elif checkpoint.completed_at:
+            self.log(f'{backfill.name} : déjà terminé le {checkpoint.completed_at:%d/%m/%Y %H:%M} (--restart pour relancer)')
+            return checkpoint
+        if checkpoint.started_at is None:
+            checkpoint.started_at = timezone.now()
+            if not self.dry_run:
+                checkpoint.save()
+        backfill.prepare(checkpoint)
+
+        queryset = backfill.get_queryset().order_by('pk')
+        last_pk = checkpoint.last_pk
+        remaining = queryset.filter(pk__gt=last_pk).count()
+        if self.limit is not None:
+            remaining = min(remaining, self.limit)
+        if last_pk:
+            self.log(f'{backfill.name} : reprise après pk={last_pk}')
+
+        processed = updated = 0
+        started = time.monotonic()
+        while remaining > processed:
+            size = min(self.batch_size, remaining - processed)
+            batch = list(queryset.filter(pk__gt=last_pk)[:size])
+            if not batch:
+                break
+            changed = [obj for obj in batch if backfill.process(obj)]
+            last_pk = batch[-1].pk
+            processed += len(batch)
+            updated += len(changed)
+
+            if not self.dry_run:
+                with transaction.atomic():
+                    if changed:
+                        backfill.model._default_manager.bulk_update(changed, backfill.fields)
+                        bump_for_model(backfill.model)
+                    checkpoint.last_pk = last_pk
+                    checkpoint.processed += len(batch)
+                    checkpoint.updated += len(changed)
+                    checkpoint.save()
+
+            rate = processed / max(time.monotonic() - started, 1e-6)
+            self.log(f'  {processed}/{remaining} lignes ({updated} modifiées, {rate:.0f} lignes/s)')
+            if self.sleep:
+                time.sleep(self.sleep)
+
+        if self.dry_run:
+            self.log(f'{backfill.name} : dry-run, {updated}/{processed} lignes seraient modifiées')
+        elif not queryset.filter(pk__gt=last_pk).exists():
+            # Plus rien après le dernier pk, y compris quand --limit tombe juste
+            checkpoint.completed_at = timezone.now()
+            checkpoint.save()
+        return checkpoint
+
+
+class BackfillCommand(BaseCommand):
+    """Commande de base : les sous-classes implémentent get_backfill(**options)"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help="Nombre de lignes par lot / transaction")
+        parser.add_argument('--dry-run', action='store_true', help="Calcule les modifications sans rien écrire")
+        parser.add_argument('--restart', action='store_true', help="Ignore le point de reprise et repart du début")
+        parser.add_argument('--sleep', type=float, default=0, help="Pause (secondes) entre deux lots pour laisser passer les écritures")
+        parser.add_argument('--limit', type=int, default=None, help="Nombre maximum de lignes à traiter pour cette exécution")
+
+    def get_backfill(self, **options):
+        raise NotImplementedError
+
+    def handle(self, *args, **options):
+        runner = BackfillRunner(
+            self.get_backfill(**options),
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+            restart=options['restart'],
+            sleep=options['sleep'],
+            limit=options['limit'],
+            stdout=self.stdout,
+        )
+        checkpoint = runner.run()
+        self.stdout.write(self.style.SUCCESS(
+            f'{checkpoint.name} : {checkpoint.updated} lignes modifiées sur {checkpoint.processed} traitées'
+        ))
@@ -0,0 +1,439 @@
+"""
+Suite de benchmark des routes (API et pages) avec budgets de requêtes SQL.
+
+Chaque route est appelée pour chaque rôle concerné, dans une transaction annulée
+à la fin de l'appel (les routes qui écrivent peuvent donc être mesurées sans
+modifier les données), elle-même dans la transaction de bench_context, annulée
+à la fin de la suite (comptes créés pour l'occasion, sessions). On relève latence
+p50/p95, nombre de requêtes SQL et taille de la réponse, et on compare le nombre
+de requêtes au budget déclaré.
+
+Un budget s'écrit QueryBudget(fixe, par_element) : le coût par élément permet de
+déclarer explicitement les N+1 existants ; le réduire à 0 est l'objectif des
+optimisations suivantes. Les instructions de transaction (BEGIN/COMMIT, ou
+SAVEPOINT/RELEASE dans la transaction du benchmark) comptent dans le budget.
+"""
+import json
+import subprocess
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.contrib.auth.models import User, Group
+from django.db import transaction
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+from .dbwrappers import execute_wrapper
+from .metrics import QueryCounter
+from .models import StageOffer, Candidature, Favorite, StudentProfile
+
+
+ROLES = ['anonymous', 'Etudiant', 'Entreprise', 'Responsable', 'Administrateur']
+
+
+class QueryBudget:
+    def __init__(self, fixed, per_item=0):
+        self.fixed = fixed
+        self.per_item = per_item
+
+    def allowed(self, items):
+        return self.fixed + self.per_item * items
+
+    def __str__(self):
+        return f'{self.fixed} + {self.per_item}/élément' if self.per_item else str(self.fixed)
+
+
+class Endpoint:
+    """
+    Route mesurée. `args`, `data` et `items` sont des callables recevant le
+    BenchContext ; `items` donne le nombre d'éléments rendus (défaut : taille de
+    la liste JSON retournée) pour les budgets par élément. `relogin` reconnecte
+    le client avant chaque appel (routes qui ferment la session).
+    """
+
+    def __init__(self, url_name, roles, budget, method='GET', args=None, data=None, items=None, label=None, relogin=False):
+        self.url_name = url_name
+        self.roles = roles
+        self.budget = budget
+        self.method = method
+        self.args = args
+        self.data = data
+        self.items = items
+        self.label = label or url_name
+        self.relogin = relogin
+
+    def url(self, ctx):
+        return reverse(self.url_name, args=self.args(ctx) if self.args else None)
+
+
+class BenchContext:
+    """
+    Choisit dans la base les utilisateurs et objets utilisés par les routes. Les comptes
+    existants ne sont jamais modifiés : un rôle sans utilisateur adapté reçoit un compte
+    bench_<rôle>, à condition que create_users soit vrai (voir bench_context).
+    """
+
+    def __init__(self, create_users=True):
+        self.create_users = create_users
+        self.users = {'anonymous': None}
+        for role in ROLES[1:]:
+            self.users[role] = self.pick_user(role)
+
+        student = self.users['Etudiant']
+        company = self.users['Entreprise']
+
+        own = Candidature.objects.filter(student=student).order_by('pk').first()
+        self.candidature_id = own.pk if own else 0
+        self.applied_offer_id = own.offer_id if own else 0
+
+        open_offer = (
+            StageOffer.objects.filter(state='Validée')
+            .exclude(candidature__student=student)
+            .annotate(n=Count('candidature')).filter(n__lt=5)
+            .order_by('pk').first()
+        )
+        self.open_offer_id = open_offer.pk if open_offer else 0
+        self.offer_id = self.applied_offer_id or self.open_offer_id
+
+        company_offer = (
+            StageOffer.objects.filter(company=company)
+            .annotate(n=Count('candidature')).order_by('-n', 'pk').first()
+        )
+        self.company_offer_id = company_offer.pk if company_offer else 0
+        company_cand = Candidature.objects.filter(offer_id=self.company_offer_id).order_by('pk').first()
+        self.company_candidature_id = company_cand.pk if company_cand else 0
+        self.pending_offer_id = (
+            StageOffer.objects.filter(state='En attente validation').order_by('pk').values_list('pk', flat=True).first() or 0
+        )
+
+    def pick_user(self, role):
+        """L'utilisateur du rôle le plus chargé en données (pire cas réaliste), ou un compte créé pour l'occasion"""
+        users = User.objects.filter(groups__name=role)
+        if role == 'Etudiant':
+            users = users.annotate(n=Count('candidature')).order_by('-n', 'pk')
+        elif role == 'Entreprise':
+            users = users.annotate(n=Count('company_offers')).order_by('-n', 'pk')
+        elif role == 'Administrateur':
+            # Jamais de promotion d'un compte existant
+            users = users.filter(is_staff=True, is_superuser=True).order_by('pk')
+        else:
+            users = users.order_by('pk')
+        user = users.first()
+        if user is None:
+            if not self.create_users:
+                raise ValueError(f"Aucun utilisateur « {role} » utilisable : lancez generate_dataset")
+            group, _ = Group.objects.get_or_create(name=role)
+            user = User.objects.create(
+                username=f'bench_{role.lower()}', email=f'bench_{role.lower()}@example.com',
+                is_staff=role == 'Administrateur', is_superuser=role == 'Administrateur',
+            )
+            user.groups.add(group)
+            if role == 'Etudiant':
+                StudentProfile.objects.create(user=user)
+        return user
+
+    def count_offer_candidatures(self, offer_id):
+        return Candidature.objects.filter(offer_id=offer_id).count()
+
+
+def _company_offer_items(ctx):
+    return ctx.count_offer_candidatures(ctx.company_offer_id)
+
+
+def _offer_items(ctx):
+    return ctx.count_offer_candidatures(ctx.offer_id)
+
+
+def _all_candidatures(ctx):
+    return Candidature.objects.count()
+
+
+def _favorites(ctx):
+    return Favorite.objects.filter(student=ctx.users['Etudiant']).count()
+
+
+def _student_candidatures(ctx):
+    return Candidature.objects.filter(student=ctx.users['Etudiant']).count()
+
+
+def _validated_offers(ctx):
+    return StageOffer.objects.filter(state='Validée').count()
+
+
+def _company_offers(ctx):
+    return StageOffer.objects.filter(company=ctx.users['Entreprise']).count()
+
+
+def _pending_offers(ctx):
+    return StageOffer.objects.filter(state='En attente validation').count()
+
+
+def _all_offers(ctx):
+    return StageOffer.objects.count()
+
+
+def _all_users(ctx):
+    return User.objects.count()
+
+
+STUDENT = ['Etudiant']
+COMPANY = ['Entreprise']
+MANAGER = ['Responsable']
+ADMIN = ['Administrateur']
+
+OFFER_PAYLOAD = {
+    'organisme': 'Bench', 'contact_name': 'Bench', 'contact_email': 'bench@example.com',
+    'title': 'Bench', 'description': 'Bench',
+}
+
+ENDPOINTS = [
+    # -- API (stages/api_urls.py) --------------------------------------------
+    Endpoint('api-root', ['anonymous'], QueryBudget(0)),
+    Endpoint('api-offer-list', ['anonymous'], QueryBudget(1)),
+    Endpoint('api-offer-list', STUDENT + COMPANY + MANAGER, QueryBudget(3), label='api-offer-list (auth)'),
+    Endpoint('api-offer-list', ['anonymous'], QueryBudget(2), method='POST', data=lambda ctx: OFFER_PAYLOAD, label='api-offer-create'),
+    Endpoint('api-offer-detail', ['anonymous'], QueryBudget(1), args=lambda ctx: [ctx.offer_id]),
+    Endpoint('api-offer-detail', ADMIN, QueryBudget(7), method='PATCH', args=lambda ctx: [ctx.offer_id],
+             data=lambda ctx: {'title': 'Bench'}, label='api-offer-update'),
+    Endpoint('api-offer-detail', ADMIN, QueryBudget(10, per_item=2), method='DELETE', args=lambda ctx: [ctx.offer_id],
+             items=_offer_items, label='api-offer-delete'),
+    Endpoint('api-offer-apply', STUDENT, QueryBudget(19), method='POST', args=lambda ctx: [ctx.open_offer_id]),
+    Endpoint('api-offer-validate-offer', ADMIN, QueryBudget(7), method='POST', args=lambda ctx: [ctx.pending_offer_id],
+             data=lambda ctx: {'action': 'validate'}),
+    Endpoint('api-offer-bulk-moderate', ADMIN, QueryBudget(6), method='POST',
+             data=lambda ctx: {'ids': [ctx.pending_offer_id, ctx.offer_id, 0], 'action': 'validate'}),
+    Endpoint('api-offer-candidates', MANAGER, QueryBudget(1, per_item=6), args=lambda ctx: [ctx.offer_id], items=_offer_items),
+    Endpoint('api-offer-export-pdf', ADMIN, QueryBudget(7, per_item=2), args=lambda ctx: [ctx.offer_id], items=_offer_items),
+    Endpoint('api-candidature-list', STUDENT, QueryBudget(4, per_item=7)),
+    Endpoint('api-candidature-list', MANAGER, QueryBudget(4, per_item=7), label='api-candidature-list (responsable)'),
+    Endpoint('api-candidature-detail', STUDENT, QueryBudget(11), args=lambda ctx: [ctx.candidature_id]),
+    Endpoint('api-candidature-withdraw', STUDENT, QueryBudget(11), method='POST', args=lambda ctx: [ctx.candidature_id]),
+    Endpoint('api-candidature-update-status', ADMIN, QueryBudget(12), method='POST', args=lambda ctx: [ctx.candidature_id],
+             data=lambda ctx: {'status': 'Acceptée'}),
+    Endpoint('api-candidature-bulk-status', COMPANY, QueryBudget(7), method='POST',
+             data=lambda ctx: {'ids': list(Candidature.objects.filter(offer_id=ctx.company_offer_id)
+                                           .values_list('pk', flat=True)) + [0], 'status': 'Refusée'}),
+    Endpoint('api-candidature-export-all-pdf', ADMIN, QueryBudget(8, per_item=2), items=_all_candidatures),
+    Endpoint('api-csrf', ['anonymous'], QueryBudget(0)),
+    Endpoint('api-register', ['anonymous'], QueryBudget(16), method='POST',
+             data=lambda ctx: {'username': 'bench_new_user', 'password': 'bench-password', 'email': 'bench_new@example.com'}),
+    Endpoint('api-login', ['anonymous'], QueryBudget(1), method='POST',
+             data=lambda ctx: {'username': 'bench_unknown', 'password': 'wrong'}, label='api-login (échec)'),
+    Endpoint('api-logout', STUDENT, QueryBudget(3), method='POST', relogin=True),
+    Endpoint('api-token-refresh', ['anonymous'], QueryBudget(0), method='POST',
+             data=lambda ctx: {'refresh': 'invalide'}, label='api-token-refresh (échec)'),
+    Endpoint('api-current-user', ROLES[1:], QueryBudget(0)),
+    Endpoint('api-token', ['anonymous'], QueryBudget(1), method='POST',
+             data=lambda ctx: {'username': 'bench_unknown', 'password': 'wrong'}, label='api-token (échec)'),
+    Endpoint('api-student-profile', STUDENT, QueryBudget(4)),
+    Endpoint('api-dashboard-stats', MANAGER + ADMIN, QueryBudget(36)),
+    Endpoint('api-report-candidatures-per-student', ADMIN, QueryBudget(4)),
+    Endpoint('api-favorites', STUDENT, QueryBudget(3, per_item=2), items=_favorites),
+    Endpoint('api-favorite-ids', STUDENT, QueryBudget(4)),
+    Endpoint('api-is-favorite', STUDENT, QueryBudget(3), args=lambda ctx: [ctx.offer_id]),
+    Endpoint('api-toggle-favorite', STUDENT, QueryBudget(5), method='POST', args=lambda ctx: [ctx.offer_id]),
+    # Variantes asynchrones (async_views.py) : mêmes réponses, sans requête par élément
+    Endpoint('api-async-offer-list', ['anonymous'], QueryBudget(1)),
+    Endpoint('api-async-offer-list', STUDENT + COMPANY + MANAGER, QueryBudget(3), label='api-async-offer-list (auth)'),
+    Endpoint('api-async-offer-detail', ['anonymous'] + STUDENT, QueryBudget(3), args=lambda ctx: [ctx.offer_id]),
+    Endpoint('api-async-current-user', ROLES[1:], QueryBudget(0)),
+    Endpoint('api-async-dashboard-stats', MANAGER + ADMIN, QueryBudget(7)),
+    Endpoint('api-async-favorites', STUDENT, QueryBudget(3)),
+    Endpoint('api-async-is-favorite', STUDENT, QueryBudget(3), args=lambda ctx: [ctx.offer_id]),
+
+    # -- Pages (stages/urls.py) ---------------------------------------------
+    Endpoint('home', ['anonymous'] + STUDENT, QueryBudget(5)),
+    Endpoint('register', ['anonymous'], QueryBudget(0)),
+    Endpoint('company_offer_create', COMPANY, QueryBudget(5)),
+    Endpoint('company_success', ['anonymous'], QueryBudget(0)),
+    Endpoint('company_dashboard', COMPANY, QueryBudget(7, per_item=1), items=_company_offers),
+    Endpoint('company_offer_candidates', COMPANY, QueryBudget(10, per_item=2), args=lambda ctx: [ctx.company_offer_id],
+             items=_company_offer_items),
+    Endpoint('company_candidate_action', COMPANY, QueryBudget(7), args=lambda ctx: [ctx.company_candidature_id, 'accept']),
+    Endpoint('manager_offer_list', MANAGER, QueryBudget(7), items=_pending_offers),
+    Endpoint('manager_offer_detail', MANAGER, QueryBudget(7), args=lambda ctx: [ctx.offer_id]),
+    Endpoint('manager_offer_action', ADMIN, QueryBudget(3), args=lambda ctx: [ctx.pending_offer_id, 'validate']),
+    Endpoint('student_offer_list', STUDENT, QueryBudget(7), items=_validated_offers),
+    Endpoint('student_offer_detail', STUDENT, QueryBudget(8), args=lambda ctx: [ctx.offer_id]),
+    Endpoint('student_apply', STUDENT, QueryBudget(12), args=lambda ctx: [ctx.open_offer_id]),
+    Endpoint('student_candidature_list', STUDENT, QueryBudget(7, per_item=1), items=_student_candidatures),
+    Endpoint('withdraw_candidature', STUDENT, QueryBudget(10), args=lambda ctx: [ctx.candidature_id]),
+    Endpoint('profile_edit', STUDENT, QueryBudget(7)),
+    Endpoint('student_cv_download', STUDENT, QueryBudget(2), args=lambda ctx: [ctx.users['Etudiant'].pk]),
+    Endpoint('manager_offer_candidates', MANAGER, QueryBudget(8, per_item=2), args=lambda ctx: [ctx.offer_id], items=_offer_items),
+    Endpoint('export_candidates_csv', MANAGER, QueryBudget(5, per_item=2), args=lambda ctx: [ctx.offer_id], items=_offer_items),
+    Endpoint('admin_dashboard', ADMIN, QueryBudget(11)),
+    Endpoint('admin_student_report', ADMIN, QueryBudget(8)),
+    Endpoint('admin_slow_queries', ADMIN, QueryBudget(5)),
+    Endpoint('admin_offer_list', ADMIN, QueryBudget(7), items=_all_offers),
+    Endpoint('admin_change_state', ADMIN, QueryBudget(4), args=lambda ctx: [ctx.offer_id, 'Validée']),
+    Endpoint('admin_user_list', ADMIN, QueryBudget(8, per_item=5), items=_all_users),
+    Endpoint('admin_user_update_role', ADMIN, QueryBudget(8), method='POST',
+             args=lambda ctx: [ctx.users['Responsable'].pk], data=lambda ctx: {'group_name': 'Responsable'}),
+]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def response_size(response):
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+def response_items(response):
+    if 'json' not in response.get('Content-Type', ''):
+        return 0
+    try:
+        data = json.loads(response.content)
+    except ValueError:
+        return 0
+    if isinstance(data, dict):
+        data = data.get('results', data)
+    return len(data) if isinstance(data, list) else 0
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@contextmanager
+def bench_context():
+    """
+    BenchContext dans une transaction annulée à la sortie : comptes bench_*, sessions et
+    last_login des connexions, écritures des routes... rien n'est conservé. Réservé aux
+    mesures sur une seule connexion (pas aux threads de concurrency.py).
+    """
+    with transaction.atomic():
+        try:
+            yield BenchContext()
+        finally:
+            transaction.set_rollback(True)
+
+
+def benchmark_settings():
+    """
+    Le client de test utilise l'hôte « testserver » ; les e-mails ne doivent pas partir
+    et l'instrumentation de développement ne doit pas fausser les mesures
+    """
+    return override_settings(
+        ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+        EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+        NPLUSONE_ENABLED=False,
+        SERVER_TIMING_SAMPLE_RATE=0,
+        SLOW_QUERY_THRESHOLD_MS=None,
+    )
+
+
+def call_endpoint(client, endpoint, ctx):
+    """Appelle la route dans une transaction annulée ; retourne (réponse, durée, requêtes, taille)"""
+    url = endpoint.url(ctx)
+    data = endpoint.data(ctx) if endpoint.data else None
+    body = json.dumps(data) if data is not None and endpoint.url_name.startswith('api-') else None
+
+    counter = QueryCounter()
+    with transaction.atomic():
+        with execute_wrapper(counter):
+            started = time.perf_counter()
+            if body is not None:
+                response = client.generic(endpoint.method, url, body, content_type='application/json')
+            elif endpoint.method == 'POST':
+                response = client.post(url, data or {})
+            else:
+                response = client.generic(endpoint.method, url)
+            size = response_size(response)
+            elapsed = time.perf_counter() - started
+        transaction.set_rollback(True)
+    return response, elapsed, counter.count, size
+
+
+def run_benchmark(iterations=10, roles=None, only=None, stdout=None):
+    """
+    Exécute la suite. `only` filtre les routes par sous-chaîne du libellé.
+    Retourne un dict sérialisable en JSON (voir write_results).
+    """
+    dataset = {
+        'users': User.objects.count(),
+        'offers': StageOffer.objects.count(),
+        'candidatures': Candidature.objects.count(),
+        'favorites': Favorite.objects.count(),
+    }
+    results = []
+    with bench_context() as ctx, benchmark_settings():
+        for endpoint in ENDPOINTS:
+            if only and not any(pattern in endpoint.label for pattern in only):
+                continue
+            for role in endpoint.roles:
+                if roles and role not in roles:
+                    continue
+                client = Client()
+                user = ctx.users[role]
+                if user is not None:
+                    client.force_login(user)
+
+                call_endpoint(client, endpoint, ctx)  # Échauffement (caches, sessions)
+                timings = []
+                for _ in range(iterations):
+                    if endpoint.relogin and user is not None:
+                        client.force_login(user)
+                    response, elapsed, query_count, size = call_endpoint(client, endpoint, ctx)
+                    timings.append(elapsed * 1000)
+
+                items = endpoint.items(ctx) if endpoint.items else response_items(response)
+                allowed = endpoint.budget.allowed(items)
+                row = {
+                    'endpoint': endpoint.label,
+                    'url_name': endpoint.url_name,
+                    'method': endpoint.method,
+                    'role': role,
+                    'status': response.status_code,
+                    'p50_ms': round(percentile(timings, 0.5), 2),
+                    'p95_ms': round(percentile(timings, 0.95), 2),
+                    'queries': query_count,
+                    'items': items,
+                    'budget': allowed,
+                    'bytes': size,
+                    'over_budget': query_count > allowed,
+                }
+                results.append(row)
+                if stdout is not None:
+                    flag = '  !! BUDGET' if row['over_budget'] else ''
+                    stdout.write(
+                        f"{row['method']:6} {row['endpoint']:42} {role:14} {row['status']:>3} "
+                        f"p50={row['p50_ms']:>8.1f}ms p95={row['p95_ms']:>8.1f}ms "
+                        f"q={query_count:>4}/{allowed:<5} {size:>9}B{flag}"
+                    )
+
+    return {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'iterations': iterations,
+        'dataset': dataset,
+        'results': results,
+    }
+
+
+def budget_violations(report):
+    return [row for row in report['results'] if row['over_budget']]
+
+
+def compare_reports(previous, current):
+    """Lignes (route, rôle, Δp50 %, Δrequêtes) entre deux rapports"""
+    index = {(r['endpoint'], r['method'], r['role']): r for r in previous['results']}
+    rows = []
+    for row in current['results']:
+        old = index.get((row['endpoint'], row['method'], row['role']))
+        if not old:
+            continue
+        delta_p50 = (row['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100 if old['p50_ms'] else 0
+        rows.append((row['endpoint'], row['role'], delta_p50, row['queries'] - old['queries']))
+    return rows
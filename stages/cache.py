@@ -0,0 +1,258 @@
+"""
+Cache à deux niveaux, partagé entre les workers.
+
+- Niveau 1 : LRU en mémoire du processus (LOCAL_MAX_ENTRIES entrées, LOCAL_TIMEOUT secondes) ;
+- Niveau 2 : cache partagé (alias LOCATION de CACHES : fichiers ou Redis).
+
+TieredCache est le backend de l'alias 'default' : tout ce qui passe par
+django.core.cache.cache lit d'abord le niveau 1. Une suppression n'atteint que le
+niveau 1 du worker courant ; dans les autres, l'ancienne valeur vit au plus LOCAL_TIMEOUT.
+
+Pour les données dérivées des modèles, `cached(namespaces, key, compute)` préfixe la clé
+par la version de chaque espace de noms ('offers', 'candidatures'...), lue à chaque appel
+dans le niveau 2. Une écriture appelle `bump()` (signaux, voir signals.py) : tous les
+workers calculent alors de nouvelles clés à leur lecture suivante, et les anciennes
+entrées expirent d'elles-mêmes.
+
+Une valeur calculée sur 'reports' (stages/dbrouter.py : instantané ou réplique, en retard
+sur la base principale) est rangée sous une clé distincte : un client épinglé sur la base
+principale après une écriture ne la reçoit jamais.
+"""
+import threading
+import time
+from collections import OrderedDict
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches, cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.db import transaction
+from .dbrouter import REPORTS_ALIAS, reads_reports
+
+
+# Espaces de noms invalidés par les écritures sur chaque modèle
+MODEL_NAMESPACES = {
+    'stageoffer': ('offers',),
+    'candidature': ('candidatures',),
+    'favorite': ('favorites',),
+}
+
+VERSION_KEY = 'ns:{}'
+
+# Favoris d'un étudiant (favorite_ids) : un espace de noms par étudiant, pour que le
+# favori ajouté par l'un n'invalide pas la liste en cache de tous les autres
+STUDENT_FAVORITES_NAMESPACE = 'favorites:{}'
+
+# Profil d'un utilisateur mis en cache en session (authentication.py) : invalidé quand son
+# mot de passe, son état actif ou ses groupes changent (signals.py)
+USER_NAMESPACE = 'user:{}'
+
+_MISSING = object()
+
+
+class LocalLRU:
+    """Dictionnaire LRU borné, à expiration, protégé par un verrou (threads d'un même worker)"""
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        if timeout <= 0:
+            self.delete(key)
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TieredCache(BaseCache):
+    """
+    CACHES = {'default': {'BACKEND': 'stages.cache.TieredCache', 'LOCATION': 'shared',
+                          'OPTIONS': {'LOCAL_TIMEOUT': 5, 'LOCAL_MAX_ENTRIES': 1000}}}
+    """
+
+    def __init__(self, location, params):
+        options = dict(params.get('OPTIONS') or {})
+        local_timeout = options.pop('LOCAL_TIMEOUT', 5)
+        local_max_entries = options.pop('LOCAL_MAX_ENTRIES', 1000)
+        super().__init__({**params, 'OPTIONS': options})
+        self.shared_alias = location
+        self.local = LocalLRU(local_max_entries, local_timeout)
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def _timeout(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        value = self.local.get(local_key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = self.shared.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            return default
+        self.local.set(local_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        missing = []
+        for key in keys:
+            value = self.local.get(self.make_and_validate_key(key, version=version), _MISSING)
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing:
+            for key, value in self.shared.get_many(missing, version=version).items():
+                self.local.set(self.make_and_validate_key(key, version=version), value)
+                found[key] = value
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        self.shared.set(key, value, timeout, version=version)
+        self.local.set(self.make_and_validate_key(key, version=version), value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self.local.set(self.make_and_validate_key(key, version=version), value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, self._timeout(timeout), version=version)
+
+    def delete(self, key, version=None):
+        self.local.delete(self.make_and_validate_key(key, version=version))
+        return self.shared.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        if self.local.get(self.make_and_validate_key(key, version=version), _MISSING) is not _MISSING:
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        # Compteurs : toujours le niveau partagé, seule source cohérente entre workers
+        self.local.delete(self.make_and_validate_key(key, version=version))
+        return self.shared.incr(key, delta, version=version)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+
+def shared_cache():
+    """Niveau partagé de l'alias 'default' (ou l'alias lui-même s'il n'est pas à deux niveaux)"""
+    default = caches[DEFAULT_CACHE_ALIAS]
+    return default.shared if isinstance(default, TieredCache) else default
+
+
+def initial_version():
+    return time.time_ns() // 1000
+
+
+def namespace_versions(namespaces):
+    """Versions courantes, toujours lues dans le niveau partagé"""
+    shared = shared_cache()
+    keys = [VERSION_KEY.format(namespace) for namespace in namespaces]
+    versions = shared.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Version absente (premier appel, ou évincée du cache partagé) : repartir d'une
+            # valeur horodatée et non de 1, pour ne pas retomber sur d'anciennes entrées
+            shared.add(key, initial_version(), timeout=None)
+            versions[key] = shared.get(key)
+    return [versions[key] for key in keys]
+
+
+def versioned_key(namespaces, key):
+    versions = namespace_versions(namespaces)
+    return ':'.join([key] + [f'{namespace}.{version}' for namespace, version in zip(namespaces, versions)])
+
+
+def source_key(key):
+    """Clé distincte pour les valeurs lues sur 'reports'"""
+    return f'{key}@{REPORTS_ALIAS}' if reads_reports() else key
+
+
+def cached(namespaces, key, compute, timeout=DEFAULT_TIMEOUT):
+    """Valeur de compute(), mise en cache jusqu'à la prochaine écriture dans l'un des espaces de noms"""
+    full_key = versioned_key(namespaces, source_key(key))
+    value = cache.get(full_key, _MISSING)
+    if value is _MISSING:
+        value = compute()
+        cache.set(full_key, value, timeout)
+    return value
+
+
+async def acached(namespaces, key, compute, timeout=DEFAULT_TIMEOUT):
+    """Variante asynchrone de cached() : compute est une coroutine"""
+    from asgiref.sync import sync_to_async
+    full_key = await sync_to_async(versioned_key)(namespaces, source_key(key))
+    value = await cache.aget(full_key, _MISSING)
+    if value is _MISSING:
+        value = await compute()
+        await cache.aset(full_key, value, timeout)
+    return value
+
+
+def _bump_now(namespaces):
+    shared = shared_cache()
+    for namespace in namespaces:
+        key = VERSION_KEY.format(namespace)
+        try:
+            # Atomique sous Redis ; avec le cache fichiers, deux incréments simultanés
+            # peuvent n'en faire qu'un, la version change tout de même
+            shared.incr(key)
+        except ValueError:
+            shared.add(key, initial_version(), timeout=None)
+
+
+def bump(*namespaces):
+    """
+    Invalide les espaces de noms. Incrémenté tout de suite (les lectures de la
+    transaction en cours voient le changement), puis de nouveau à la validation :
+    une valeur recalculée par un autre worker avant le COMMIT est ainsi écartée.
+    """
+    _bump_now(namespaces)
+    transaction.on_commit(lambda: _bump_now(namespaces))
+
+
+def bump_for_model(model):
+    namespaces = MODEL_NAMESPACES.get(model._meta.model_name)
+    if namespaces:
+        bump(*namespaces)
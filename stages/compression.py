@@ -0,0 +1,160 @@
+"""
+Compression à la volée des réponses de l'API (voir CompressionMiddleware).
+
+Codages proposés, dans l'ordre de préférence du serveur (COMPRESSION_ENCODINGS) :
+zstd (paquet zstandard), br (paquet Brotli), gzip (zlib). Ceux dont le paquet n'est
+pas installé sont ignorés. Les niveaux (COMPRESSION_LEVELS) sont choisis pour le
+temps réel : bien plus bas que ceux des fichiers précompressés (stages/assets.py).
+Voir la commande benchmark_compression pour le compromis CPU / octets économisés.
+"""
+import zlib
+from django.conf import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+DEFAULT_ENCODINGS = ['zstd', 'br', 'gzip']
+DEFAULT_LEVELS = {'zstd': 3, 'br': 4, 'gzip': 6}
+
+
+class Codec:
+    """compress(data, level) pour un corps complet, compressor(level) pour un flux"""
+    name = None
+
+    def compress(self, data, level):
+        compressor = self.compressor(level)
+        return compressor.compress(data) + compressor.finish()
+
+
+class GzipCodec(Codec):
+    name = 'gzip'
+
+    class Compressor:
+        def __init__(self, level):
+            # wbits=31 : en-tête et somme de contrôle gzip
+            self.zobj = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+        def compress(self, data):
+            return self.zobj.compress(data)
+
+        def flush(self):
+            return self.zobj.flush(zlib.Z_SYNC_FLUSH)
+
+        def finish(self):
+            return self.zobj.flush(zlib.Z_FINISH)
+
+    def compressor(self, level):
+        return self.Compressor(level)
+
+
+class BrotliCodec(Codec):
+    name = 'br'
+
+    class Compressor:
+        def __init__(self, level):
+            self.obj = brotli.Compressor(quality=level)
+
+        def compress(self, data):
+            return self.obj.process(data)
+
+        def flush(self):
+            return self.obj.flush()
+
+        def finish(self):
+            return self.obj.finish()
+
+    def compress(self, data, level):
+        return brotli.compress(data, quality=level)
+
+    def compressor(self, level):
+        return self.Compressor(level)
+
+
+class ZstdCodec(Codec):
+    name = 'zstd'
+
+    class Compressor:
+        def __init__(self, level):
+            self.obj = zstandard.ZstdCompressor(level=level).compressobj()
+
+        def compress(self, data):
+            return self.obj.compress(data)
+
+        def flush(self):
+            return self.obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+        def finish(self):
+            return self.obj.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+    def compress(self, data, level):
+        return zstandard.ZstdCompressor(level=level).compress(data)
+
+    def compressor(self, level):
+        return self.Compressor(level)
+
+
+CODECS = {'gzip': GzipCodec()}
+if brotli is not None:
+    CODECS['br'] = BrotliCodec()
+if zstandard is not None:
+    CODECS['zstd'] = ZstdCodec()
+
+
+def parse_accept_encoding(header):
+    """{codage: q} d'un en-tête Accept-Encoding"""
+    qualities = {}
+    for part in (header or '').split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        name, _, value = params.strip().partition('=')
+        try:
+            qualities[coding] = float(value) if name.strip() == 'q' else 1.0
+        except ValueError:
+            qualities[coding] = 1.0
+    return qualities
+
+
+def negotiate(header, encodings=None):
+    """Codage à utiliser : le mieux noté par le client, à égalité l'ordre du serveur ; None sinon"""
+    qualities = parse_accept_encoding(header)
+    best = None
+    for rank, encoding in enumerate(encodings or getattr(settings, 'COMPRESSION_ENCODINGS', DEFAULT_ENCODINGS)):
+        if encoding not in CODECS:
+            continue
+        quality = qualities.get(encoding, qualities.get('*', 0))
+        if quality > 0 and (best is None or quality > best[0]):
+            best = (quality, encoding)
+    return best[1] if best else None
+
+
+def level_for(encoding):
+    return {**DEFAULT_LEVELS, **getattr(settings, 'COMPRESSION_LEVELS', {})}[encoding]
+
+
+def compress_stream(chunks, encoding, level):
+    """Compresse un flux morceau par morceau ; chaque morceau est vidé pour partir tout de suite"""
+    compressor = CODECS[encoding].compressor(level)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def acompress_stream(chunks, encoding, level):
+    compressor = CODECS[encoding].compressor(level)
+    async for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
@@ -0,0 +1,70 @@
+"""
+Coût CPU et octets économisés par la compression des réponses de l'API, par codage
+et par niveau, sur les vraies réponses de /api/offers/ et /api/candidatures/ (données
+de la base courante, vues par un responsable : le cas le plus volumineux).
+"""
+import time
+from django.test import Client
+from django.urls import reverse
+from .benchmark import bench_context, benchmark_settings, percentile
+from .compression import CODECS, DEFAULT_LEVELS
+
+
+PAYLOADS = ['api-offer-list', 'api-candidature-list']
+
+LEVELS = {
+    'gzip': [1, 6, 9],
+    'br': [1, 4, 6, 11],
+    'zstd': [1, 3, 9, 19],
+}
+
+
+def fetch_payloads(names=PAYLOADS):
+    payloads = {}
+    with bench_context() as ctx, benchmark_settings():
+        client = Client()
+        client.force_login(ctx.users['Responsable'])
+        for name in names:
+            response = client.get(reverse(name))
+            payloads[name] = response.content
+    return payloads
+
+
+def measure(data, encoding, level, repeat):
+    codec = CODECS[encoding]
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        compressed = codec.compress(data, level)
+        timings.append(time.perf_counter() - started)
+    median = percentile(timings, 0.5)
+    return {
+        'encoding': encoding,
+        'level': level,
+        'default': DEFAULT_LEVELS.get(encoding) == level,
+        'bytes': len(compressed),
+        'ratio': round(len(data) / max(len(compressed), 1), 2),
+        'saved_pct': round(100 * (1 - len(compressed) / max(len(data), 1)), 1),
+        'cpu_ms': round(median * 1000, 2),
+        'mb_per_s': round(len(data) / median / 1e6, 1) if median else None,
+    }
+
+
+def run_compression(repeat=5, only=None, stdout=None):
+    results = []
+    for name, data in fetch_payloads().items():
+        if stdout is not None:
+            stdout.write(f'{name} : {len(data)} octets')
+        for encoding, levels in LEVELS.items():
+            if encoding not in CODECS or (only and encoding not in only):
+                continue
+            for level in levels:
+                row = {'payload': name, 'original_bytes': len(data), **measure(data, encoding, level, repeat)}
+                results.append(row)
+                if stdout is not None:
+                    marker = '*' if row['default'] else ' '
+                    stdout.write(
+                        f"  {encoding:4} {level:>2}{marker} {row['bytes']:>10} o  x{row['ratio']:<6} "
+                        f"-{row['saved_pct']:>5}%  {row['cpu_ms']:>9.2f} ms  {row['mb_per_s'] or 0:>7.1f} Mo/s"
+                    )
+    return {'repeat': repeat, 'available': sorted(CODECS), 'results': results}
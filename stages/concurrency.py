@@ -0,0 +1,190 @@
+"""
+Comparaison de capacité entre déploiement WSGI (vues synchrones) et ASGI (async_views.py).
+
+Les deux gestionnaires de Django sont appelés en mémoire, sans serveur HTTP :
+- WSGI : WSGIHandler exécuté par un pool de `threads` threads (un worker gthread) ;
+  chaque client attend qu'un thread soit libre ;
+- ASGI : ASGIHandler sur une seule boucle asyncio, un contexte par requête.
+
+`concurrency` clients enchaînent chacun `requests` appels. Un client lent est simulé
+par `latency` secondes d'envoi de la réponse : en WSGI le thread reste occupé
+pendant ce temps, en ASGI la boucle sert les autres requêtes.
+"""
+import asyncio
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.urls import reverse
+from .authentication import issue_tokens
+from .benchmark import BenchContext, benchmark_settings, percentile
+
+
+# (route synchrone, route asynchrone équivalente)
+PAIRS = [
+    ('api-offer-list', 'api-async-offer-list'),
+    ('api-offer-detail', 'api-async-offer-detail'),
+    ('api-current-user', 'api-async-current-user'),
+    ('api-favorites', 'api-async-favorites'),
+    ('api-is-favorite', 'api-async-is-favorite'),
+]
+
+HOST = 'testserver'
+
+
+def wsgi_call(app, path, token, latency):
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': HOST,
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': HOST,
+        'HTTP_AUTHORIZATION': f'Bearer {token}',
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.url_scheme': 'http',
+        'wsgi.version': (1, 0),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    status = []
+    response = app(environ, lambda s, headers, exc_info=None: status.append(int(s.split()[0])))
+    try:
+        for _ in response:
+            pass
+        time.sleep(latency)
+    finally:
+        response.close()
+    return status[0]
+
+
+async def asgi_call(app, path, token, latency):
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'headers': [(b'host', HOST.encode()), (b'authorization', f'Bearer {token}'.encode())],
+        'client': ('127.0.0.1', 0),
+        'server': (HOST, 80),
+    }
+    status = []
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # Le client ne se déconnecte pas : Django annule cette attente en fin de réponse
+        await asyncio.Future()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+        elif not message.get('more_body'):
+            await asyncio.sleep(latency)
+
+    await app(scope, receive, send)
+    return status[0]
+
+
+def summarize(server, label, concurrency, timings, statuses, elapsed):
+    return {
+        'server': server,
+        'endpoint': label,
+        'concurrency': concurrency,
+        'requests': len(timings),
+        'errors': sum(1 for status in statuses if status >= 400),
+        'rps': round(len(timings) / elapsed, 1),
+        'p50_ms': round(percentile(timings, 0.5), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+    }
+
+
+def run_wsgi(path, token, concurrency, requests, threads, latency):
+    app = WSGIHandler()
+    workers = threading.BoundedSemaphore(threads)
+
+    def client():
+        results = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            with workers:
+                status = wsgi_call(app, path, token, latency)
+            results.append((time.perf_counter() - started, status))
+        return results
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = [row for rows in pool.map(lambda _: client(), range(concurrency)) for row in rows]
+    return time.perf_counter() - started, results
+
+
+def run_asgi(path, token, concurrency, requests, latency):
+    app = ASGIHandler()
+
+    async def client():
+        results = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            status = await asgi_call(app, path, token, latency)
+            results.append((time.perf_counter() - started, status))
+        return results
+
+    async def main():
+        return await asyncio.gather(*(client() for _ in range(concurrency)))
+
+    started = time.perf_counter()
+    results = [row for rows in asyncio.run(main()) for row in rows]
+    return time.perf_counter() - started, results
+
+
+def run_concurrency(levels=(1, 10, 50, 200), requests=5, threads=8, latency=0.05, only=None, stdout=None):
+    """
+    Débit (req/s) et latence p50/p95 vus par les clients, pour chaque paire de routes
+    et chaque niveau de concurrence. Authentification par jeton d'accès d'un étudiant.
+    """
+    # Threads et boucle asyncio ont leurs propres connexions : pas de transaction annulée
+    # possible, donc aucun compte créé (ValueError si la base n'a pas d'étudiant)
+    ctx = BenchContext(create_users=False)
+    token = issue_tokens(ctx.users['Etudiant'])['access']
+    args = {'api-offer-detail': [ctx.offer_id], 'api-is-favorite': [ctx.offer_id]}
+    results = []
+    with benchmark_settings():
+        for sync_name, async_name in PAIRS:
+            if only and not any(pattern in sync_name for pattern in only):
+                continue
+            route_args = args.get(sync_name)
+            sync_path = reverse(sync_name, args=route_args)
+            async_path = reverse(async_name, args=route_args)
+            for concurrency in levels:
+                runs = [
+                    ('wsgi', run_wsgi(sync_path, token, concurrency, requests, threads, latency)),
+                    ('asgi', run_asgi(async_path, token, concurrency, requests, latency)),
+                ]
+                for server, (elapsed, rows) in runs:
+                    row = summarize(server, sync_name, concurrency, [t * 1000 for t, _ in rows], [s for _, s in rows], elapsed)
+                    results.append(row)
+                    if stdout is not None:
+                        stdout.write(
+                            f"{server:4} {sync_name:22} c={concurrency:<5} {row['rps']:>8.1f} req/s "
+                            f"p50={row['p50_ms']:>8.1f}ms p95={row['p95_ms']:>8.1f}ms erreurs={row['errors']}"
+                        )
+    return {
+        'threads': threads,
+        'latency_ms': latency * 1000,
+        'requests_per_client': requests,
+        'results': results,
+    }
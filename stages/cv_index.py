@@ -0,0 +1,178 @@
+"""
+Extraction du texte des CV (hors requête) et index plein texte des candidats.
+
+Sous SQLite, le texte est indexé dans la table virtuelle FTS5 `stages_cv_fts`
+(rowid = id du StudentProfile) et classé par bm25. Sous PostgreSQL, un index GIN
+sur to_tsvector(cv_text) (migration 0011) sert une recherche classée par ts_rank.
+Les autres bases retombent sur une recherche icontains classée par nombre de mots trouvés.
+"""
+import re
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import StudentProfile
+
+
+FTS_TABLE = 'stages_cv_fts'
+
+# Configuration de recherche PostgreSQL : sans racinisation, comme le tokenizer unicode61 de FTS5
+PG_SEARCH_CONFIG = 'simple'
+
+# Au-delà, le texte est tronqué (CV anormalement longs)
+MAX_CV_TEXT_LENGTH = 200_000
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def cv_search_vector():
+    """Expression indexée par la migration 0011 et utilisée par rank_profiles sous PostgreSQL"""
+    from django.contrib.postgres.search import SearchVector
+    return SearchVector('cv_text', config=PG_SEARCH_CONFIG)
+
+
+def extract_pdf_text(file):
+    """Extrait le texte d'un PDF (objet fichier binaire)"""
+    from pypdf import PdfReader  # Import paresseux : seul le worker en a besoin
+
+    reader = PdfReader(file)
+    parts = []
+    length = 0
+    for page in reader.pages:
+        text = page.extract_text() or ''
+        parts.append(text)
+        length += len(text)
+        if length >= MAX_CV_TEXT_LENGTH:
+            break
+    return '\n'.join(parts)[:MAX_CV_TEXT_LENGTH]
+
+
+def index_profile(profile_id, text):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [profile_id])
+        if text:
+            cursor.execute(f'INSERT INTO {FTS_TABLE}(rowid, cv_text) VALUES (%s, %s)', [profile_id, text])
+
+
+def unindex_profile(profile_id):
+    index_profile(profile_id, '')
+
+
+def process_profile(profile):
+    """
+    Extrait et indexe le CV d'un profil. Retourne le nouveau statut, ou None si le CV
+    a été remplacé pendant l'extraction (le nouveau reste « En attente »).
+    """
+    text = ''
+    status = ''
+    if profile.cv:
+        if not profile.cv.name.lower().endswith('.pdf'):
+            status = 'Échec'
+        else:
+            try:
+                with profile.cv.open('rb') as f:
+                    text = extract_pdf_text(f)
+                status = 'Extrait'
+            except Exception as e:
+                print(f"Failed to extract CV text for profile {profile.pk}: {e}")
+                status = 'Échec'
+
+    with transaction.atomic():
+        # Seulement si le CV est toujours celui qui vient d'être lu
+        updated = StudentProfile.objects.filter(pk=profile.pk, cv=profile.cv.name or '').update(
+            cv_text=text,
+            cv_text_status=status,
+            cv_text_updated_at=timezone.now(),
+        )
+        if not updated:
+            return None
+        index_profile(profile.pk, text)
+    return status
+
+
+def process_pending(limit=50):
+    """Traite un lot de profils en attente d'extraction. Retourne le nombre traité."""
+    ids = list(
+        StudentProfile.objects.filter(cv_text_status='En attente')
+        .order_by('pk').values_list('pk', flat=True)[:limit]
+    )
+    if not ids:
+        return 0
+    for profile in StudentProfile.objects.filter(pk__in=ids).only('pk', 'cv'):
+        process_profile(profile)
+    return len(ids)
+
+
+def search_terms(query):
+    return [w.lower() for w in WORD_RE.findall(query or '')][:20]
+
+
+def rank_profiles(profile_ids, query):
+    """
+    Retourne {profile_id: score} pour les profils dont le CV correspond à la requête
+    (score croissant = plus pertinent).
+    """
+    terms = search_terms(query)
+    profile_ids = list(profile_ids)
+    if not terms or not profile_ids:
+        return {}
+
+    if fts_available():
+        match = ' OR '.join(f'"{term}"*' for term in terms)
+        placeholders = ', '.join(['%s'] * len(profile_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, bm25({FTS_TABLE}) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s AND rowid IN ({placeholders})',
+                [match, *profile_ids],
+            )
+            return {row[0]: row[1] for row in cursor.fetchall()}
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+        # Préfixes (terme:*) comme "terme"* sous FTS5 ; les termes ne contiennent que des \w
+        query = SearchQuery(' | '.join(f'{term}:*' for term in terms), search_type='raw', config=PG_SEARCH_CONFIG)
+        vector = cv_search_vector()
+        rows = (
+            StudentProfile.objects.filter(pk__in=profile_ids)
+            .annotate(document=vector).filter(document=query)
+            .annotate(rank=SearchRank(vector, query))
+            .values_list('pk', 'rank')
+        )
+        return {pk: -rank for pk, rank in rows}
+
+    scores = {}
+    for pk, text in StudentProfile.objects.filter(pk__in=profile_ids).values_list('pk', 'cv_text'):
+        text = (text or '').lower()
+        found = sum(1 for term in terms if term in text)
+        if found:
+            scores[pk] = -found
+    return scores
+
+
+def rank_candidatures(candidatures, query):
+    """
+    Filtre et trie des candidatures selon la correspondance du CV de l'étudiant avec la requête.
+    Chaque candidature retournée porte un attribut `cv_score`.
+    """
+    candidatures = list(candidatures.select_related('student__studentprofile'))
+    profile_by_candidature = {}
+    for cand in candidatures:
+        try:
+            profile_by_candidature[cand.pk] = cand.student.studentprofile.pk
+        except StudentProfile.DoesNotExist:
+            pass
+
+    scores = rank_profiles(profile_by_candidature.values(), query)
+    ranked = []
+    for cand in candidatures:
+        profile_id = profile_by_candidature.get(cand.pk)
+        if profile_id in scores:
+            cand.cv_score = scores[profile_id]
+            ranked.append(cand)
+    ranked.sort(key=lambda c: c.cv_score)
+    return ranked
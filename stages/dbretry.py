@@ -0,0 +1,51 @@
+"""
+Nouvelle tentative, avec attente exponentielle, sur les erreurs de verrou SQLite.
+
+Avec busy_timeout, SQLite attend déjà que le verrou se libère : l'erreur
+« database is locked » ne remonte qu'après ce délai (pic d'écritures). La vue
+décorée est alors rejouée en entier ; ses écritures doivent donc être groupées
+dans un transaction.atomic() (annulé avant la nouvelle tentative) et ses effets
+externes (e-mails) placés après. Dans un bloc atomic englobant, l'erreur est
+propagée : seule la transaction la plus externe peut être rejouée.
+"""
+import functools
+import logging
+import random
+import time
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from .metrics import DB_LOCK_RETRIES
+
+
+logger = logging.getLogger('stages.dbretry')
+
+LOCK_MESSAGES = ('database is locked', 'database table is locked', 'database schema is locked')
+
+
+def is_lock_error(exc):
+    return isinstance(exc, OperationalError) and any(message in str(exc) for message in LOCK_MESSAGES)
+
+
+def retry_on_lock(func=None, *, attempts=None, delay=None, using=DEFAULT_DB_ALIAS):
+    """
+    Décorateur : rejoue func sur erreur de verrou, jusqu'à `attempts` fois
+    (DB_LOCK_RETRY_ATTEMPTS), en attendant delay, 2*delay, 4*delay... (DB_LOCK_RETRY_DELAY, ±50 %).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            max_attempts = attempts or getattr(settings, 'DB_LOCK_RETRY_ATTEMPTS', 5)
+            base_delay = delay if delay is not None else getattr(settings, 'DB_LOCK_RETRY_DELAY', 0.05)
+            for attempt in range(1, max_attempts + 1):
+                try:
+                    return func(*args, **kwargs)
+                except OperationalError as e:
+                    if not is_lock_error(e) or attempt == max_attempts or connections[using].in_atomic_block:
+                        raise
+                    wait = base_delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                    DB_LOCK_RETRIES.inc(view=func.__name__)
+                    logger.warning('%s : %s, nouvelle tentative %d/%d dans %.0f ms',
+                                   func.__qualname__, e, attempt + 1, max_attempts, wait * 1000)
+                    time.sleep(wait)
+        return wrapper
+    return decorator(func) if func is not None else decorator
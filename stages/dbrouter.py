@@ -0,0 +1,163 @@
+"""
+Lectures des rapports sur une connexion dédiée ('reports').
+
+Les vues désignées (REPORT_VIEWS) et les blocs `with reporting():` lisent les modèles
+de l'application stages sur l'alias 'reports' : une réplique PostgreSQL, ou sous
+SQLite un instantané de la base recopié par l'API de sauvegarde en ligne
+(refresh_snapshot, lancé par `refresh_reports_snapshot --loop`, jamais pendant une
+requête). Un instantané en retard reste servi ; tant qu'il n'existe pas, les lectures
+restent sur la base principale. Les rapports ne prennent ainsi aucun verrou sur la
+base des candidatures.
+
+Lecture de ses propres écritures : dès qu'une requête écrit, ses lectures suivantes
+repassent sur la base principale, et ReportRoutingMiddleware épingle le client sur
+la base principale pendant REPORTS_STICKY_SECONDS (cookie).
+
+Sessions, utilisateurs et autres applications restent toujours sur 'default'.
+Si 'reports' désigne la même base que 'default' (non configuré, ou miroir de test),
+le routeur ne fait rien.
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+REPORTS_ALIAS = 'reports'
+ROUTED_APPS = {'stages'}
+
+_state = ContextVar('stages_db_routing', default=None)
+
+_snapshot_checked = {'path': None, 'at': 0.0}
+
+
+class RoutingState:
+    def __init__(self, pinned=False):
+        self.reporting = False
+        self.pinned = pinned
+        self.wrote = False
+
+
+def start_routing(pinned=False):
+    state = RoutingState(pinned)
+    return state, _state.set(state)
+
+
+def stop_routing(token):
+    _state.reset(token)
+
+
+class reporting(ContextDecorator):
+    """Les lectures du bloc (ou de la fonction décorée) peuvent être servies par 'reports'"""
+
+    def _recreate_cm(self):
+        # Une instance par appel de la fonction décorée (appels concurrents ou imbriqués)
+        return type(self)()
+
+    def __enter__(self):
+        state = _state.get()
+        self.token = None
+        if state is None:
+            state, self.token = start_routing()
+        self.previous = state.reporting
+        state.reporting = True
+        return self
+
+    def __exit__(self, *exc):
+        _state.get().reporting = self.previous
+        if self.token is not None:
+            stop_routing(self.token)
+        return False
+
+
+def same_database(a, b):
+    keys = ('ENGINE', 'NAME', 'HOST', 'PORT')
+    return all(str(a.get(key) or '') == str(b.get(key) or '') for key in keys)
+
+
+def reports_configured():
+    if REPORTS_ALIAS not in settings.DATABASES:
+        return False
+    return not same_database(connections[REPORTS_ALIAS].settings_dict, connections[DEFAULT_DB_ALIAS].settings_dict)
+
+
+def snapshot_path():
+    return getattr(settings, 'REPORTS_SNAPSHOT_PATH', None)
+
+
+def refresh_snapshot(path=None, using=DEFAULT_DB_ALIAS):
+    """
+    Recopie la base SQLite `using` dans `path` (API de sauvegarde en ligne : lecture
+    cohérente sans bloquer les écritures en mode WAL), puis remplace l'instantané.
+    Les connexions déjà ouvertes sur l'ancien fichier le lisent jusqu'à leur fermeture.
+    """
+    path = str(path or snapshot_path())
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    # Connexion dédiée : celle de la requête peut être dans une transaction d'écriture,
+    # et l'instantané ne doit contenir que des données validées
+    source = sqlite3.connect(connections[using].settings_dict['NAME'], uri=True)
+    target = sqlite3.connect(tmp_path)
+    try:
+        source.backup(target)
+        # L'instantané est lu seul : pas besoin de fichiers -wal/-shm
+        target.execute('PRAGMA journal_mode=DELETE')
+    finally:
+        target.close()
+        source.close()
+    os.replace(tmp_path, path)
+    _snapshot_checked.update(path=path, at=time.monotonic())
+
+
+def snapshot_exists():
+    """
+    Vrai si l'instantané SQLite existe, même en retard : le rafraîchir est l'affaire de
+    `refresh_reports_snapshot --loop`, pas d'une requête (copie de toute la base).
+    """
+    path = str(snapshot_path())
+    now = time.monotonic()
+    # Au plus un stat() par seconde une fois l'instantané trouvé
+    if _snapshot_checked['path'] == path and now - _snapshot_checked['at'] < 1:
+        return True
+    if not os.path.exists(path):
+        return False
+    _snapshot_checked.update(path=path, at=now)
+    return True
+
+
+def reads_reports():
+    """
+    Vrai si les lectures des modèles de ROUTED_APPS vont sur 'reports' dans le contexte
+    courant (l'instantané n'est ni vérifié ni rafraîchi ici)
+    """
+    state = _state.get()
+    if state is None or not state.reporting or state.pinned or state.wrote:
+        return False
+    return reports_configured()
+
+
+class ReportRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in ROUTED_APPS:
+            return None
+        if not reads_reports():
+            return None
+        if snapshot_path() and not snapshot_exists():
+            return None
+        return REPORTS_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None and model._meta.app_label in ROUTED_APPS:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Même contenu sur les deux alias (réplique ou instantané)
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db != REPORTS_ALIAS
@@ -0,0 +1,101 @@
+"""
+Test de charge SQLite : des écrivains (transactions lecture puis écriture tenant le
+verrou `hold` secondes, comme une candidature) et des lecteurs (SELECT en boucle)
+travaillent en parallèle sur une base temporaire ouverte avec les OPTIONS données.
+
+On mesure la latence des lecteurs (bloquent-ils derrière les écritures ?) et les
+erreurs « database is locked » des écrivains. Voir la commande stress_sqlite.
+"""
+import os
+import tempfile
+import threading
+import time
+from django.db import OperationalError
+from django.db.utils import ConnectionHandler
+from .benchmark import percentile
+from .dbretry import is_lock_error
+
+
+# Réglages SQLite par défaut de Django, avant WAL / busy_timeout / IMMEDIATE
+LEGACY_OPTIONS = {'init_command': 'PRAGMA journal_mode=DELETE'}
+
+
+def stress(options, writers=2, readers=4, duration=2.0, hold=0.05):
+    with tempfile.TemporaryDirectory() as directory:
+        # Alias distinct de ceux de settings.DATABASES ('default' est obligatoire, ici inutilisé)
+        handler = ConnectionHandler({'default': {}, 'stress': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(directory, 'stress.sqlite3'),
+            'OPTIONS': dict(options),
+        }})
+        try:
+            return run(handler, writers, readers, duration, hold)
+        finally:
+            handler.close_all()
+
+
+def run(handler, writers, readers, duration, hold):
+    with handler['stress'].cursor() as cursor:
+        cursor.execute('CREATE TABLE counter (id INTEGER PRIMARY KEY, value INTEGER)')
+        cursor.execute('INSERT INTO counter (id, value) VALUES (1, 0)')
+
+    lock = threading.Lock()
+    stats = {'reads': [], 'commits': 0, 'lock_errors': 0}
+    deadline = time.monotonic() + duration
+
+    def writer():
+        connection = handler['stress']
+        connection.ensure_connection()
+        try:
+            while time.monotonic() < deadline:
+                try:
+                    # Même séquence que transaction.atomic() sur SQLite
+                    connection._start_transaction_under_autocommit()
+                    with connection.cursor() as cursor:
+                        cursor.execute('SELECT value FROM counter WHERE id = 1')
+                        value = cursor.fetchone()[0]
+                        cursor.execute('UPDATE counter SET value = %s WHERE id = 1', [value + 1])
+                        time.sleep(hold)
+                        cursor.execute('COMMIT')
+                    with lock:
+                        stats['commits'] += 1
+                except OperationalError as e:
+                    if not is_lock_error(e):
+                        raise
+                    connection.connection.rollback()
+                    with lock:
+                        stats['lock_errors'] += 1
+        finally:
+            connection.close()
+
+    def reader():
+        connection = handler['stress']
+        try:
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT value FROM counter WHERE id = 1')
+                    cursor.fetchone()
+                elapsed = time.perf_counter() - started
+                with lock:
+                    stats['reads'].append(elapsed * 1000)
+                time.sleep(0.001)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=writer) for _ in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    reads = stats['reads'] or [0]
+    return {
+        'commits': stats['commits'],
+        'lock_errors': stats['lock_errors'],
+        'reads': len(stats['reads']),
+        'read_p50_ms': round(percentile(reads, 0.5), 2),
+        'read_p99_ms': round(percentile(reads, 0.99), 2),
+        'read_max_ms': round(max(reads), 2),
+    }
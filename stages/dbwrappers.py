@@ -0,0 +1,49 @@
+"""
+execute_wrapper valables en WSGI comme en ASGI.
+
+connection.execute_wrapper() ne s'applique qu'à la connexion du thread courant :
+dans une vue asynchrone, les requêtes de l'ORM asynchrone partent d'un autre thread
+(sync_to_async) et lui échappent. Un répartiteur unique est donc installé sur chaque
+connexion à sa création ; il applique les wrappers enregistrés dans une ContextVar,
+que asgiref propage aux threads de sync_to_async.
+"""
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.db.backends.signals import connection_created
+from django.db import connections
+
+
+_wrappers = ContextVar('stages_execute_wrappers', default=())
+
+
+def _dispatch(execute, sql, params, many, context):
+    wrappers = _wrappers.get()
+    for wrapper in reversed(wrappers):
+        execute = functools.partial(wrapper, execute)
+    return execute(sql, params, many, context)
+
+
+def install(connection):
+    if _dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _dispatch)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    install(connection)
+
+
+connection_created.connect(_on_connection_created)
+
+
+@contextmanager
+def execute_wrapper(wrapper):
+    """Comme connection.execute_wrapper, pour toutes les connexions du contexte courant (threads et tâches)"""
+    # Connexions déjà ouvertes avant l'import de ce module
+    for connection in connections.all(initialized_only=True):
+        install(connection)
+    token = _wrappers.set(_wrappers.get() + (wrapper,))
+    try:
+        yield wrapper
+    finally:
+        _wrappers.reset(token)
@@ -1,8 +1,27 @@
-from django.core.mail import send_mail
+from collections import Counter
+from django.core.mail import EmailMessage, get_connection, send_mail
 from django.template.loader import render_to_string
 from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import QueuedEmail
+from .timing import timed
+from .metrics import EMAILS_QUEUED, EMAILS_SENT, track_email
 
 
+def _send(subject, message, to):
+    send_mail(
+        subject,
+        message,
+        settings.DEFAULT_FROM_EMAIL,
+        [to],
+        fail_silently=False,
+    )
+
+
+@timed('email')
+@track_email
 def send_registration_email(user):
     """Email de confirmation d'inscription"""
     subject = "Bienvenue sur Stage Connect !"
@@ -31,6 +50,8 @@ L'équipe Stage Connect
     )
 
 
+@timed('email')
+@track_email
 def send_offer_submitted_email(offer):
     """Email de confirmation de dépôt d'offre"""
     subject = "Votre offre de stage a été soumise"
@@ -60,8 +81,8 @@ L'équipe Stage Connect
     )
 
 
-def send_offer_validated_email(offer):
-    """Email de validation d'offre"""
+def offer_validated_message(offer):
+    """(sujet, corps, destinataire) de l'email de validation d'offre"""
     subject = "Votre offre de stage a été validée ✅"
     message = f"""
 Bonjour {offer.contact_name},
@@ -78,18 +99,18 @@ Vous recevrez un email à chaque nouvelle candidature.
 Cordialement,
 L'équipe Stage Connect
 """
-    
-    send_mail(
-        subject,
-        message,
-        settings.DEFAULT_FROM_EMAIL,
-        [offer.contact_email],
-        fail_silently=False,
-    )
+    return subject, message, offer.contact_email
 
 
-def send_offer_refused_email(offer):
-    """Email de refus d'offre"""
+@timed('email')
+@track_email
+def send_offer_validated_email(offer):
+    """Email de validation d'offre"""
+    _send(*offer_validated_message(offer))
+
+
+def offer_refused_message(offer):
+    """(sujet, corps, destinataire) de l'email de refus d'offre"""
     subject = "Votre offre de stage n'a pas été validée"
     message = f"""
 Bonjour {offer.contact_name},
@@ -106,16 +127,18 @@ n'hésitez pas à nous contacter.
 Cordialement,
 L'équipe Stage Connect
 """
-    
-    send_mail(
-        subject,
-        message,
-        settings.DEFAULT_FROM_EMAIL,
-        [offer.contact_email],
-        fail_silently=False,
-    )
+    return subject, message, offer.contact_email
 
 
+@timed('email')
+@track_email
+def send_offer_refused_email(offer):
+    """Email de refus d'offre"""
+    _send(*offer_refused_message(offer))
+
+
+@timed('email')
+@track_email
 def send_application_confirmation_email(candidature):
     """Email de confirmation de candidature pour l'étudiant"""
     subject = "Confirmation de votre candidature"
@@ -148,6 +171,8 @@ L'équipe Stage Connect
     )
 
 
+@timed('email')
+@track_email
 def send_new_application_to_company_email(candidature):
     """Email de notification de nouvelle candidature pour l'entreprise"""
     offer = candidature.offer
@@ -197,8 +222,8 @@ L'équipe Stage Connect
     )
 
 
-def send_application_status_email(candidature):
-    """Email de changement de statut de candidature"""
+def application_status_message(candidature):
+    """(sujet, corps, destinataire) de l'email de changement de statut ; None pour « En attente »"""
     student = candidature.student
     offer = candidature.offer
     
@@ -236,17 +261,21 @@ Cordialement,
 L'équipe Stage Connect
 """
     else:
-        return  # Pas d'email pour "En attente"
-    
-    send_mail(
-        subject,
-        message,
-        settings.DEFAULT_FROM_EMAIL,
-        [student.email],
-        fail_silently=False,
-    )
+        return None  # Pas d'email pour "En attente"
+    return subject, message, student.email
 
 
+@timed('email')
+@track_email
+def send_application_status_email(candidature):
+    """Email de changement de statut de candidature"""
+    message = application_status_message(candidature)
+    if message is not None:
+        _send(*message)
+
+
+@timed('email')
+@track_email
 def send_offer_closed_email(offer):
     """Email quand une offre est clôturée"""
     subject = f"Offre clôturée : {offer.title}"
@@ -274,3 +303,61 @@ L'équipe Stage Connect
         [offer.contact_email],
         fail_silently=False,
     )
+
+
+# File d'envoi des actions en masse : les messages sont enregistrés dans la transaction
+# de l'action (un seul INSERT), puis envoyés par lots par `manage.py send_queued_emails`.
+
+def queue_emails(kind, messages):
+    """Met en file des (sujet, corps, destinataire) ; les None sont ignorés. Retourne le nombre mis en file."""
+    rows = [
+        QueuedEmail(kind=kind, subject=subject, body=body, to=to)
+        for subject, body, to in filter(None, messages) if to
+    ]
+    if rows:
+        QueuedEmail.objects.bulk_create(rows)
+        transaction.on_commit(lambda: EMAILS_QUEUED.inc(len(rows), kind=kind))
+    return len(rows)
+
+
+def send_queued(limit=100):
+    """
+    Envoie un lot de la file sur une seule connexion SMTP. Un message en échec est
+    retenté aux lots suivants, au plus EMAIL_QUEUE_MAX_ATTEMPTS fois.
+    Un seul worker à la fois : deux workers enverraient les mêmes messages.
+    Retourne (envoyés, en échec).
+    """
+    max_attempts = getattr(settings, 'EMAIL_QUEUE_MAX_ATTEMPTS', 5)
+    batch = list(
+        QueuedEmail.objects.filter(sent_at__isnull=True, attempts__lt=max_attempts).order_by('pk')[:limit]
+    )
+    if not batch:
+        return 0, 0
+
+    sent = []
+    errors = {}
+    try:
+        with get_connection(fail_silently=False) as connection:
+            for email in batch:
+                message = EmailMessage(email.subject, email.body, settings.DEFAULT_FROM_EMAIL, [email.to],
+                                       connection=connection)
+                try:
+                    message.send()
+                except Exception as e:
+                    errors[email.pk] = str(e)
+                else:
+                    sent.append(email)
+    except Exception as e:
+        # Connexion impossible : le reste du lot est reporté
+        for email in batch:
+            if email not in sent:
+                errors.setdefault(email.pk, str(e))
+
+    if sent:
+        QueuedEmail.objects.filter(pk__in=[email.pk for email in sent]).update(
+            sent_at=timezone.now(), attempts=F('attempts') + 1, last_error='')
+        for kind, count in Counter(email.kind for email in sent).items():
+            EMAILS_SENT.inc(count, kind=kind)
+    for pk, error in errors.items():
+        QueuedEmail.objects.filter(pk=pk).update(attempts=F('attempts') + 1, last_error=error[:1000])
+    return len(sent), len(errors)
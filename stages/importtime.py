@@ -0,0 +1,95 @@
+"""
+Coût d'import au démarrage, mesuré par `python -X importtime` dans un processus neuf :
+django.setup() puis import de l'URLconf (ce que fait un worker avant sa première requête).
+
+Les lignes de -X importtime (sur stderr) ont la forme
+    import time: self [us] | cumulative | imported package
+avec une indentation du nom qui suit la profondeur d'import.
+"""
+import os
+import re
+import subprocess
+import sys
+from django.conf import settings
+
+
+LINE_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$')
+
+# Sous-systèmes lourds qui doivent rester hors du démarrage (voir stages/lazy.py)
+LAZY_MODULES = ['reportlab', 'pypdf', 'stages.pdf_generator', 'stages.emails']
+
+# __import__ et non importlib.import_module : seuls les imports passant par l'instruction
+# import (chemin C) sont chronométrés par -X importtime
+SCRIPT = 'import django; django.setup(); __import__({urlconf!r})'
+
+
+class ImportRecord:
+    def __init__(self, name, self_us, cumulative_us, depth):
+        self.name = name
+        self.self_us = self_us
+        self.cumulative_us = cumulative_us
+        self.depth = depth
+
+
+def parse_importtime(output):
+    records = []
+    for line in output.splitlines():
+        match = LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            records.append(ImportRecord(name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return records
+
+
+def subtree(records, name):
+    """Modules importés pendant l'import de `name` (les lignes sont écrites en fin d'import : ils le précèdent)"""
+    for index, record in enumerate(records):
+        if record.name == name:
+            start = index
+            while start > 0 and records[start - 1].depth > record.depth:
+                start -= 1
+            return records[start:index]
+    return []
+
+
+def run_importtime(urlconf=None):
+    urlconf = urlconf or settings.ROOT_URLCONF
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'config.settings')}
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', SCRIPT.format(urlconf=urlconf)],
+        capture_output=True, text=True, env=env, cwd=settings.BASE_DIR,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'échec du processus')
+    return parse_importtime(result.stderr)
+
+
+def profile_imports(runs=3, urlconf=None, top=15):
+    """
+    Meilleure de `runs` exécutions (la première peut compiler les .pyc) : temps total
+    d'import, temps de l'URLconf, modules les plus coûteux importés par l'URLconf et
+    modules paresseux importés au démarrage.
+    """
+    urlconf = urlconf or settings.ROOT_URLCONF
+    best = None
+    for _ in range(runs):
+        records = run_importtime(urlconf)
+        urlconf_us = next((r.cumulative_us for r in records if r.name == urlconf), 0)
+        if best is None or urlconf_us < best[0]:
+            best = (urlconf_us, records)
+    urlconf_us, records = best
+    imported = {r.name for r in records}
+    urlconf_records = subtree(records, urlconf)
+    return {
+        'urlconf': urlconf,
+        'urlconf_ms': round(urlconf_us / 1000, 1),
+        'total_ms': round(sum(r.self_us for r in records) / 1000, 1),
+        'modules': len(records),
+        'top': [
+            {'module': r.name, 'self_ms': round(r.self_us / 1000, 1), 'cumulative_ms': round(r.cumulative_us / 1000, 1)}
+            for r in sorted(urlconf_records, key=lambda r: r.cumulative_us, reverse=True)
+        ][:top],
+        'eager_lazy_modules': sorted(
+            name for name in LAZY_MODULES if name in imported
+        ),
+    }
@@ -0,0 +1,41 @@
+"""
+Modules chargés au premier accès à l'un de leurs attributs.
+
+    pdf_generator = lazy_import('stages.pdf_generator')
+    ...
+    pdf_generator.generate_offer_pdf(offer)   # ReportLab n'est importé qu'ici
+
+Pour les sous-systèmes lourds et rarement utilisés (rendu PDF, e-mails, index de
+recherche) : un worker ou une commande manage.py qui ne s'en sert pas ne paie pas
+leur import. La commande check_import_time vérifie qu'ils restent hors de l'URLconf.
+"""
+import importlib
+import sys
+
+
+class LazyModule:
+    def __init__(self, name):
+        self.__dict__.update(_name=name, _module=None)
+
+    def _load(self):
+        if self._module is None:
+            self.__dict__['_module'] = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        # Délégué au vrai module : mock.patch.object(api_views.emails, ...) reste visible partout
+        setattr(self._load(), attr, value)
+
+    def __delattr__(self, attr):
+        delattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'chargé' if self._name in sys.modules else 'non chargé'
+        return f'<module paresseux {self._name!r} ({state})>'
+
+
+def lazy_import(name):
+    return LazyModule(name)
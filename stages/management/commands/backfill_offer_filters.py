@@ -0,0 +1,43 @@
+import random
+from stages.backfill import Backfill, BackfillCommand
+from stages.models import StageOffer
+
+
+CITIES = ['Paris', 'Lyon', 'Marseille', 'Toulouse', 'Bordeaux', 'Lille', 'Nantes', 'Strasbourg', 'Montpellier', 'Nice']
+DURATIONS = [value for value, _ in StageOffer.DURATION_CHOICES]
+DOMAINS = [value for value, _ in StageOffer.DOMAIN_CHOICES if value != 'Autre']
+
+
+class OfferFiltersBackfill(Backfill):
+    """Renseigne ville / durée / domaine / télétravail (migration 0005) sur les offres existantes"""
+    name = 'offer_filters'
+    model = StageOffer
+    fields = ['city', 'duration', 'domain', 'remote']
+
+    def __init__(self, seed=0):
+        self.seed = seed
+
+    def get_queryset(self):
+        return StageOffer.objects.only('pk', *self.fields)
+
+    def process(self, offer):
+        if offer.city and offer.duration and offer.domain:
+            return False  # Déjà renseignée : le backfill est idempotent
+        rng = random.Random(f'{self.seed}-{offer.pk}')
+        offer.city = offer.city or rng.choice(CITIES)
+        offer.duration = offer.duration or rng.choice(DURATIONS)
+        offer.domain = offer.domain or rng.choice(DOMAINS)
+        # 30% de chance d'être en remote
+        offer.remote = rng.random() < 0.3
+        return True
+
+
+class Command(BackfillCommand):
+    help = "Ajoute des valeurs d'exemple (ville, durée, domaine, télétravail) aux offres qui n'en ont pas"
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def get_backfill(self, **options):
+        return OfferFiltersBackfill(seed=options['seed'])
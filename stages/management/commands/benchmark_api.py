@@ -0,0 +1,55 @@
+import json
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from stages.benchmark import run_benchmark, budget_violations, compare_reports
+
+
+class Command(BaseCommand):
+    help = "Mesure latence p50/p95, requêtes SQL et taille de réponse de chaque route, par rôle, et vérifie les budgets de requêtes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=10, help="Appels mesurés par route et par rôle")
+        parser.add_argument('--role', action='append', dest='roles', help="Limite aux rôles donnés (répétable)")
+        parser.add_argument('--only', action='append', help="Limite aux routes dont le libellé contient ce texte (répétable)")
+        parser.add_argument('--output', default='benchmark.json', help="Fichier JSON des résultats")
+        parser.add_argument('--compare', help="Rapport JSON précédent à comparer")
+        parser.add_argument('--generate', action='store_true',
+                            help="Génère d'abord un jeu de données (mêmes volumes que les options --users/--offers/...)")
+        parser.add_argument('--users', type=int, default=2_000)
+        parser.add_argument('--offers', type=int, default=5_000)
+        parser.add_argument('--candidatures', type=int, default=20_000)
+        parser.add_argument('--favorites', type=int, default=5_000)
+        parser.add_argument('--no-fail', action='store_true', help="Ne pas échouer en cas de dépassement de budget")
+
+    def handle(self, *args, **options):
+        if options['generate']:
+            call_command(
+                'generate_dataset', purge=True, users=options['users'], offers=options['offers'],
+                candidatures=options['candidatures'], favorites=options['favorites'], stdout=self.stdout,
+            )
+
+        report = run_benchmark(
+            iterations=options['iterations'], roles=options['roles'], only=options['only'], stdout=self.stdout,
+        )
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        self.stdout.write(f"Résultats écrits dans {options['output']}")
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                previous = json.load(f)
+            self.stdout.write(f"Comparaison avec {options['compare']} ({previous.get('revision')}) :")
+            for endpoint, role, delta_p50, delta_queries in compare_reports(previous, report):
+                self.stdout.write(f'  {endpoint:42} {role:14} p50 {delta_p50:+6.1f}%  requêtes {delta_queries:+d}')
+
+        violations = budget_violations(report)
+        if violations:
+            lines = [f"{row['method']} {row['endpoint']} ({row['role']}) : {row['queries']} requêtes > budget {row['budget']}"
+                     for row in violations]
+            message = 'Budgets de requêtes dépassés :\n  ' + '\n  '.join(lines)
+            if options['no_fail']:
+                self.stdout.write(self.style.WARNING(message))
+            else:
+                raise CommandError(message)
+        else:
+            self.stdout.write(self.style.SUCCESS('Tous les budgets de requêtes sont respectés'))
@@ -0,0 +1,18 @@
+import json
+from django.core.management.base import BaseCommand
+from stages.compressionbench import run_compression
+
+
+class Command(BaseCommand):
+    help = "Mesure taux de compression et coût CPU de gzip / br / zstd par niveau sur les réponses de l'API (* : niveau utilisé)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help="Compressions par mesure (médiane)")
+        parser.add_argument('--only', action='append', help="Limite à ce codage (gzip, br, zstd ; répétable)")
+        parser.add_argument('--output', default='benchmark_compression.json', help="Fichier JSON des résultats")
+
+    def handle(self, *args, **options):
+        report = run_compression(repeat=options['repeat'], only=options['only'], stdout=self.stdout)
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        self.stdout.write(f"Résultats écrits dans {options['output']}")
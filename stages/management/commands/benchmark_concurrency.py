@@ -0,0 +1,25 @@
+import json
+from django.core.management.base import BaseCommand
+from stages.concurrency import run_concurrency
+
+
+class Command(BaseCommand):
+    help = "Compare débit et latence des routes en lecture entre WSGI (pool de threads) et ASGI (vues asynchrones) selon la concurrence"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, action='append', dest='levels',
+                            help="Nombre de clients simultanés (répétable, défaut : 1, 10, 50, 200)")
+        parser.add_argument('--requests', type=int, default=5, help="Appels successifs par client")
+        parser.add_argument('--threads', type=int, default=8, help="Threads du worker WSGI simulé")
+        parser.add_argument('--latency', type=float, default=50, help="Temps d'envoi de la réponse à un client lent (ms)")
+        parser.add_argument('--only', action='append', help="Limite aux routes dont le nom contient ce texte (répétable)")
+        parser.add_argument('--output', default='benchmark_concurrency.json', help="Fichier JSON des résultats")
+
+    def handle(self, *args, **options):
+        report = run_concurrency(
+            levels=options['levels'] or (1, 10, 50, 200), requests=options['requests'], threads=options['threads'],
+            latency=options['latency'] / 1000, only=options['only'], stdout=self.stdout,
+        )
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        self.stdout.write(f"Résultats écrits dans {options['output']}")
@@ -0,0 +1,17 @@
+import json
+from django.core.management.base import BaseCommand
+from stages.renderbench import run_renderers
+
+
+class Command(BaseCommand):
+    help = "Compare le rendu / la lecture JSON de DRF et d'orjson sur les réponses de l'API"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help="Mesures par cas (médiane)")
+        parser.add_argument('--output', default='benchmark_renderers.json', help="Fichier JSON des résultats")
+
+    def handle(self, *args, **options):
+        report = run_renderers(repeat=options['repeat'], stdout=self.stdout)
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        self.stdout.write(f"Résultats écrits dans {options['output']}")
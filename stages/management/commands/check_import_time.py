@@ -0,0 +1,40 @@
+import json
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from stages.importtime import profile_imports
+
+
+class Command(BaseCommand):
+    help = "Mesure le coût d'import de l'URLconf (python -X importtime) et échoue au-delà du budget"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--budget', type=float, default=None,
+                            help="Budget en ms pour l'import de l'URLconf (défaut : IMPORT_TIME_BUDGET_MS)")
+        parser.add_argument('--runs', type=int, default=3, help="Processus lancés (le meilleur est retenu)")
+        parser.add_argument('--top', type=int, default=15, help="Modules les plus coûteux affichés")
+        parser.add_argument('--output', default=None, help="Fichier JSON des résultats")
+
+    def handle(self, *args, **options):
+        budget = options['budget'] or settings.IMPORT_TIME_BUDGET_MS
+        try:
+            report = profile_imports(runs=options['runs'], top=options['top'])
+        except RuntimeError as e:
+            raise CommandError(f"Import de l'URLconf impossible : {e}")
+
+        for row in report['top']:
+            self.stdout.write(f"{row['cumulative_ms']:>9.1f} ms {row['self_ms']:>8.1f} ms  {row['module']}")
+        self.stdout.write(
+            f"{report['urlconf']} : {report['urlconf_ms']} ms (budget {budget} ms), "
+            f"{report['modules']} modules, {report['total_ms']} ms d'imports au total"
+        )
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({**report, 'budget_ms': budget}, f, indent=2, ensure_ascii=False)
+
+        errors = []
+        if report['urlconf_ms'] > budget:
+            errors.append(f"import de l'URLconf : {report['urlconf_ms']} ms > {budget} ms")
+        if report['eager_lazy_modules']:
+            errors.append('importés au démarrage au lieu du premier usage : ' + ', '.join(report['eager_lazy_modules']))
+        if errors:
+            raise CommandError('\n  '.join(['Budget de démarrage dépassé :'] + errors))
@@ -0,0 +1,26 @@
+import time
+from django.core.management.base import BaseCommand
+from stages.cv_index import process_pending
+
+
+class Command(BaseCommand):
+    help = "Worker d'extraction du texte des CV (PDF) et d'indexation plein texte"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--loop', action='store_true', help="Tourne en continu (worker)")
+        parser.add_argument('--sleep', type=float, default=5.0, help="Pause entre deux lots vides en mode --loop")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = process_pending(limit=options['batch_size'])
+            total += processed
+            if processed:
+                self.stdout.write(f'{processed} CV traités')
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'{total} CV extraits et indexés'))
@@ -0,0 +1,125 @@
+import os
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from stages.models import StudentProfile, CVFile
+from stages.storage import cv_storage, content_hash_from_name
+
+
+class Command(BaseCommand):
+    help = "Supprime les CV orphelins du stockage dédupliqué (SHA-256)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Affiche ce qui serait supprimé sans rien supprimer")
+        parser.add_argument('--grace-hours', type=int, default=24,
+                            help="Ne supprime que les fichiers non utilisés depuis au moins N heures (défaut: 24)")
+        parser.add_argument('--recount', action='store_true',
+                            help="Recalcule les compteurs de références depuis les profils avant la collecte")
+        parser.add_argument('--import-legacy', action='store_true',
+                            help="Migre les CV historiques (cvs/nom.pdf) vers le stockage dédupliqué")
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        self.upload_dir = StudentProfile._meta.get_field('cv').upload_to.strip('/')
+
+        if options['import_legacy']:
+            self.import_legacy()
+        if options['recount']:
+            self.recount()
+
+        removed = self.collect_unreferenced() + self.collect_untracked()
+        verb = 'à supprimer' if self.dry_run else 'supprimés'
+        self.stdout.write(self.style.SUCCESS(f'{removed} fichiers orphelins {verb}'))
+
+    def is_expired(self, name):
+        try:
+            mtime = os.path.getmtime(cv_storage.path(name))
+        except FileNotFoundError:
+            return True
+        return datetime.fromtimestamp(mtime, tz=dt_timezone.utc) < self.cutoff
+
+    def purge(self, name):
+        self.stdout.write(f' - {name}')
+        if not self.dry_run:
+            cv_storage.purge(name)
+
+    def collect_unreferenced(self):
+        removed = 0
+        for cv_file in CVFile.objects.filter(ref_count=0, updated_at__lt=self.cutoff):
+            if not self.is_expired(cv_file.name):
+                continue  # Ré-uploadé récemment, une référence est peut-être en cours de création
+            if not self.dry_run:
+                # Suppression conditionnelle : retain_cv a pu reprendre une référence depuis
+                # la lecture ; le fichier n'est purgé que si la ligne a bien été supprimée
+                deleted, _ = CVFile.objects.filter(pk=cv_file.pk, ref_count=0).delete()
+                if not deleted:
+                    continue
+            self.purge(cv_file.name)
+            removed += 1
+        return removed
+
+    def collect_untracked(self):
+        """Fichiers présents sur disque mais inconnus de la base (upload interrompu, crash...)"""
+        root = cv_storage.path(self.upload_dir)
+        if not os.path.isdir(root):
+            return 0
+
+        known = set(CVFile.objects.values_list('sha256', flat=True))
+        removed = 0
+        for dirpath, dirnames, filenames in os.walk(root):
+            for filename in filenames:
+                name = os.path.relpath(os.path.join(dirpath, filename), cv_storage.location).replace(os.sep, '/')
+                content_hash = content_hash_from_name(name)
+                is_partial = filename.endswith('.part')
+                if not (is_partial or (content_hash and content_hash not in known)):
+                    continue
+                if self.is_expired(name):
+                    self.purge(name)
+                    removed += 1
+        return removed
+
+    def recount(self):
+        counts = Counter()
+        names = {}
+        for name in StudentProfile.objects.exclude(cv='').exclude(cv__isnull=True).values_list('cv', flat=True):
+            content_hash = content_hash_from_name(name)
+            if content_hash:
+                counts[content_hash] += 1
+                names.setdefault(content_hash, name)
+
+        if self.dry_run:
+            self.stdout.write(f'{len(counts)} CV référencés')
+            return
+
+        CVFile.objects.exclude(sha256__in=counts.keys()).update(ref_count=0)
+        for content_hash, total in counts.items():
+            name = names[content_hash]
+            size = cv_storage.size(name) if cv_storage.exists(name) else 0
+            CVFile.objects.update_or_create(
+                sha256=content_hash,
+                defaults={'name': name, 'size': size, 'ref_count': total},
+            )
+        self.stdout.write(f'{len(counts)} compteurs de références recalculés')
+
+    def import_legacy(self):
+        legacy_names = set()
+        imported = 0
+        for profile in StudentProfile.objects.exclude(cv='').exclude(cv__isnull=True):
+            old_name = profile.cv.name
+            if content_hash_from_name(old_name) or not cv_storage.exists(old_name):
+                continue
+            self.stdout.write(f' ~ {old_name}')
+            if self.dry_run:
+                continue
+            with cv_storage.open(old_name) as legacy_file:
+                profile.cv.name = cv_storage.save(old_name, legacy_file)
+            profile.save(update_fields=['cv'])
+            legacy_names.add(old_name)
+            imported += 1
+
+        for old_name in legacy_names:
+            if not StudentProfile.objects.filter(cv=old_name).exists():
+                cv_storage.purge(old_name)
+        self.stdout.write(f'{imported} CV historiques importés')
@@ -0,0 +1,327 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User, Group
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+from stages.cache import bump
+from stages.models import StageOffer, Candidature, StudentProfile, Favorite
+from stages.reports import rebuild_student_stats
+
+
+# Distributions (valeur, poids)
+CITIES = [
+    ('Paris', 30), ('Lyon', 12), ('Marseille', 8), ('Toulouse', 8), ('Bordeaux', 7),
+    ('Lille', 7), ('Nantes', 7), ('Strasbourg', 5), ('Montpellier', 5), ('Nice', 4),
+    ('Rennes', 4), ('Grenoble', 3),
+]
+DOMAINS = [
+    ('Développement Web', 30), ('Développement Mobile', 10), ('Data Science', 12),
+    ('Cybersécurité', 8), ('DevOps', 8), ('IA/Machine Learning', 10), ('Réseau', 6),
+    ('Base de données', 6), ('Cloud Computing', 7), ('Autre', 3),
+]
+DURATIONS = [('1-3 mois', 25), ('3-6 mois', 55), ('6+ mois', 20)]
+# Les offres « Clôturée » ne sont pas tirées : ce sont les offres ouvertes ayant atteint
+# MAX_CANDIDATURES, comme dans l'application (stages/views.py, stages/api_views.py)
+OFFER_STATES = [('Validée', 80), ('En attente validation', 15), ('Refusée', 5)]
+MAX_CANDIDATURES = 5
+CLOSING_REASON = f'Automatique : Limite de {MAX_CANDIDATURES} candidatures atteinte'
+CANDIDATURE_STATUSES = [('En attente', 70), ('Acceptée', 10), ('Refusée', 20)]
+ROLES = [('Etudiant', 90), ('Entreprise', 9), ('Responsable', 1)]
+
+TITLES = [
+    'Développeur {d}', 'Stage {d}', 'Assistant(e) {d}', 'Ingénieur {d} junior', 'Analyste {d}',
+]
+WORDS = (
+    'python django react api rest sql docker kubernetes cloud sécurité données machine learning '
+    'agile équipe projet client mobile réseau linux git tests intégration continue'
+).split()
+
+
+@contextmanager
+def manual_dates(*fields):
+    """Désactive temporairement auto_now_add pour pouvoir étaler les dates"""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = "Génère un jeu de données synthétique volumineux (benchmarks / tests de charge)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50_000)
+        parser.add_argument('--offers', type=int, default=200_000)
+        parser.add_argument('--candidatures', type=int, default=2_000_000)
+        parser.add_argument('--favorites', type=int, default=500_000)
+        parser.add_argument('--days', type=int, default=365, help="Étalement des dates sur les N derniers jours")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5_000)
+        parser.add_argument('--prefix', default='gen_', help="Préfixe des noms d'utilisateurs générés")
+        parser.add_argument('--password', default='password123', help="Mot de passe commun à tous les comptes générés")
+        parser.add_argument('--purge', action='store_true', help="Supprime d'abord les données générées précédemment")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.prefix = options['prefix']
+        self.now = timezone.now()
+        self.days = options['days']
+        started = time.monotonic()
+
+        if options['purge']:
+            deleted, _ = User.objects.filter(username__startswith=self.prefix).delete()
+            self.stdout.write(f'{deleted} lignes générées supprimées')
+
+        students, companies = self.create_users(options['users'], options['password'])
+        offers = self.create_offers(options['offers'], companies)
+        self.create_candidatures(options['candidatures'], students, offers)
+        self.close_full_offers()
+        self.create_favorites(options['favorites'], students, offers)
+
+        rebuild_student_stats()
+        # bulk_create ne déclenche pas les signaux d'invalidation
+        bump('offers', 'candidatures', 'favorites')
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Jeu de données généré en {elapsed:.1f}s'))
+
+    # -- Helpers ---------------------------------------------------------
+
+    def pick(self, distribution, k=1):
+        values, weights = zip(*distribution)
+        return self.rng.choices(values, weights=weights, k=k)
+
+    def random_date(self, after=None):
+        start = after or (self.now - timedelta(days=self.days))
+        span = max((self.now - start).total_seconds(), 0)
+        return start + timedelta(seconds=self.rng.random() * span)
+
+    def bulk_insert(self, model, objects, label):
+        with transaction.atomic():
+            for i in range(0, len(objects), self.batch_size):
+                model.objects.bulk_create(objects[i:i + self.batch_size], batch_size=self.batch_size)
+        self.stdout.write(f' - {len(objects)} {label}')
+
+    def ids_by_username(self, usernames):
+        ids = {}
+        names = list(usernames)
+        for i in range(0, len(names), 900):  # limite de variables SQLite
+            ids.update(User.objects.filter(username__in=names[i:i + 900]).values_list('username', 'id'))
+        return ids
+
+    # -- Générateurs -----------------------------------------------------
+
+    def create_users(self, count, password):
+        password_hash = make_password(password)  # Hash calculé une seule fois
+        groups = {name: Group.objects.get_or_create(name=name)[0] for name, _ in ROLES + [('Administrateur', 0)]}
+        roles = self.pick(ROLES, k=count)
+        if count and 'Entreprise' not in roles:
+            roles[0] = 'Entreprise'
+
+        users = []
+        for i, role in enumerate(roles):
+            username = f'{self.prefix}{role.lower()}_{i}'
+            users.append(User(
+                username=username,
+                email=f'{username}@example.com',
+                first_name=f'Prénom{i}',
+                last_name=f'Nom{i}',
+                password=password_hash,
+                date_joined=self.random_date(),
+            ))
+        self.bulk_insert(User, users, 'utilisateurs')
+
+        ids = self.ids_by_username(u.username for u in users)
+        memberships = []
+        students, companies = [], []
+        for user, role in zip(users, roles):
+            user_id = ids[user.username]
+            memberships.append(User.groups.through(user_id=user_id, group_id=groups[role].id))
+            if role == 'Etudiant':
+                students.append(user_id)
+            elif role == 'Entreprise':
+                companies.append((user_id, user.username, user.email))
+        self.bulk_insert(User.groups.through, memberships, 'rôles')
+
+        profiles = [
+            StudentProfile(
+                user_id=user_id,
+                bio=' '.join(self.rng.sample(WORDS, 8)),
+                phone=f'06{self.rng.randrange(10**8):08d}',
+            )
+            for user_id in students
+        ]
+        self.bulk_insert(StudentProfile, profiles, 'profils étudiants')
+        return students, companies
+
+    def create_offers(self, count, companies):
+        if not companies:
+            return []
+        states = self.pick(OFFER_STATES, k=count)
+        cities = self.pick(CITIES, k=count)
+        domains = self.pick(DOMAINS, k=count)
+        durations = self.pick(DURATIONS, k=count)
+
+        offers = []
+        for i in range(count):
+            company_id, company_name, company_email = self.rng.choice(companies)
+            state = states[i]
+            offers.append(StageOffer(
+                organisme=company_name,
+                contact_name=f'Contact {company_name}',
+                contact_email=company_email,
+                company_id=company_id,
+                date_depot=self.random_date(),
+                title=self.rng.choice(TITLES).format(d=domains[i]),
+                description=' '.join(self.rng.choices(WORDS, k=40)),
+                state=state,
+                city=cities[i],
+                duration=durations[i],
+                domain=domains[i],
+                remote=self.rng.random() < 0.3,
+            ))
+
+        with manual_dates(StageOffer._meta.get_field('date_depot')):
+            self.bulk_insert(StageOffer, offers, 'offres')
+
+        # (id, date_depot) des offres ouvertes aux candidatures, dans un ordre stable
+        # (rng.shuffle dans popularity : même graine, même jeu de données)
+        return list(
+            StageOffer.objects.filter(company_id__in=[c[0] for c in companies], state='Validée')
+            .order_by('id').values_list('id', 'date_depot')
+        )
+
+    def popularity(self, offers):
+        """Poids cumulés type Zipf : quelques offres très demandées, une longue traîne"""
+        cum_weights = []
+        total = 0.0
+        for rank in range(1, len(offers) + 1):
+            total += 1 / rank ** 0.8
+            cum_weights.append(total)
+        shuffled = offers[:]
+        self.rng.shuffle(shuffled)
+        return shuffled, cum_weights
+
+    def allocate(self, target, count, cap):
+        """Répartit `target` éléments sur `count` étudiants (loi exponentielle, au plus `cap` chacun)"""
+        target = min(target, count * cap)
+        mean = target / count
+        counts = [min(cap, max(1, round(self.rng.expovariate(1 / mean)))) for _ in range(count)]
+        diff = target - sum(counts)
+        while diff:
+            i = self.rng.randrange(count)
+            if diff > 0 and counts[i] < cap:
+                counts[i] += 1
+                diff -= 1
+            elif diff < 0 and counts[i] > 0:
+                counts[i] -= 1
+                diff += 1
+        return counts
+
+    def sample_pairs(self, target, students, offers, per_offer=None):
+        """
+        Couples (étudiant, offre) uniques, nombre de candidatures par étudiant asymétrique.
+        Avec `per_offer`, une offre n'apparaît pas plus de `per_offer` fois : une offre
+        pleine n'est plus tirée, les tirages se reportent sur les offres restantes.
+        """
+        if not students or not offers or target <= 0:
+            return
+        if per_offer is not None:
+            target = min(target, len(offers) * per_offer)
+        ranked_offers, cum_weights = self.popularity(offers)
+        # Offres encore disponibles (retrait en O(1) par échange avec la dernière)
+        remaining = {offer[0]: per_offer for offer in offers}
+        available = offers[:]
+        position = {offer[0]: i for i, offer in enumerate(available)}
+
+        def take(offer):
+            if per_offer is None:
+                return
+            remaining[offer[0]] -= 1
+            if remaining[offer[0]] == 0:
+                i, last = position.pop(offer[0]), available.pop()
+                if last[0] != offer[0]:
+                    available[i] = last
+                    position[last[0]] = i
+
+        for student_id, wanted in zip(students, self.allocate(target, len(students), len(offers))):
+            wanted = min(wanted, len(available))
+            if wanted == 0:
+                continue
+            if wanted > len(available) // 2:
+                chosen = self.rng.sample(available, wanted)
+            else:
+                picked = {}
+                # Tirages pondérés par popularité ; les offres pleines sont écartées, puis
+                # complément uniforme parmi les offres restantes si elles sont trop rares
+                for _ in range(3):
+                    draws = self.rng.choices(ranked_offers, cum_weights=cum_weights, k=wanted - len(picked))
+                    for offer in draws:
+                        if offer[0] in position:
+                            picked.setdefault(offer[0], offer)
+                    if len(picked) >= wanted:
+                        break
+                while len(picked) < wanted:
+                    offer = self.rng.choice(available)
+                    picked.setdefault(offer[0], offer)
+                chosen = list(picked.values())[:wanted]
+            for offer in chosen:
+                take(offer)
+                yield student_id, offer
+
+    def create_candidatures(self, target, students, offers):
+        statuses = iter(self.pick(CANDIDATURE_STATUSES, k=target))
+        field = Candidature._meta.get_field('date_candidature')
+        created = 0
+        batch = []
+        with manual_dates(field), transaction.atomic():
+            for student_id, (offer_id, date_depot) in self.sample_pairs(target, students, offers, MAX_CANDIDATURES):
+                batch.append(Candidature(
+                    student_id=student_id,
+                    offer_id=offer_id,
+                    date_candidature=self.random_date(after=date_depot),
+                    status=next(statuses),
+                ))
+                if len(batch) >= self.batch_size:
+                    Candidature.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            Candidature.objects.bulk_create(batch)
+            created += len(batch)
+        self.stdout.write(f' - {created} candidatures')
+
+    def close_full_offers(self):
+        """Clôture automatique des offres ayant atteint MAX_CANDIDATURES (bulk_create ne passe pas par la vue)"""
+        full = (
+            Candidature.objects.filter(offer__state='Validée').values('offer_id')
+            .annotate(n=Count('pk')).filter(n__gte=MAX_CANDIDATURES).values('offer_id')
+        )
+        closed = StageOffer.objects.filter(pk__in=full).update(state='Clôturée', closing_reason=CLOSING_REASON)
+        self.stdout.write(f' - {closed} offres clôturées')
+
+    def create_favorites(self, target, students, offers):
+        field = Favorite._meta.get_field('created_at')
+        created = 0
+        batch = []
+        with manual_dates(field), transaction.atomic():
+            for student_id, (offer_id, date_depot) in self.sample_pairs(target, students, offers):
+                batch.append(Favorite(
+                    student_id=student_id,
+                    offer_id=offer_id,
+                    created_at=self.random_date(after=date_depot),
+                ))
+                if len(batch) >= self.batch_size:
+                    Favorite.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            Favorite.objects.bulk_create(batch)
+            created += len(batch)
+        self.stdout.write(f' - {created} favoris')
@@ -0,0 +1,23 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from stages.assets import brotli, compress_tree
+
+
+class Command(BaseCommand):
+    help = "Écrit les variantes .gz / .br des fichiers de l'application React (après npm run build)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('roots', nargs='*', help="Répertoires à traiter (défaut : SPA_ROOT)")
+
+    def handle(self, *args, **options):
+        roots = options['roots'] or [str(settings.SPA_ROOT)]
+        if brotli is None:
+            self.stderr.write("brotli n'est pas installé : variantes gzip seulement")
+        for root in roots:
+            if not os.path.isdir(root):
+                raise CommandError(f'{root} introuvable (lancer npm run build)')
+            files, original, compressed = compress_tree(root)
+            self.stdout.write(
+                f'{root} : {files} fichiers compressés, {original // 1024} Kio -> {compressed // 1024} Kio (gzip)'
+            )
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from stages.reports import rebuild_student_stats
+
+
+class Command(BaseCommand):
+    help = 'Recalcule le compteur matérialisé des candidatures par étudiant'
+
+    def handle(self, *args, **kwargs):
+        count = rebuild_student_stats()
+        self.stdout.write(self.style.SUCCESS(f'{count} étudiants recalculés'))
@@ -0,0 +1,25 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from stages.dbrouter import refresh_snapshot
+
+
+class Command(BaseCommand):
+    help = "Recopie la base SQLite dans l'instantané lu par les rapports (alias 'reports')"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Tourne en continu (worker)")
+        parser.add_argument('--interval', type=float, default=None,
+                            help="Secondes entre deux copies en mode --loop (défaut : moitié de REPORTS_SNAPSHOT_MAX_AGE)")
+
+    def handle(self, *args, **options):
+        if not settings.REPORTS_SNAPSHOT_PATH:
+            raise CommandError("Pas d'instantané à rafraîchir : REPORTS_SNAPSHOT_PATH n'est défini que sous SQLite")
+        interval = options['interval'] or settings.REPORTS_SNAPSHOT_MAX_AGE / 2
+        while True:
+            started = time.perf_counter()
+            refresh_snapshot()
+            self.stdout.write(f'Instantané {settings.REPORTS_SNAPSHOT_PATH} rafraîchi en {time.perf_counter() - started:.2f} s')
+            if not options['loop']:
+                break
+            time.sleep(interval)
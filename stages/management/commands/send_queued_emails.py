@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand
+from stages.emails import send_queued
+
+
+class Command(BaseCommand):
+    help = "Worker d'envoi des e-mails mis en file par les actions en masse"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', action='store_true', help="Tourne en continu (worker)")
+        parser.add_argument('--sleep', type=float, default=5.0, help="Pause entre deux lots vides en mode --loop")
+
+    def handle(self, *args, **options):
+        total = failed_total = 0
+        while True:
+            sent, failed = send_queued(limit=options['batch_size'])
+            total += sent
+            failed_total += failed
+            if sent or failed:
+                self.stdout.write(f'{sent} e-mails envoyés, {failed} en échec')
+            # Un lot sans aucun envoi réussi : la file est vide ou le serveur SMTP indisponible
+            if sent:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'{total} e-mails envoyés, {failed_total} échecs'))
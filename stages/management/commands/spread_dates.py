@@ -0,0 +1,46 @@
+import random
+from datetime import timedelta
+from stages.backfill import Backfill, BackfillCommand
+from stages.models import Candidature
+from stages.reports import rebuild_student_stats
+
+
+class SpreadCandidatureDates(Backfill):
+    name = 'spread_candidature_dates'
+    model = Candidature
+    fields = ['date_candidature']
+
+    def __init__(self, days=180, seed=0):
+        self.days = days
+        self.seed = seed
+        self.now = None
+
+    def prepare(self, checkpoint):
+        # Date de référence du premier lancement : une reprise étale autour de la même date
+        self.now = checkpoint.started_at
+
+    def get_queryset(self):
+        return Candidature.objects.only('pk', 'date_candidature')
+
+    def process(self, candidature):
+        # Tirage déterministe par ligne : une reprise produit les mêmes dates
+        rng = random.Random(f'{self.seed}-{candidature.pk}')
+        candidature.date_candidature = self.now - timedelta(days=rng.randint(0, self.days))
+        return True
+
+
+class Command(BackfillCommand):
+    help = "Étale les dates des candidatures sur les derniers mois (par lots, avec reprise)"
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--days', type=int, default=180, help="Étalement sur les N derniers jours (défaut: 180)")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def get_backfill(self, **options):
+        return SpreadCandidatureDates(days=options['days'], seed=options['seed'])
+
+    def handle(self, *args, **options):
+        super().handle(*args, **options)
+        if not options['dry_run']:
+            rebuild_student_stats()
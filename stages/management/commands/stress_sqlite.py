@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from stages.dbstress import stress, LEGACY_OPTIONS
+
+
+class Command(BaseCommand):
+    help = "Écritures et lectures concurrentes sur une base SQLite temporaire : réglages par défaut de Django contre DATABASES['default']['OPTIONS']"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=5.0, help="Durée de chaque profil (s)")
+        parser.add_argument('--hold', type=float, default=20, help="Durée d'une transaction d'écriture (ms)")
+
+    def handle(self, *args, **options):
+        if settings.DATABASES['default']['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError("DATABASES['default'] n'est pas une base SQLite")
+        profiles = [
+            ('défaut', LEGACY_OPTIONS),
+            ('configuré', settings.DATABASES['default'].get('OPTIONS', {})),
+        ]
+        for name, profile in profiles:
+            result = stress(
+                profile, writers=options['writers'], readers=options['readers'],
+                duration=options['duration'], hold=options['hold'] / 1000,
+            )
+            self.stdout.write(
+                f"{name:10} écritures={result['commits']:>5} verrous={result['lock_errors']:>5} "
+                f"lectures={result['reads']:>6} p50={result['read_p50_ms']:>7.2f}ms "
+                f"p99={result['read_p99_ms']:>7.2f}ms max={result['read_max_ms']:>8.2f}ms"
+            )
@@ -0,0 +1,283 @@
+"""
+Registre de métriques en mémoire (compteurs, jauges, histogrammes à seaux fixes)
+exporté au format texte Prometheus par /metrics.
+
+Serveurs préforkés (gunicorn) : si METRICS_DIR est défini, chaque processus écrit
+périodiquement un instantané <pid>.json dans ce répertoire et /metrics agrège tous
+les fichiers. Compteurs et histogrammes des processus terminés restent comptés ;
+les jauges des processus terminés sont ignorées.
+"""
+import atexit
+import functools
+import glob
+import json
+import os
+import threading
+import time
+from django.conf import settings
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} : labels attendus {self.labelnames}, reçus {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def get(self, **labels):
+        return self.values.get(self.key(labels), 0)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def count_calls(self, **labels):
+        """Décorateur : incrémente le compteur à chaque appel réussi"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                result = func(*args, **kwargs)
+                self.inc(**labels)
+                return result
+            return wrapper
+        return decorator
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        with registry.lock:
+            self.values[self.key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with registry.lock:
+            # [compte par seau (non cumulé)..., +Inf, somme, nombre]
+            data = self.values.get(key)
+            if data is None:
+                data = self.values[key] = [0] * (len(self.buckets) + 3)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[i] += 1
+                    break
+            else:
+                data[len(self.buckets)] += 1
+            data[-2] += value
+            data[-1] += 1
+
+
+class QueryCounter:
+    """execute_wrapper comptant les requêtes (sans la limite de 9000 de connection.queries)"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.RLock()
+        self.last_flush = 0.0
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def snapshot(self):
+        with self.lock:
+            # Copie des listes des histogrammes : l'instantané est sérialisé hors verrou
+            return {
+                name: [[list(key), list(value) if isinstance(value, list) else value]
+                       for key, value in metric.values.items()]
+                for name, metric in self.metrics.items()
+            }
+
+    # -- Multi-processus -------------------------------------------------
+
+    def directory(self):
+        return getattr(settings, 'METRICS_DIR', '') or None
+
+    def flush(self, force=False):
+        """Écrit l'instantané de ce processus (au plus une fois par METRICS_FLUSH_INTERVAL)"""
+        directory = self.directory()
+        if not directory:
+            return
+        now = time.monotonic()
+        if not force and now - self.last_flush < getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0):
+            return
+        self.last_flush = now
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def collect(self):
+        """Valeurs agrégées de tous les processus : {nom: {labels: valeur}}"""
+        directory = self.directory()
+        if not directory:
+            snapshots = [(True, self.snapshot())]
+        else:
+            self.flush(force=True)
+            snapshots = []
+            for path in glob.glob(os.path.join(directory, '*.json')):
+                pid = int(os.path.basename(path).split('.')[0])
+                try:
+                    with open(path) as f:
+                        snapshots.append((pid_alive(pid), json.load(f)))
+                except (OSError, ValueError):
+                    continue
+
+        merged = {name: {} for name in self.metrics}
+        for alive, snapshot in snapshots:
+            for name, rows in snapshot.items():
+                metric = self.metrics.get(name)
+                if metric is None or (metric.type == 'gauge' and not alive):
+                    continue
+                values = merged[name]
+                for key, value in rows:
+                    key = tuple(key)
+                    if metric.type == 'histogram':
+                        current = values.get(key) or [0] * len(value)
+                        values[key] = [a + b for a, b in zip(current, value)]
+                    else:
+                        values[key] = values.get(key, 0) + value
+        return merged
+
+    def render(self):
+        """Format d'exposition texte Prometheus 0.0.4"""
+        lines = []
+        for name, values in sorted(self.collect().items()):
+            metric = self.metrics[name]
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.type}')
+            for key, value in sorted(values.items()):
+                labels = list(zip(metric.labelnames, key))
+                if metric.type != 'histogram':
+                    lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + ('+Inf',), value):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else format_value(bound)
+                    lines.append(f'{name}_bucket{format_labels(labels + [("le", le)])} {cumulative}')
+                lines.append(f'{name}_sum{format_labels(labels)} {format_value(value[-2])}')
+                lines.append(f'{name}_count{format_labels(labels)} {value[-1]}')
+        return '\n'.join(lines) + '\n'
+
+
+def pid_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        f'{name}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in labels
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def format_value(value):
+    return repr(float(value))
+
+
+registry = Registry()
+atexit.register(lambda: registry.flush(force=True))
+
+
+# -- Métriques HTTP (MetricsMiddleware) ------------------------------------
+
+REQUESTS = registry.counter(
+    'http_requests_total', 'Requêtes HTTP par vue, méthode et code de statut', ['view', 'method', 'status'])
+REQUEST_LATENCY = registry.histogram(
+    'http_request_duration_seconds', 'Durée des requêtes HTTP par vue', ['view'])
+REQUEST_QUERIES = registry.histogram(
+    'http_request_db_queries', 'Requêtes SQL par requête HTTP et par vue', ['view'], buckets=QUERY_COUNT_BUCKETS)
+REQUESTS_IN_PROGRESS = registry.gauge(
+    'http_requests_in_progress', 'Requêtes HTTP en cours de traitement')
+
+# -- Métriques métier ------------------------------------------------------
+
+APPLICATIONS = registry.counter(
+    'stages_applications_total', 'Candidatures déposées')
+OFFER_VALIDATIONS = registry.counter(
+    'stages_offer_validations_total', 'Offres validées ou refusées par un administrateur', ['action'])
+EMAILS_QUEUED = registry.counter(
+    'stages_emails_queued_total', "E-mails dont l'envoi a été demandé", ['kind'])
+EMAILS_SENT = registry.counter(
+    'stages_emails_sent_total', 'E-mails envoyés avec succès', ['kind'])
+PDFS_RENDERED = registry.counter(
+    'stages_pdfs_rendered_total', 'Documents PDF générés', ['kind'])
+DB_LOCK_RETRIES = registry.counter(
+    'stages_db_lock_retries_total', 'Vues rejouées après une erreur de verrou de la base', ['view'])
+
+
+def track_email(func):
+    """Décorateur des fonctions send_* de emails.py : demandés / envoyés par type d'e-mail"""
+    kind = func.__name__.removeprefix('send_').removesuffix('_email')
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        EMAILS_QUEUED.inc(kind=kind)
+        result = func(*args, **kwargs)
+        EMAILS_SENT.inc(kind=kind)
+        return result
+    return wrapper
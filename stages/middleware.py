@@ -0,0 +1,257 @@
+import json
+import logging
+import random
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.urls import Resolver404, resolve
+from django.utils.cache import patch_vary_headers
+from .compression import acompress_stream, compress_stream, CODECS, level_for, negotiate
+from .dbrouter import start_routing, stop_routing
+from .dbwrappers import execute_wrapper
+from .metrics import registry, QueryCounter, REQUESTS, REQUEST_LATENCY, REQUEST_QUERIES, REQUESTS_IN_PROGRESS
+from .nplusone import QueryRecorder, NPlusOneDetected
+from .slowqueries import SlowQueryLogger
+from .timing import start_timings, stop_timings, server_timing_header
+
+
+logger = logging.getLogger('stages.nplusone')
+timing_logger = logging.getLogger('stages.timing')
+
+
+HTTP_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+
+class HookMiddleware:
+    """
+    Base des middlewares du projet, utilisables en WSGI comme en ASGI : sous ASGI,
+    un middleware uniquement synchrone ferait exécuter les vues asynchrones dans un thread.
+
+    Les sous-classes écrivent hooks(request), un générateur :
+        ... avant la vue ...
+        response = yield
+        ... après la vue ...
+        yield response
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        hooks = self.hooks(request)
+        next(hooks)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            hooks.close()
+            raise
+        return hooks.send(response)
+
+    async def __acall__(self, request):
+        hooks = self.hooks(request)
+        next(hooks)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            hooks.close()
+            raise
+        return hooks.send(response)
+
+    def hooks(self, request):
+        response = yield
+        yield response
+
+
+class MetricsMiddleware(HookMiddleware):
+    """Latence, code de statut et nombre de requêtes SQL par nom de vue résolu (voir stages/metrics.py)"""
+
+    def hooks(self, request):
+        counter = QueryCounter()
+        REQUESTS_IN_PROGRESS.inc()
+        started = time.perf_counter()
+        try:
+            with execute_wrapper(counter):
+                response = yield
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+        elapsed = time.perf_counter() - started
+
+        # Le nom de vue (et non le chemin) borne le nombre de séries
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        method = request.method if request.method in HTTP_METHODS else 'other'
+        REQUESTS.inc(view=view, method=method, status=response.status_code)
+        REQUEST_LATENCY.observe(elapsed, view=view)
+        REQUEST_QUERIES.observe(counter.count, view=view)
+        registry.flush()
+        yield response
+
+
+class ServerTimingMiddleware(HookMiddleware):
+    """
+    Mesure une fraction des requêtes (SERVER_TIMING_SAMPLE_RATE, entre 0 et 1) :
+    en-tête Server-Timing (affiché par l'onglet réseau des devtools) et ligne JSON
+    dans le logger 'stages.timing'. À placer en tête de MIDDLEWARE.
+    """
+
+    def hooks(self, request):
+        rate = getattr(settings, 'SERVER_TIMING_SAMPLE_RATE', 0)
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            response = yield
+            yield response
+            return
+
+        timings, token = start_timings()
+        started = time.perf_counter()
+        try:
+            with execute_wrapper(timings):
+                response = yield
+        finally:
+            stop_timings(token)
+        total = time.perf_counter() - started
+
+        response['Server-Timing'] = server_timing_header(timings, total)
+        origin = request.headers.get('Origin')
+        if origin and origin in getattr(settings, 'CORS_ALLOWED_ORIGINS', []):
+            # Rend les mesures lisibles par le front (PerformanceResourceTiming)
+            response['Timing-Allow-Origin'] = origin
+
+        match = request.resolver_match
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'db_queries': timings.counts.get('db', 0),
+        }
+        for name, duration in timings.durations.items():
+            record[f'{name}_ms'] = round(duration * 1000, 2)
+        timing_logger.info(json.dumps(record))
+        yield response
+
+
+class SlowQueryMiddleware(HookMiddleware):
+    """Journalise les requêtes SQL lentes de chaque requête HTTP (SLOW_QUERY_THRESHOLD_MS, None = désactivé)"""
+
+    def hooks(self, request):
+        if getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', None) is None:
+            response = yield
+        else:
+            with execute_wrapper(SlowQueryLogger(request)):
+                response = yield
+        yield response
+
+
+class NPlusOneMiddleware(HookMiddleware):
+    """
+    Signale les requêtes N+1 de chaque requête HTTP (NPLUSONE_ENABLED, par défaut si DEBUG) :
+    en-tête X-NPlusOne et avertissement dans les logs, ou exception si NPLUSONE_RAISE.
+
+    Les requêtes exécutées pendant l'itération d'une réponse en streaming ne sont pas vues.
+    """
+
+    def hooks(self, request):
+        enabled = getattr(settings, 'NPLUSONE_ENABLED', None)
+        if not (settings.DEBUG if enabled is None else enabled):
+            response = yield
+            yield response
+            return
+
+        recorder = QueryRecorder()
+        with execute_wrapper(recorder):
+            response = yield
+
+        repetitions = recorder.repetitions()
+        if repetitions:
+            message = f'{request.method} {request.path} : ' + ' | '.join(map(str, repetitions))
+            if getattr(settings, 'NPLUSONE_RAISE', False):
+                raise NPlusOneDetected(message)
+            logger.warning('N+1 %s', message)
+            response['X-NPlusOne'] = '; '.join(
+                f'{r.count}x {r.origin or "?"}' for r in repetitions
+            ).encode('ascii', 'replace').decode()
+        yield response
+
+
+class ReportRoutingMiddleware(HookMiddleware):
+    """
+    Contexte de routage de chaque requête (voir stages/dbrouter.py) : les vues de
+    REPORT_VIEWS lisent sur 'reports', sauf pour un client qui vient d'écrire
+    (cookie REPORTS_STICKY_COOKIE, valable REPORTS_STICKY_SECONDS).
+    """
+
+    def hooks(self, request):
+        cookie = getattr(settings, 'REPORTS_STICKY_COOKIE', 'stages_primary')
+        try:
+            pinned = float(request.COOKIES.get(cookie, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        state, token = start_routing(pinned)
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            match = None
+        state.reporting = bool(match and match.view_name in getattr(settings, 'REPORT_VIEWS', ()))
+        try:
+            response = yield
+        finally:
+            stop_routing(token)
+
+        if state.wrote:
+            sticky = getattr(settings, 'REPORTS_STICKY_SECONDS', 300)
+            response.set_cookie(cookie, str(int(time.time() + sticky)), max_age=sticky, httponly=True, samesite='Lax')
+        yield response
+
+
+class CompressionMiddleware(HookMiddleware):
+    """
+    Compression négociée (zstd, br, gzip : voir stages/compression.py) des réponses sous
+    COMPRESSION_PATH_PREFIXES : corps d'au moins COMPRESSION_MIN_SIZE octets, ou réponses
+    en streaming compressées morceau par morceau. À placer avant tout middleware qui lit
+    ou modifie le corps de la réponse.
+    """
+
+    def hooks(self, request):
+        response = yield
+        prefixes = tuple(getattr(settings, 'COMPRESSION_PATH_PREFIXES', ('/api/',)))
+        if request.path.startswith(prefixes) and self.compressible(response):
+            patch_vary_headers(response, ('Accept-Encoding',))
+            encoding = negotiate(request.headers.get('Accept-Encoding'))
+            if encoding is not None:
+                self.compress(response, encoding, level_for(encoding))
+        yield response
+
+    def compressible(self, response):
+        if response.has_header('Content-Encoding') or response.status_code in (204, 304):
+            return False
+        content_type = response.get('Content-Type', '').split(';')[0].strip()
+        if content_type not in getattr(settings, 'COMPRESSION_CONTENT_TYPES', ('application/json', 'text/csv', 'text/plain', 'text/html')):
+            return False
+        return response.streaming or len(response.content) >= getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+
+    def compress(self, response, encoding, level):
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_stream(response.streaming_content, encoding, level)
+            else:
+                response.streaming_content = compress_stream(response.streaming_content, encoding, level)
+            del response['Content-Length']
+        else:
+            compressed = CODECS[encoding].compress(response.content, level)
+            if len(compressed) >= len(response.content):
+                return
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+        # Même représentation compressée autrement : l'ETag fort ne vaut plus (comme GZipMiddleware)
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
@@ -0,0 +1,43 @@
+# Generated by Django 6.0 on 2026-10-19 12:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def backfill_student_stats(apps, schema_editor):
+    Candidature = apps.get_model('stages', 'Candidature')
+    StudentCandidatureStats = apps.get_model('stages', 'StudentCandidatureStats')
+    rows = (
+        Candidature.objects.values('student_id')
+        .annotate(total=Count('id'), last=Max('date_candidature'))
+        .order_by()
+    )
+    StudentCandidatureStats.objects.bulk_create(
+        [StudentCandidatureStats(student_id=r['student_id'], total=r['total'], last_candidature=r['last']) for r in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stages', '0006_favorite'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentCandidatureStats',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='candidature_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('last_candidature', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-total', 'student'], name='stages_stats_total_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_student_stats, migrations.RunPython.noop),
+    ]
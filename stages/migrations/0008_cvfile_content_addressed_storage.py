@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-19 12:20
+
+import stages.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stages', '0007_studentcandidaturestats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='studentprofile',
+            name='cv',
+            field=models.FileField(blank=True, help_text='Format PDF recommandé', null=True, storage=stages.storage.get_cv_storage, upload_to='cvs/'),
+        ),
+        migrations.CreateModel(
+            name='CVFile',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ref_count', 'updated_at'], name='stages_cvfile_gc_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 6.0 on 2026-10-19 12:24
+
+from django.db import migrations, models
+
+
+def create_cv_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS stages_cv_fts "
+        "USING fts5(cv_text, tokenize='unicode61 remove_diacritics 2')"
+    )
+
+
+def drop_cv_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS stages_cv_fts")
+
+
+def queue_existing_cvs(apps, schema_editor):
+    StudentProfile = apps.get_model('stages', 'StudentProfile')
+    StudentProfile.objects.exclude(cv='').exclude(cv__isnull=True).update(cv_text_status='En attente')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stages', '0008_cvfile_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentprofile',
+            name='cv_text',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='studentprofile',
+            name='cv_text_status',
+            field=models.CharField(blank=True, choices=[('', 'Aucun CV'), ('En attente', 'En attente'), ('Extrait', 'Extrait'), ('Échec', 'Échec')], db_index=True, default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='studentprofile',
+            name='cv_text_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(create_cv_fts, drop_cv_fts),
+        migrations.RunPython(queue_existing_cvs, migrations.RunPython.noop),
+    ]
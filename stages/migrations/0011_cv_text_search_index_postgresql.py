@@ -0,0 +1,31 @@
+from django.db import migrations
+
+
+INDEX_NAME = 'stages_cv_text_search_idx'
+
+
+def create_cv_search_index(apps, schema_editor):
+    # Pendant PostgreSQL de la table FTS5 (0009) : index GIN sur l'expression de cv_index.cv_search_vector
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    from django.contrib.postgres.indexes import GinIndex
+    from stages.cv_index import cv_search_vector
+    StudentProfile = apps.get_model('stages', 'StudentProfile')
+    schema_editor.add_index(StudentProfile, GinIndex(cv_search_vector(), name=INDEX_NAME))
+
+
+def drop_cv_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stages', '0010_backfillcheckpoint'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cv_search_index, drop_cv_search_index),
+    ]
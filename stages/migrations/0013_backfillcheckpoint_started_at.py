@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stages', '0012_queuedemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backfillcheckpoint',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
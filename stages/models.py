@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from .storage import get_cv_storage
 
 class StageOffer(models.Model):
     STATE_CHOICES = [
@@ -65,11 +66,23 @@ class Candidature(models.Model):
         return f"{self.student.username} - {self.offer.title}"
 
 class StudentProfile(models.Model):
+    CV_TEXT_STATUS_CHOICES = [
+        ('', 'Aucun CV'),
+        ('En attente', 'En attente'),
+        ('Extrait', 'Extrait'),
+        ('Échec', 'Échec'),
+    ]
+
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     bio = models.TextField(blank=True, help_text="Courte présentation pour les recruteurs")
-    cv = models.FileField(upload_to='cvs/', blank=True, null=True, help_text="Format PDF recommandé")
+    cv = models.FileField(upload_to='cvs/', storage=get_cv_storage, blank=True, null=True, help_text="Format PDF recommandé")
     phone = models.CharField(max_length=20, blank=True)
 
+    # Texte extrait du CV en tâche de fond (commande extract_cvs), indexé pour la recherche
+    cv_text = models.TextField(blank=True, default='')
+    cv_text_status = models.CharField(max_length=20, choices=CV_TEXT_STATUS_CHOICES, blank=True, default='', db_index=True)
+    cv_text_updated_at = models.DateTimeField(blank=True, null=True)
+
     def __str__(self):
         return f"Profil de {self.user.username}"
 
@@ -82,4 +95,70 @@ class Favorite(models.Model):
         unique_together = ('student', 'offer')
 
     def __str__(self):
-        return f"{self.student.username} - {self.offer.title}"
\ No newline at end of file
+        return f"{self.student.username} - {self.offer.title}"
+
+class StudentCandidatureStats(models.Model):
+    """Compteur matérialisé du nombre de candidatures par étudiant (rapport admin)."""
+    student = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='candidature_stats')
+    total = models.PositiveIntegerField(default=0)
+    last_candidature = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-total', 'student'], name='stages_stats_total_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student.username} - {self.total}"
+
+
+class CVFile(models.Model):
+    """Fichier CV stocké une seule fois (SHA-256), avec compteur de références depuis les profils."""
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ref_count', 'updated_at'], name='stages_cvfile_gc_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} réf.)"
+
+
+class BackfillCheckpoint(models.Model):
+    """Point de reprise des backfills par lots (voir stages.backfill)."""
+    name = models.CharField(max_length=100, primary_key=True)
+    last_pk = models.BigIntegerField(default=0)
+    processed = models.PositiveBigIntegerField(default=0)
+    updated = models.PositiveBigIntegerField(default=0)
+    # Début du parcours : date de référence stable pour les reprises
+    started_at = models.DateTimeField(blank=True, null=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} (pk > {self.last_pk})"
+
+
+class QueuedEmail(models.Model):
+    """E-mail de notification mis en file, envoyé par la commande send_queued_emails."""
+    kind = models.CharField(max_length=50)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    to = models.EmailField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sent_at', 'id'], name='stages_queuedemail_todo_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} -> {self.to}"
@@ -0,0 +1,117 @@
+"""
+Détection des requêtes N+1.
+
+Les requêtes SQL exécutées sont capturées via connection.execute_wrapper,
+normalisées (littéraux et listes IN remplacés) puis regroupées par forme : une même
+forme exécutée au moins `threshold` fois pendant une requête HTTP (ou un bloc de test)
+est signalée avec la ligne de code du projet qui l'a déclenchée.
+"""
+import re
+import sys
+from collections import Counter
+from contextlib import contextmanager
+from django.conf import settings
+from . import dbwrappers, metrics, timing
+
+
+DEFAULT_THRESHOLD = 5
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?|NULL)\s*,?)+\)', re.IGNORECASE)
+SPACES_RE = re.compile(r'\s+')
+
+# Frames d'instrumentation (execute_wrapper) à ignorer pour trouver l'origine d'une requête
+INSTRUMENTATION_FILES = {__file__, dbwrappers.__file__, metrics.__file__, timing.__file__}
+
+
+def normalize_sql(sql):
+    """Forme d'une requête : deux requêtes de même forme ne diffèrent que par leurs paramètres"""
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    return SPACES_RE.sub(' ', sql).strip()
+
+
+def _project_frame():
+    """Première frame appartenant au projet (hors Django, bibliothèques et instrumentation)"""
+    base_dir = str(settings.BASE_DIR)
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(base_dir) and 'site-packages' not in filename and filename not in INSTRUMENTATION_FILES:
+            return f'{filename[len(base_dir) + 1:]}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+class Repetition:
+    def __init__(self, shape, count, origin):
+        self.shape = shape
+        self.count = count
+        self.origin = origin
+
+    def __str__(self):
+        return f'{self.count}x {self.origin or "?"} : {self.shape[:200]}'
+
+    def __repr__(self):
+        return f'<Repetition {self}>'
+
+
+class QueryRecorder:
+    """execute_wrapper qui compte les requêtes par forme et retient leur origine"""
+
+    def __init__(self, threshold=None):
+        self.threshold = threshold or getattr(settings, 'NPLUSONE_THRESHOLD', DEFAULT_THRESHOLD)
+        self.ignore = getattr(settings, 'NPLUSONE_IGNORE', [])
+        self.shapes = Counter()
+        self.origins = {}
+        self.total = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.total += 1
+        shape = normalize_sql(sql)
+        self.shapes[shape] += 1
+        # Remonter la pile coûte cher : on ne le fait qu'à la première répétition d'une forme
+        if self.shapes[shape] == 2:
+            self.origins[shape] = _project_frame()
+        return execute(sql, params, many, context)
+
+    def repetitions(self):
+        return [
+            Repetition(shape, count, self.origins.get(shape))
+            for shape, count in self.shapes.most_common()
+            if count >= self.threshold and not any(pattern in shape for pattern in self.ignore)
+        ]
+
+
+@contextmanager
+def record_queries(threshold=None):
+    recorder = QueryRecorder(threshold)
+    with dbwrappers.execute_wrapper(recorder):
+        yield recorder
+
+
+class NPlusOneDetected(AssertionError):
+    pass
+
+
+class NPlusOneAssertionsMixin:
+    """
+    Mixin de TestCase : assertNoNPlusOne échoue si une forme de requête est répétée
+    au moins `threshold` fois dans le bloc.
+
+        with self.assertNoNPlusOne():
+            self.client.get(url)
+    """
+
+    @contextmanager
+    def assertNoNPlusOne(self, threshold=None):
+        with record_queries(threshold) as recorder:
+            yield recorder
+        repetitions = recorder.repetitions()
+        if repetitions:
+            raise NPlusOneDetected(
+                f'{len(repetitions)} requête(s) répétée(s) (N+1) :\n  ' + '\n  '.join(map(str, repetitions))
+            )
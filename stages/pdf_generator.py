@@ -6,8 +6,14 @@ from reportlab.lib.units import inch
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
 from io import BytesIO
 from datetime import datetime
+from .timing import timed
+from .dbrouter import reporting
+from .metrics import PDFS_RENDERED
 
 
+@timed('pdf')
+@reporting()
+@PDFS_RENDERED.count_calls(kind='offer')
 def generate_offer_pdf(offer):
     """
     Génère un PDF pour une offre de stage avec toutes ses candidatures
@@ -156,6 +162,9 @@ def generate_offer_pdf(offer):
     return pdf
 
 
+@timed('pdf')
+@reporting()
+@PDFS_RENDERED.count_calls(kind='candidatures_summary')
 def generate_candidatures_summary_pdf(candidatures):
     """
     Génère un PDF récapitulatif de plusieurs candidatures
@@ -183,9 +192,9 @@ def generate_candidatures_summary_pdf(candidatures):
     
     # Statistiques globales
     total = candidatures.count()
-    en_attente = candidatures.filter(statut='en_attente').count()
-    acceptees = candidatures.filter(statut='acceptee').count()
-    refusees = candidatures.filter(statut='refusee').count()
+    en_attente = candidatures.filter(status='En attente').count()
+    acceptees = candidatures.filter(status='Acceptée').count()
+    refusees = candidatures.filter(status='Refusée').count()
     
     stats_data = [
         ['Total des candidatures', str(total)],
@@ -0,0 +1,63 @@
+"""
+Temps de rendu et de lecture JSON des réponses de l'API : JSONRenderer / JSONParser
+de DRF (module json) contre FastJSONRenderer / FastJSONParser (orjson), sur les données
+sérialisées de /api/offers/ et /api/candidatures/ vues par un responsable.
+"""
+import io
+import time
+from django.test import Client
+from django.urls import reverse
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from .benchmark import bench_context, benchmark_settings, percentile
+from .renderers import FastJSONParser, FastJSONRenderer, orjson
+
+
+PAYLOADS = ['api-offer-list', 'api-candidature-list']
+
+
+def fetch_data(names=PAYLOADS):
+    """Données sérialisées (response.data) de chaque route, avant rendu"""
+    with bench_context() as ctx, benchmark_settings():
+        client = Client()
+        client.force_login(ctx.users['Responsable'])
+        return {name: client.get(reverse(name)).data for name in names}
+
+
+def median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return percentile(timings, 0.5) * 1000
+
+
+def run_renderers(repeat=20, stdout=None):
+    if orjson is None and stdout is not None:
+        stdout.write("orjson n'est pas installé : FastJSONRenderer retombe sur le rendu de DRF")
+    results = []
+    for name, data in fetch_data().items():
+        body = JSONRenderer().render(data)
+        fast_body = FastJSONRenderer().render(data)
+        row = {
+            'payload': name,
+            'bytes': len(body),
+            'identical': body == fast_body,
+            'render_drf_ms': median_ms(lambda: JSONRenderer().render(data), repeat),
+            'render_fast_ms': median_ms(lambda: FastJSONRenderer().render(data), repeat),
+            'parse_drf_ms': median_ms(lambda: JSONParser().parse(io.BytesIO(body)), repeat),
+            'parse_fast_ms': median_ms(lambda: FastJSONParser().parse(io.BytesIO(body)), repeat),
+        }
+        for key in [k for k in row if k.endswith('_ms')]:
+            row[key] = round(row[key], 2)
+        row['render_speedup'] = round(row['render_drf_ms'] / max(row['render_fast_ms'], 0.01), 1)
+        row['parse_speedup'] = round(row['parse_drf_ms'] / max(row['parse_fast_ms'], 0.01), 1)
+        results.append(row)
+        if stdout is not None:
+            stdout.write(
+                f"{name:22} {row['bytes']:>9} o  rendu {row['render_drf_ms']:>8.2f} -> {row['render_fast_ms']:>7.2f} ms "
+                f"(x{row['render_speedup']})  lecture {row['parse_drf_ms']:>8.2f} -> {row['parse_fast_ms']:>7.2f} ms "
+                f"(x{row['parse_speedup']})  identique={row['identical']}"
+            )
+    return {'repeat': repeat, 'orjson': orjson is not None, 'results': results}
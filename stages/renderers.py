@@ -0,0 +1,50 @@
+"""
+Rendu et lecture JSON de l'API avec orjson (dépendance optionnelle).
+
+Même sortie que rest_framework.renderers.JSONRenderer en mode compact : datetimes
+ISO 8601 avec « Z » pour UTC, Decimal en nombre, chaînes traduisibles paresseuses,
+QuerySet, UUID... (les types inconnus d'orjson passent par l'encodeur de DRF),
+U+2028 / U+2029 échappés. Sans orjson, ou pour une sortie indentée (API navigable,
+`Accept: application/json; indent=4`), le rendu de DRF est utilisé.
+Voir la commande benchmark_renderers.
+"""
+from django.conf import settings
+from rest_framework import renderers, parsers
+from rest_framework.exceptions import ParseError
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (orjson is None or not api_settings.UNICODE_JSON
+                or self.get_indent(accepted_media_type, renderer_context or {})):
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(data, default=JSONEncoder().default, option=ORJSON_OPTIONS)
+        # Comme DRF : U+2028 et U+2029 sont valides en JSON mais pas dans une chaîne JavaScript
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class FastJSONParser(parsers.JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            # NaN / Infinity sont refusés par orjson, comme par JSONParser en mode strict
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
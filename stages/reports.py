@@ -0,0 +1,78 @@
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from .models import Candidature, StudentCandidatureStats
+
+
+# Nombre d'étudiants affichés sur le tableau de bord admin
+DASHBOARD_TOP_STUDENTS = 10
+
+# Taille de page par défaut / maximale du rapport
+STUDENT_REPORT_PAGE_SIZE = 50
+STUDENT_REPORT_MAX_PAGE_SIZE = 200
+
+# Tris autorisés (paramètre ?sort=) -> ordre SQL
+STUDENT_REPORT_SORTS = {
+    '-total': ('-total', 'student_id'),
+    'total': ('total', 'student_id'),
+    'username': ('student__username',),
+    '-username': ('-student__username',),
+    '-last': ('-last_candidature', 'student_id'),
+    'last': ('last_candidature', 'student_id'),
+}
+
+
+def candidatures_per_student(search=None, sort='-total'):
+    """
+    Queryset du rapport "candidatures par étudiant", lu depuis le compteur matérialisé.
+    """
+    qs = StudentCandidatureStats.objects.filter(total__gt=0).select_related('student')
+    if search:
+        qs = qs.filter(Q(student__username__icontains=search) | Q(student__email__icontains=search))
+    ordering = STUDENT_REPORT_SORTS.get(sort, STUDENT_REPORT_SORTS['-total'])
+    return qs.order_by(*ordering)
+
+
+def top_students(limit=DASHBOARD_TOP_STUDENTS):
+    return candidatures_per_student()[:limit]
+
+
+def paginate_student_report(params):
+    """
+    Applique recherche / tri / pagination à partir des paramètres GET.
+    Retourne (page, sort, search).
+    """
+    search = params.get('q', '').strip()
+    sort = params.get('sort', '-total')
+    if sort not in STUDENT_REPORT_SORTS:
+        sort = '-total'
+
+    try:
+        page_size = int(params.get('page_size', STUDENT_REPORT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        page_size = STUDENT_REPORT_PAGE_SIZE
+    page_size = max(1, min(page_size, STUDENT_REPORT_MAX_PAGE_SIZE))
+
+    paginator = Paginator(candidatures_per_student(search, sort), page_size)
+    page = paginator.get_page(params.get('page'))
+    return page, sort, search
+
+
+def rebuild_student_stats():
+    """
+    Recalcule entièrement le compteur matérialisé depuis la table des candidatures.
+    A lancer après des imports en masse (bulk_create / update) qui contournent les signaux.
+    """
+    rows = (
+        Candidature.objects.values('student_id')
+        .annotate(total=Count('id'), last=Max('date_candidature'))
+        .order_by()
+    )
+    stats = [
+        StudentCandidatureStats(student_id=row['student_id'], total=row['total'], last_candidature=row['last'])
+        for row in rows
+    ]
+    with transaction.atomic():
+        StudentCandidatureStats.objects.all().delete()
+        StudentCandidatureStats.objects.bulk_create(stats, batch_size=1000)
+    return len(stats)
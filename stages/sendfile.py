@@ -0,0 +1,122 @@
+import mimetypes
+import os
+import re
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import http_date, quote_etag
+from .storage import content_hash_from_name
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Les noms content-addressed ne changent jamais de contenu
+IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'private, no-cache'
+
+
+def file_etag(name, stat):
+    content_hash = content_hash_from_name(name)
+    if content_hash:
+        return quote_etag(content_hash)
+    return 'W/' + quote_etag(f'{int(stat.st_mtime)}-{stat.st_size}')
+
+
+def parse_range(header, size):
+    """
+    Analyse un en-tête Range à une seule plage. Retourne (start, end) inclusifs,
+    None si l'en-tête est absent / non géré, ou False si la plage est insatisfiable.
+    """
+    match = RANGE_RE.match(header or '')
+    if not match or size == 0:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # bytes=-500 : les 500 derniers octets
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def iter_file_range(path, start, length, block_size=64 * 1024):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(block_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def sendfile_response(request, storage, name, filename=None, as_attachment=False):
+    """
+    Sert un fichier protégé (l'autorisation est faite par l'appelant).
+
+    Selon settings.SENDFILE_BACKEND :
+    - 'nginx'  : en-tête X-Accel-Redirect vers SENDFILE_URL_PREFIX (location `internal` côté nginx)
+    - 'xsendfile' : en-tête X-Sendfile avec le chemin absolu (Apache mod_xsendfile, lighttpd)
+    - 'python' : FileResponse ; le serveur WSGI utilise wsgi.file_wrapper (os.sendfile sous gunicorn)
+
+    ETag, If-None-Match et Range (une seule plage) sont gérés dans tous les cas.
+    """
+    path = storage.path(name)
+    stat = os.stat(path)
+    etag = file_etag(name, stat)
+    cache_control = IMMUTABLE_CACHE_CONTROL if content_hash_from_name(name) else DEFAULT_CACHE_CONTROL
+    filename = filename or os.path.basename(name)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        response['Cache-Control'] = cache_control
+        return response
+
+    backend = getattr(settings, 'SENDFILE_BACKEND', 'python')
+    if backend == 'nginx':
+        response = HttpResponse(content_type=content_type)
+        prefix = getattr(settings, 'SENDFILE_URL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + name.lstrip('/')
+    elif backend == 'xsendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+    else:
+        response = _python_response(request, path, stat.st_size, etag, content_type)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = cache_control
+    disposition = 'attachment' if as_attachment else 'inline'
+    response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
+    return response
+
+
+def _python_response(request, path, size, etag, content_type):
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if 'Range' in request.headers and (not if_range or if_range == etag):
+        byte_range = parse_range(request.headers['Range'], size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416, content_type=content_type)
+        response['Content-Range'] = f'bytes */{size}'
+    elif byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(iter_file_range(path, start, length), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(length)
+    else:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -1,9 +1,20 @@
 from rest_framework import serializers
+from django.urls import reverse
 from django.contrib.auth.models import User, Group
-from .models import StageOffer, Candidature, StudentProfile
+from .models import StageOffer, Candidature, StudentProfile, Favorite
+from .authentication import get_user_role
+from .timing import TimedSerializerMixin
 
 
-class UserSerializer(serializers.ModelSerializer):
+def cv_download_url(profile, request=None):
+    """URL du téléchargement protégé du CV (les fichiers media ne sont plus servis directement)"""
+    if not profile.cv:
+        return None
+    url = reverse('student_cv_download', args=[profile.user_id])
+    return request.build_absolute_uri(url) if request else url
+
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     role = serializers.SerializerMethodField()
     
     class Meta:
@@ -11,13 +22,13 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'role']
     
     def get_role(self, obj):
-        groups = obj.groups.all()
-        return groups[0].name if groups.exists() else None
+        return get_user_role(obj)
 
 
-class StageOfferSerializer(serializers.ModelSerializer):
+class StageOfferSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     candidature_count = serializers.SerializerMethodField()
     has_applied = serializers.SerializerMethodField()
+    is_favorite = serializers.SerializerMethodField()
     company_name = serializers.SerializerMethodField()
     
     class Meta:
@@ -25,25 +36,44 @@ class StageOfferSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'organisme', 'contact_name', 'contact_email', 
             'date_depot', 'title', 'description', 'state', 
-            'closing_reason', 'candidature_count', 'has_applied',
+            'closing_reason', 'candidature_count', 'has_applied', 'is_favorite',
             'company', 'company_name', 'city', 'duration', 'domain', 'remote'
         ]
         read_only_fields = ['date_depot', 'candidature_count']
     
+    # Les vues qui annotent le queryset (num_candidatures, applied) évitent une requête par offre
     def get_candidature_count(self, obj):
+        if hasattr(obj, 'num_candidatures'):
+            return obj.num_candidatures
         return obj.candidature_set.count()
     
     def get_has_applied(self, obj):
+        if hasattr(obj, 'applied'):
+            return obj.applied
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return obj.candidature_set.filter(student=request.user).exists()
         return False
     
+    def get_is_favorite(self, obj):
+        # Annoté (favorited) par StageOfferViewSet et les vues asynchrones ; ailleurs (offres
+        # imbriquées dans les candidatures...) un seul jeu d'identifiants par réponse
+        if hasattr(obj, 'favorited'):
+            return obj.favorited
+        favorite_ids = self.context.get('favorite_ids')
+        if favorite_ids is None:
+            request = self.context.get('request')
+            favorite_ids = set()
+            if request and request.user.is_authenticated:
+                favorite_ids = set(Favorite.objects.filter(student=request.user).values_list('offer_id', flat=True))
+            self.context['favorite_ids'] = favorite_ids
+        return obj.pk in favorite_ids
+    
     def get_company_name(self, obj):
         return obj.company.username if obj.company else None
 
 
-class CandidatureSerializer(serializers.ModelSerializer):
+class CandidatureSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     student = UserSerializer(read_only=True)
     offer = StageOfferSerializer(read_only=True)
     offer_id = serializers.PrimaryKeyRelatedField(
@@ -63,16 +93,21 @@ class CandidatureSerializer(serializers.ModelSerializer):
             profile = obj.student.studentprofile
             return {
                 'bio': profile.bio,
-                'cv': profile.cv.url if profile.cv else None,
+                'cv': cv_download_url(profile, self.context.get('request')),
                 'phone': profile.phone
             }
         except StudentProfile.DoesNotExist:
             return None
 
 
-class StudentProfileSerializer(serializers.ModelSerializer):
+class StudentProfileSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     
     class Meta:
         model = StudentProfile
         fields = ['id', 'user', 'bio', 'cv', 'phone']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data['cv'] = cv_download_url(instance, self.context.get('request'))
+        return data
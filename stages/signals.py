@@ -0,0 +1,127 @@
+from django.db.models import F, Max, OuterRef, Subquery
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Candidature, Favorite, StageOffer, StudentCandidatureStats, StudentProfile, CVFile
+from .storage import content_hash_from_name
+from . import cv_index
+from .cache import STUDENT_FAVORITES_NAMESPACE, USER_NAMESPACE, bump, bump_for_model
+from .metrics import APPLICATIONS
+
+
+@receiver(post_save, sender=Candidature)
+def increment_student_stats(sender, instance, created, raw=False, **kwargs):
+    """Maintient le compteur matérialisé à chaque nouvelle candidature"""
+    if not created or raw:
+        return
+    APPLICATIONS.inc()
+    StudentCandidatureStats.objects.get_or_create(student_id=instance.student_id)
+    StudentCandidatureStats.objects.filter(student_id=instance.student_id).update(
+        total=F('total') + 1,
+        last_candidature=instance.date_candidature,
+    )
+
+
+@receiver(post_delete, sender=Candidature)
+def decrement_student_stats(sender, instance, **kwargs):
+    """Décrémente le compteur quand une candidature est retirée (dernière date recalculée, NULL s'il n'en reste aucune)"""
+    last = (
+        Candidature.objects.filter(student_id=OuterRef('student_id'))
+        .values('student_id').annotate(last=Max('date_candidature')).values('last')
+    )
+    StudentCandidatureStats.objects.filter(student_id=instance.student_id, total__gt=0).update(
+        total=F('total') - 1,
+        last_candidature=Subquery(last),
+    )
+
+
+def retain_cv(name, size=0):
+    """Ajoute une référence vers un CV content-addressed"""
+    content_hash = content_hash_from_name(name)
+    if not content_hash:
+        return
+    CVFile.objects.get_or_create(sha256=content_hash, defaults={'name': name, 'size': size})
+    CVFile.objects.filter(sha256=content_hash).update(ref_count=F('ref_count') + 1)
+
+
+def release_cv(name):
+    """Retire une référence ; le fichier est supprimé plus tard par gc_cvs"""
+    content_hash = content_hash_from_name(name)
+    if not content_hash:
+        return
+    CVFile.objects.filter(sha256=content_hash, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+
+
+@receiver(pre_save, sender=StudentProfile)
+def remember_previous_cv(sender, instance, raw=False, **kwargs):
+    instance._previous_cv = None
+    if instance.pk and not raw:
+        instance._previous_cv = (
+            StudentProfile.objects.filter(pk=instance.pk).values_list('cv', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=StudentProfile)
+def update_cv_references(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_cv', None) or ''
+    current = instance.cv.name or ''
+    if previous == current:
+        return
+    release_cv(previous)
+    if content_hash_from_name(current):
+        retain_cv(current, instance.cv.size)
+
+    # Extraction du texte hors requête : le worker extract_cvs prend le relais
+    StudentProfile.objects.filter(pk=instance.pk).update(cv_text_status='En attente')
+    instance.cv_text_status = 'En attente'
+
+
+@receiver(post_delete, sender=StudentProfile)
+def release_deleted_profile_cv(sender, instance, **kwargs):
+    release_cv(instance.cv.name)
+    cv_index.unindex_profile(instance.pk)
+
+
+@receiver(post_save, sender=StageOffer)
+@receiver(post_save, sender=Candidature)
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=StageOffer)
+@receiver(post_delete, sender=Candidature)
+@receiver(post_delete, sender=Favorite)
+def invalidate_cached_views(sender, **kwargs):
+    """Nouvelle version de l'espace de noms du modèle (stages/cache.py) : les workers recalculent"""
+    bump_for_model(sender)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def invalidate_student_favorites(sender, instance, **kwargs):
+    bump(STUDENT_FAVORITES_NAMESPACE.format(instance.student_id))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_payloads(sender, instance, update_fields=None, **kwargs):
+    """
+    Profils mis en cache dans les sessions de l'utilisateur (authentication.py) : mot de
+    passe, is_active... Seule la mise à jour de last_login à la connexion est ignorée.
+    """
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    bump(USER_NAMESPACE.format(instance.pk))
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_user_role(sender, instance, action, reverse, pk_set, **kwargs):
+    """Le rôle (premier groupe) fait partie du profil mis en cache"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        user_ids = [instance.pk]
+    elif action == 'pre_clear':
+        user_ids = list(instance.user_set.values_list('pk', flat=True))
+    else:
+        user_ids = pk_set
+    bump(*[USER_NAMESPACE.format(user_id) for user_id in user_ids])
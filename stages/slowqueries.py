@@ -0,0 +1,132 @@
+"""
+Journal des requêtes SQL lentes.
+
+SlowQueryMiddleware (stages/middleware.py) installe un execute_wrapper qui chronomètre chaque requête SQL ;
+au-delà de SLOW_QUERY_THRESHOLD_MS, la requête est écrite (une ligne JSON) dans le
+logger 'stages.slowqueries' avec ses paramètres, la vue appelante et son plan
+d'exécution (EXPLAIN QUERY PLAN sous SQLite, EXPLAIN ailleurs). settings.LOGGING
+dirige ce logger vers un fichier tournant (SLOW_QUERY_LOG), relu par la page
+d'administration admin_slow_queries.
+"""
+import json
+import logging
+import os
+import time
+from django.conf import settings
+from django.utils import timezone
+from .nplusone import normalize_sql, INSTRUMENTATION_FILES
+
+
+logger = logging.getLogger('stages.slowqueries')
+
+MAX_PARAMS_LENGTH = 500
+
+# Les EXPLAIN lancés d'ici ne doivent pas être attribués à ce module par le détecteur N+1
+INSTRUMENTATION_FILES.add(__file__)
+
+
+def explain(connection, sql, params):
+    """
+    Plan d'exécution d'un SELECT (liste de lignes) ; None si non applicable.
+    `connection` est celle qui a exécuté la requête (alias 'reports' compris).
+    """
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            rows = cursor.fetchall()
+    except Exception as e:
+        return [f'EXPLAIN impossible : {e}']
+    if connection.vendor == 'sqlite':
+        # (id, parent, notused, detail)
+        return [row[-1] for row in rows]
+    return [' '.join(str(col) for col in row) for row in rows]
+
+
+class SlowQueryLogger:
+    def __init__(self, request=None, threshold_ms=None):
+        self.request = request
+        self.threshold = (threshold_ms if threshold_ms is not None else settings.SLOW_QUERY_THRESHOLD_MS) / 1000
+        self.explaining = False
+
+    def view_name(self):
+        match = getattr(self.request, 'resolver_match', None)
+        return match.view_name if match else None
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.explaining:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = time.perf_counter() - started
+        if duration >= self.threshold:
+            self.explaining = True
+            try:
+                self.log(sql, params, many, duration, context['connection'])
+            finally:
+                self.explaining = False
+        return result
+
+    def log(self, sql, params, many, duration, connection):
+        record = {
+            'time': timezone.now().isoformat(),
+            'duration_ms': round(duration * 1000, 2),
+            'view': self.view_name(),
+            'path': getattr(self.request, 'path', None),
+            'sql': sql,
+            'params': repr(params)[:MAX_PARAMS_LENGTH],
+            'plan': None if many else explain(connection, sql, params),
+        }
+        logger.warning(json.dumps(record, ensure_ascii=False))
+
+
+def is_full_scan(plan_line):
+    """Parcours complet d'une table : « SCAN t » sans index sous SQLite, « Seq Scan » sous PostgreSQL"""
+    if 'Seq Scan' in plan_line:
+        return True
+    return plan_line.lstrip().startswith('SCAN') and 'USING' not in plan_line
+
+
+def read_entries(path=None, limit=5000):
+    """Dernières entrées du journal (fichier courant puis fichiers tournés .1, .2...)"""
+    path = path or settings.SLOW_QUERY_LOG
+    entries = []
+    for index in range(0, 100):
+        current = path if index == 0 else f'{path}.{index}'
+        if not os.path.exists(current):
+            break
+        with open(current, encoding='utf-8') as f:
+            lines = f.readlines()
+        for line in reversed(lines):
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+            if len(entries) >= limit:
+                return entries
+    return entries
+
+
+def summarize(entries):
+    """Regroupe les entrées par forme de requête, les plus coûteuses (temps cumulé) d'abord"""
+    groups = {}
+    for entry in entries:
+        shape = normalize_sql(entry.get('sql', ''))
+        group = groups.setdefault(shape, {
+            'shape': shape, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'views': set(), 'sample': entry,
+        })
+        group['count'] += 1
+        group['total_ms'] += entry.get('duration_ms', 0)
+        if entry.get('duration_ms', 0) >= group['max_ms']:
+            group['max_ms'] = entry.get('duration_ms', 0)
+            group['sample'] = entry
+        if entry.get('view'):
+            group['views'].add(entry['view'])
+    result = sorted(groups.values(), key=lambda g: g['total_ms'], reverse=True)
+    for group in result:
+        group['avg_ms'] = group['total_ms'] / group['count']
+        group['views'] = sorted(group['views'])
+        group['full_scan'] = any(is_full_scan(line) for line in group['sample'].get('plan') or [])
+    return result
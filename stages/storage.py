@@ -0,0 +1,88 @@
+import hashlib
+import os
+import re
+import tempfile
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+# cvs/ab/ab12...ef.pdf
+CONTENT_ADDRESSED_NAME_RE = re.compile(r'(?:^|/)([0-9a-f]{2})/(\1[0-9a-f]{62})(\.[A-Za-z0-9]+)?$')
+
+
+def content_hash_from_name(name):
+    """Retourne le SHA-256 d'un nom de fichier content-addressed, ou None (fichier historique)"""
+    if not name:
+        return None
+    match = CONTENT_ADDRESSED_NAME_RE.search(name)
+    return match.group(2) if match else None
+
+
+@deconstructible(path='stages.storage.ContentAddressedStorage')
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stockage dédupliqué : chaque fichier est enregistré une seule fois sous son SHA-256.
+
+    L'upload est streamé sur disque (fichier temporaire) tout en étant haché, puis
+    renommé atomiquement vers <dossier>/<2 premiers caractères>/<sha256><extension>.
+    Un contenu déjà présent n'est pas réécrit. Les fichiers étant partagés entre
+    profils, delete() ne supprime rien : les orphelins sont purgés par `gc_cvs`.
+    """
+
+    chunk_size = 64 * 1024
+
+    def get_available_name(self, name, max_length=None):
+        # Le nom final est dérivé du contenu : pas de suffixe aléatoire
+        return name
+
+    def _save(self, name, content):
+        prefix = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+
+        tmp_dir = self.path(os.path.join(prefix, 'tmp'))
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                for chunk in content.chunks(self.chunk_size):
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    tmp_file.write(chunk)
+
+            content_hash = digest.hexdigest()
+            final_name = '/'.join(filter(None, [prefix, content_hash[:2], content_hash + extension]))
+            final_path = self.path(final_name)
+
+            if os.path.exists(final_path):
+                # Contenu déjà stocké : on rafraîchit le mtime pour le délai de grâce du GC
+                os.utime(final_path)
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(tmp_path, self.file_permissions_mode)
+                os.replace(tmp_path, final_path)
+                tmp_path = None
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        return final_name
+
+    def delete(self, name):
+        if content_hash_from_name(name):
+            return  # Fichier potentiellement partagé : récupéré par gc_cvs
+        super().delete(name)
+
+    def purge(self, name):
+        """Suppression physique (utilisée uniquement par le garbage collector)"""
+        super().delete(name)
+
+
+def get_cv_storage():
+    return cv_storage
+
+
+cv_storage = ContentAddressedStorage()
@@ -1,6 +1,21 @@
-from django.test import TestCase, Client
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, Client, override_settings
+from django.core.files.base import ContentFile
+from django.core.management import call_command
 from django.contrib.auth.models import User, Group
-from .models import StageOffer, Candidature
+from .models import StageOffer, Candidature, StudentCandidatureStats, StudentProfile, CVFile, Favorite, BackfillCheckpoint
+from django.db import connection
+from django.db.models import Count, F, Sum
+from .storage import cv_storage, content_hash_from_name
+from .reports import rebuild_student_stats
+from .nplusone import NPlusOneAssertionsMixin, NPlusOneDetected, normalize_sql
+from .slowqueries import SlowQueryLogger
 from django.urls import reverse
 
 class StageTests(TestCase):
@@ -52,6 +67,27 @@ class StageTests(TestCase):
         # If count is 5, it enters 'if count < 5:' -> False. So no creation.
         self.assertFalse(Candidature.objects.filter(student=self.students[5], offer=self.offer).exists())
 
+    def test_closing_keeps_concurrent_offer_edit(self):
+        from .api_views import StageOfferViewSet
+        for student in self.students[:4]:
+            Candidature.objects.create(student=student, offer=self.offer)
+        # Instance lue par la vue avant qu'un responsable ne modifie l'offre
+        stale = StageOffer.objects.get(pk=self.offer.pk)
+        StageOffer.objects.filter(pk=self.offer.pk).update(title='Titre corrigé')
+        c = Client()
+        c.force_login(self.students[4])
+        with mock.patch.object(StageOfferViewSet, 'get_object', return_value=stale):
+            response = c.post(reverse('api-offer-apply', args=[self.offer.pk]))
+        self.assertEqual(response.status_code, 201)
+        self.offer.refresh_from_db()
+        self.assertEqual((self.offer.state, self.offer.title), ('Clôturée', 'Titre corrigé'))
+        # La limite est vérifiée sur l'offre relue dans la transaction
+        c.force_login(self.students[5])
+        with mock.patch.object(StageOfferViewSet, 'get_object', return_value=stale):
+            response = c.post(reverse('api-offer-apply', args=[self.offer.pk]))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Candidature.objects.filter(offer=self.offer).count(), 5)
+
     def test_unique_candidature(self):
         c = Client()
         c.login(username='student0', password='password')
@@ -65,4 +101,1248 @@ class StageTests(TestCase):
         # Second app (same user)
         c.get(url)
         count = Candidature.objects.filter(student=self.students[0], offer=self.offer).count()
-        self.assertEqual(count, 1) # Should still be 1
\ No newline at end of file
+        self.assertEqual(count, 1) # Should still be 1
+
+class StudentReportTests(TestCase):
+    def setUp(self):
+        self.group_etudiant = Group.objects.create(name='Etudiant')
+        self.group_admin = Group.objects.create(name='Administrateur')
+
+        self.admin = User.objects.create_user(username='admin', password='password')
+        self.admin.groups.add(self.group_admin)
+
+        self.students = []
+        for i in range(3):
+            u = User.objects.create_user(username=f'student{i}', password='password', email=f'student{i}@test.com')
+            u.groups.add(self.group_etudiant)
+            self.students.append(u)
+
+        self.offers = [
+            StageOffer.objects.create(
+                title=f'Offer {i}', state='Validée', contact_email='test@test.com',
+                organisme='Test Org', contact_name='Tester', description='Desc'
+            )
+            for i in range(3)
+        ]
+        # student0 : 3 candidatures, student1 : 1, student2 : 0
+        for offer in self.offers:
+            Candidature.objects.create(student=self.students[0], offer=offer)
+        Candidature.objects.create(student=self.students[1], offer=self.offers[0])
+
+    def test_counter_follows_candidatures(self):
+        self.assertEqual(self.students[0].candidature_stats.total, 3)
+        Candidature.objects.filter(student=self.students[0], offer=self.offers[0]).first().delete()
+        self.students[0].candidature_stats.refresh_from_db()
+        self.assertEqual(self.students[0].candidature_stats.total, 2)
+
+    def test_withdrawal_recomputes_last_candidature(self):
+        import datetime
+        first = Candidature.objects.filter(student=self.students[0]).order_by('pk').first()
+        Candidature.objects.filter(pk=first.pk).update(date_candidature=first.date_candidature - datetime.timedelta(days=3))
+        first.refresh_from_db()
+        for candidature in Candidature.objects.filter(student=self.students[0]).exclude(pk=first.pk):
+            candidature.delete()
+        stats = StudentCandidatureStats.objects.get(student=self.students[0])
+        self.assertEqual((stats.total, stats.last_candidature), (1, first.date_candidature))
+        first.delete()
+        stats.refresh_from_db()
+        self.assertEqual((stats.total, stats.last_candidature), (0, None))
+
+    def test_rebuild_matches_counter(self):
+        StudentCandidatureStats.objects.all().delete()
+        self.assertEqual(rebuild_student_stats(), 2)
+        self.assertEqual(StudentCandidatureStats.objects.get(student=self.students[1]).total, 1)
+
+    def test_api_report_paginated_and_sorted(self):
+        c = Client()
+        c.login(username='admin', password='password')
+        response = c.get(reverse('api-report-candidatures-per-student'), {'page_size': 1})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(data['num_pages'], 2)
+        self.assertEqual(data['results'][0]['username'], 'student0')
+
+        response = c.get(reverse('api-report-candidatures-per-student'), {'q': 'student1'})
+        self.assertEqual([r['username'] for r in response.json()['results']], ['student1'])
+
+    def test_api_report_forbidden_for_students(self):
+        c = Client()
+        c.login(username='student0', password='password')
+        response = c.get(reverse('api-report-candidatures-per-student'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_html_report(self):
+        c = Client()
+        c.login(username='admin', password='password')
+        response = c.get(reverse('admin_student_report'), {'sort': 'username'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([s.student.username for s in response.context['stats']], ['student0', 'student1'])
+
+
+class ContentAddressedCVTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.users = [User.objects.create_user(username=f'student{i}', password='password') for i in range(2)]
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def upload(self, user, content, filename='cv.pdf'):
+        profile = StudentProfile.objects.create(user=user)
+        profile.cv.save(filename, ContentFile(content))
+        return profile
+
+    def test_identical_uploads_are_stored_once(self):
+        first = self.upload(self.users[0], b'%PDF-1.4 same content', 'consultation.pdf')
+        second = self.upload(self.users[1], b'%PDF-1.4 same content', 'consultation.pdf')
+
+        self.assertEqual(first.cv.name, second.cv.name)
+        self.assertEqual(content_hash_from_name(first.cv.name), hashlib.sha256(b'%PDF-1.4 same content').hexdigest())
+        self.assertEqual(CVFile.objects.get().ref_count, 2)
+
+    def test_gc_removes_unreferenced_files(self):
+        profile = self.upload(self.users[0], b'%PDF-1.4 old cv')
+        old_name = profile.cv.name
+        profile.cv.save('cv.pdf', ContentFile(b'%PDF-1.4 new cv'))
+
+        self.assertEqual(CVFile.objects.get(name=old_name).ref_count, 0)
+        self.assertTrue(cv_storage.exists(old_name))
+
+        call_command('gc_cvs', '--grace-hours=-1', stdout=StringIO())
+        self.assertFalse(cv_storage.exists(old_name))
+        self.assertTrue(cv_storage.exists(profile.cv.name))
+        self.assertFalse(CVFile.objects.filter(name=old_name).exists())
+
+    def test_gc_keeps_file_referenced_again_during_collection(self):
+        from .management.commands.gc_cvs import Command
+        profile = self.upload(self.users[0], b'%PDF-1.4 old cv')
+        old_name = profile.cv.name
+        profile.cv.save('cv.pdf', ContentFile(b'%PDF-1.4 new cv'))
+
+        def reupload(command, name):
+            # Même contenu envoyé par un autre étudiant entre la lecture et la suppression
+            if not StudentProfile.objects.filter(user=self.users[1]).exists():
+                self.upload(self.users[1], b'%PDF-1.4 old cv')
+            return True
+
+        with mock.patch.object(Command, 'is_expired', reupload):
+            call_command('gc_cvs', '--grace-hours=-1', stdout=StringIO())
+        self.assertTrue(cv_storage.exists(old_name))
+        self.assertEqual(CVFile.objects.get(name=old_name).ref_count, 1)
+
+
+class CVDownloadTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        group_etudiant = Group.objects.create(name='Etudiant')
+        group_entreprise = Group.objects.create(name='Entreprise')
+        self.student = User.objects.create_user(username='student', password='password')
+        self.student.groups.add(group_etudiant)
+        self.company = User.objects.create_user(username='company', password='password', email='rh@company.com')
+        self.company.groups.add(group_entreprise)
+        self.other_company = User.objects.create_user(username='other', password='password', email='rh@other.com')
+        self.other_company.groups.add(group_entreprise)
+
+        offer = StageOffer.objects.create(
+            title='Offer', state='Validée', contact_email='rh@company.com',
+            organisme='Company', contact_name='Tester', description='Desc', company=self.company
+        )
+        Candidature.objects.create(student=self.student, offer=offer)
+
+        self.content = b'%PDF-1.4 ' + b'x' * 1000
+        self.profile = StudentProfile.objects.create(user=self.student)
+        self.profile.cv.save('cv.pdf', ContentFile(self.content))
+        self.url = reverse('student_cv_download', args=[self.student.pk])
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_permissions(self):
+        c = Client()
+        self.assertEqual(c.get(self.url).status_code, 302)  # login requis
+        c.login(username='other', password='password')
+        self.assertEqual(c.get(self.url).status_code, 404)
+        c.login(username='company', password='password')
+        response = c.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_etag_and_range(self):
+        c = Client()
+        c.login(username='student', password='password')
+        etag = c.get(self.url)['ETag']
+        self.assertEqual(etag, '"%s"' % hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(c.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        response = c.get(self.url, HTTP_RANGE='bytes=0-7')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 0-7/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[:8])
+
+    @override_settings(SENDFILE_BACKEND='nginx', SENDFILE_URL_PREFIX='/protected-media/')
+    def test_nginx_offload(self):
+        c = Client()
+        c.login(username='student', password='password')
+        response = c.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.profile.cv.name)
+        self.assertEqual(response.content, b'')
+
+
+class CVSearchTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        group_etudiant = Group.objects.create(name='Etudiant')
+        group_responsable = Group.objects.create(name='Responsable')
+        self.manager = User.objects.create_user(username='manager', password='password')
+        self.manager.groups.add(group_responsable)
+
+        self.offer = StageOffer.objects.create(
+            title='Offer', state='Validée', contact_email='rh@company.com',
+            organisme='Company', contact_name='Tester', description='Desc'
+        )
+        cvs = {
+            'alice': 'Python Django PostgreSQL',
+            'bob': 'Python',
+            'charlie': 'Marketing digital',
+        }
+        for username, text in cvs.items():
+            student = User.objects.create_user(username=username, password='password')
+            student.groups.add(group_etudiant)
+            profile = StudentProfile.objects.create(user=student)
+            profile.cv.save('cv.pdf', ContentFile(self.make_pdf(text)))
+            Candidature.objects.create(student=student, offer=self.offer)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def make_pdf(self, text):
+        from reportlab.pdfgen import canvas
+        buffer = BytesIO()
+        pdf = canvas.Canvas(buffer)
+        pdf.drawString(72, 720, text)
+        pdf.save()
+        return buffer.getvalue()
+
+    def test_extraction_is_deferred_to_worker(self):
+        self.assertEqual(StudentProfile.objects.filter(cv_text_status='En attente').count(), 3)
+        call_command('extract_cvs', stdout=StringIO())
+        self.assertEqual(StudentProfile.objects.filter(cv_text_status='Extrait').count(), 3)
+        self.assertIn('Django', StudentProfile.objects.get(user__username='alice').cv_text)
+
+    def test_cv_replaced_during_extraction_stays_pending(self):
+        from . import cv_index
+        profile = StudentProfile.objects.get(user__username='alice')
+        extract = cv_index.extract_pdf_text
+
+        def upload_during_extraction(f):
+            text = extract(f)
+            # Le worker lit encore l'ancien CV quand l'étudiant en dépose un nouveau
+            StudentProfile.objects.get(pk=profile.pk).cv.save('new.pdf', ContentFile(self.make_pdf('Rust')))
+            return text
+
+        worker_profile = StudentProfile.objects.only('pk', 'cv').get(pk=profile.pk)
+        with mock.patch('stages.cv_index.extract_pdf_text', side_effect=upload_during_extraction):
+            self.assertIsNone(cv_index.process_profile(worker_profile))
+        profile.refresh_from_db()
+        self.assertEqual(profile.cv_text_status, 'En attente')
+        self.assertEqual(profile.cv_text, '')
+
+        call_command('extract_cvs', stdout=StringIO())
+        profile.refresh_from_db()
+        self.assertEqual(profile.cv_text_status, 'Extrait')
+        self.assertIn('Rust', profile.cv_text)
+
+    def test_manager_search_ranks_candidates(self):
+        call_command('extract_cvs', stdout=StringIO())
+        c = Client()
+        c.login(username='manager', password='password')
+        response = c.get(reverse('manager_offer_candidates', args=[self.offer.pk]), {'q': 'python django'})
+        usernames = [cand.student.username for cand in response.context['candidates']]
+        self.assertEqual(usernames, ['alice', 'bob'])
+
+
+class CurrentUserSessionCacheTests(TestCase):
+    def setUp(self):
+        group = Group.objects.create(name='Etudiant')
+        self.user = User.objects.create_user(username='student', password='password', email='s@test.com')
+        self.user.groups.add(group)
+
+    def login(self):
+        c = Client()
+        response = c.post(reverse('api-login'), {'username': 'student', 'password': 'password'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return c
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_me_is_zero_query_with_signed_cookies(self):
+        c = self.login()
+        with self.assertNumQueries(0):
+            response = c.get(reverse('api-current-user'))
+        self.assertEqual(response.json()['role'], 'Etudiant')
+        self.assertEqual(response.json()['username'], 'student')
+
+    @override_settings(SESSION_USER_CACHE_TTL=-1)
+    def test_expired_payload_is_refreshed_from_database(self):
+        c = self.login()
+        response = c.get(reverse('api-current-user'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], self.user.pk)
+
+    def test_anonymous_is_rejected(self):
+        response = Client().get(reverse('api-current-user'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_password_change_and_deactivation_end_cached_sessions(self):
+        for change in ['password', 'is_active']:
+            c = self.login()
+            self.assertEqual(c.get(reverse('api-current-user')).status_code, 200)
+            user = User.objects.get(pk=self.user.pk)
+            if change == 'password':
+                user.set_password('other')
+            else:
+                user.is_active = False
+            user.save()
+            for name in ['api-current-user', 'api-async-current-user']:
+                self.assertEqual(c.get(reverse(name)).status_code, 401)
+            user.set_password('password')
+            user.is_active = True
+            user.save()
+
+    def test_group_change_refreshes_role(self):
+        c = self.login()
+        self.assertEqual(c.get(reverse('api-current-user')).json()['role'], 'Etudiant')
+        self.user.groups.set([Group.objects.create(name='Entreprise')])
+        self.assertEqual(c.get(reverse('api-current-user')).json()['role'], 'Entreprise')
+
+
+class SignedTokenAuthTests(TestCase):
+    def setUp(self):
+        group = Group.objects.create(name='Etudiant')
+        self.user = User.objects.create_user(username='student', password='password', email='s@test.com')
+        self.user.groups.add(group)
+        offer = StageOffer.objects.create(
+            title='Offer', state='Validée', contact_email='rh@company.com',
+            organisme='Company', contact_name='Tester', description='Desc'
+        )
+        Candidature.objects.create(student=self.user, offer=offer)
+
+    def obtain(self):
+        response = Client().post(reverse('api-token'), {'username': 'student', 'password': 'password'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_me_with_token_is_zero_query(self):
+        tokens = self.obtain()
+        with self.assertNumQueries(0):
+            response = Client().get(reverse('api-current-user'), HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(response.json()['role'], 'Etudiant')
+
+    def test_token_authenticates_api_views(self):
+        tokens = self.obtain()
+        response = Client().get(reverse('api-candidature-list'), HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 1)
+
+    def test_invalid_and_expired_tokens_are_rejected(self):
+        tokens = self.obtain()
+        response = Client().get(reverse('api-candidature-list'), HTTP_AUTHORIZATION='Bearer nope')
+        self.assertEqual(response.status_code, 401)
+        with override_settings(ACCESS_TOKEN_TTL=-1):
+            response = Client().get(reverse('api-candidature-list'), HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(response.status_code, 401)
+
+    def test_refresh_is_revoked_by_password_change(self):
+        tokens = self.obtain()
+        response = Client().post(reverse('api-token-refresh'), {'refresh': tokens['refresh']}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.json())
+
+        self.user.set_password('new-password')
+        self.user.save()
+        response = Client().post(reverse('api-token-refresh'), {'refresh': tokens['refresh']}, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+
+class GenerateDatasetTests(TestCase):
+    def test_generates_requested_volume(self):
+        call_command(
+            'generate_dataset', '--users=60', '--offers=40', '--candidatures=120', '--favorites=80',
+            stdout=StringIO(),
+        )
+        self.assertEqual(User.objects.filter(username__startswith='gen_').count(), 60)
+        self.assertEqual(StageOffer.objects.count(), 40)
+        self.assertEqual(Candidature.objects.count(), 120)
+        self.assertEqual(Favorite.objects.count(), 80)
+        # Les candidatures sont postérieures au dépôt de l'offre
+        self.assertFalse(Candidature.objects.filter(date_candidature__lt=F('offer__date_depot')).exists())
+        # Le compteur matérialisé est reconstruit après les bulk_create
+        self.assertEqual(StudentCandidatureStats.objects.aggregate(n=Sum('total'))['n'], 120)
+
+    def test_respects_candidature_limit(self):
+        call_command(
+            'generate_dataset', '--users=60', '--offers=20', '--candidatures=1000', '--favorites=0',
+            stdout=StringIO(),
+        )
+        counts = StageOffer.objects.annotate(n=Count('candidature'))
+        self.assertFalse(counts.filter(n__gt=5).exists())
+        self.assertTrue(counts.filter(n=5).exists())
+        # Offres pleines clôturées comme par la vue de candidature, et elles seules
+        self.assertEqual(
+            set(counts.filter(n=5).values_list('pk', flat=True)),
+            set(StageOffer.objects.filter(state='Clôturée').values_list('pk', flat=True)),
+        )
+        self.assertFalse(StageOffer.objects.filter(state='Clôturée', closing_reason__isnull=True).exists())
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'generate_dataset', '--users=80', '--offers=60', '--candidatures=300', '--favorites=60',
+            stdout=StringIO(),
+        )
+
+    def test_every_route_is_benchmarked(self):
+        from . import urls, api_urls, async_urls
+        from .benchmark import ENDPOINTS
+        patterns = urls.urlpatterns + api_urls.router.urls + api_urls.urlpatterns + async_urls.urlpatterns
+        names = {p.name for p in patterns if getattr(p, 'name', None)}
+        covered = {endpoint.url_name for endpoint in ENDPOINTS}
+        self.assertEqual(names - covered, set())
+
+    def test_query_budgets(self):
+        from .benchmark import run_benchmark, budget_violations
+        report = run_benchmark(iterations=1)
+        self.assertEqual([r for r in report['results'] if r['status'] >= 500], [])
+        self.assertEqual(budget_violations(report), [])
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'generate_dataset', '--users=40', '--offers=30', '--candidatures=120', '--favorites=40',
+            stdout=StringIO(),
+        )
+        cls.student = (
+            User.objects.filter(groups__name='Etudiant', favorites__isnull=False, candidature__offer__state='Validée')
+            .order_by('pk').first()
+        )
+        cls.manager = User.objects.create_user(username='manager', password='password')
+        cls.manager.groups.add(Group.objects.get_or_create(name='Responsable')[0])
+
+    def assertSameResponse(self, client, sync_name, async_name, args=None, data=None):
+        expected = client.get(reverse(sync_name, args=args), data)
+        response = client.get(reverse(async_name, args=args), data)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.json(), expected.json())
+        return response
+
+    def test_same_payload_as_sync_views(self):
+        anonymous = Client()
+        response = self.assertSameResponse(anonymous, 'api-offer-list', 'api-async-offer-list')
+        self.assertTrue(response.json())
+        self.assertSameResponse(anonymous, 'api-offer-list', 'api-async-offer-list', data={'remote': 'true'})
+
+        student = Client()
+        student.force_login(self.student)
+        applied = Candidature.objects.filter(student=self.student, offer__state='Validée').first().offer_id
+        self.assertSameResponse(student, 'api-offer-list', 'api-async-offer-list')
+        response = self.assertSameResponse(student, 'api-offer-detail', 'api-async-offer-detail', args=[applied])
+        self.assertTrue(response.json()['has_applied'])
+        self.assertSameResponse(student, 'api-offer-detail', 'api-async-offer-detail', args=[0])
+        self.assertSameResponse(student, 'api-current-user', 'api-async-current-user')
+        response = self.assertSameResponse(student, 'api-favorites', 'api-async-favorites')
+        self.assertTrue(response.json())
+        favorite = Favorite.objects.filter(student=self.student).first().offer_id
+        self.assertSameResponse(student, 'api-is-favorite', 'api-async-is-favorite', args=[favorite])
+        self.assertSameResponse(student, 'api-dashboard-stats', 'api-async-dashboard-stats')
+
+        manager = Client()
+        manager.force_login(self.manager)
+        self.assertSameResponse(manager, 'api-offer-list', 'api-async-offer-list')
+        self.assertSameResponse(manager, 'api-dashboard-stats', 'api-async-dashboard-stats')
+        self.assertSameResponse(manager, 'api-favorites', 'api-async-favorites')
+
+    def test_token_and_anonymous_access(self):
+        tokens = Client().post(
+            reverse('api-token'), {'username': self.student.username, 'password': 'password123'},
+            content_type='application/json',
+        ).json()
+        with self.assertNumQueries(0):
+            response = Client().get(reverse('api-async-current-user'), HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(response.json()['id'], self.student.pk)
+
+        for name in ['api-async-current-user', 'api-async-favorites', 'api-async-dashboard-stats']:
+            response = Client().get(reverse(name))
+            self.assertEqual(response.status_code, 401)
+        response = Client().get(reverse('api-async-offer-list'), HTTP_AUTHORIZATION='Bearer nope')
+        self.assertEqual(response.status_code, 401)
+
+
+class NPlusOneTests(NPlusOneAssertionsMixin, TestCase):
+    def setUp(self):
+        for i in range(6):
+            StageOffer.objects.create(
+                title=f'Offer {i}', state='Validée', contact_email='test@test.com',
+                organisme='Test Org', contact_name='Tester', description='Desc'
+            )
+
+    def test_normalize_sql(self):
+        self.assertEqual(
+            normalize_sql('SELECT * FROM t WHERE a = 12 AND b = \'x\' AND c IN (%s, %s,  %s)'),
+            normalize_sql('SELECT * FROM t WHERE a = 7 AND b = \'yy\' AND c IN (%s)'),
+        )
+
+    def login_student_with_candidatures(self):
+        # Offres imbriquées dans les candidatures : non annotées, une requête par offre
+        student = User.objects.create_user(username='student', password='password')
+        student.groups.add(Group.objects.create(name='Etudiant'))
+        for offer in StageOffer.objects.all():
+            Candidature.objects.create(student=student, offer=offer)
+        self.client.force_login(student)
+
+    def test_detects_repeated_queries(self):
+        self.login_student_with_candidatures()
+        with self.assertRaises(NPlusOneDetected) as cm:
+            with self.assertNoNPlusOne():
+                self.client.get(reverse('api-candidature-list'))
+        self.assertIn('stages/serializers.py', str(cm.exception))
+
+    def test_single_queries_pass(self):
+        with self.assertNoNPlusOne():
+            self.client.get(reverse('api-offer-detail', args=[StageOffer.objects.first().pk]))
+
+    def test_offer_list_is_annotated(self):
+        with self.assertNoNPlusOne():
+            self.client.get(reverse('api-offer-list'))
+        self.login_student_with_candidatures()
+        with self.assertNoNPlusOne():
+            self.client.get(reverse('api-offer-list'))
+
+    @override_settings(NPLUSONE_ENABLED=True)
+    def test_middleware_header(self):
+        self.login_student_with_candidatures()
+        response = self.client.get(reverse('api-candidature-list'))
+        self.assertIn('stages/serializers.py', response['X-NPlusOne'])
+        response = self.client.get(reverse('api-csrf'))
+        self.assertNotIn('X-NPlusOne', response)
+
+
+@override_settings(SERVER_TIMING_SAMPLE_RATE=1.0)
+class ServerTimingTests(TestCase):
+    def setUp(self):
+        self.offer = StageOffer.objects.create(
+            title='Offer', state='Validée', contact_email='test@test.com',
+            organisme='Test Org', contact_name='Tester', description='Desc'
+        )
+        self.admin = User.objects.create_user(username='admin', password='password', is_staff=True)
+        self.admin.groups.add(Group.objects.create(name='Administrateur'))
+
+    def test_api_breakdown(self):
+        with self.assertLogs('stages.timing', 'INFO') as logs:
+            response = self.client.get(reverse('api-offer-list'))
+        header = response['Server-Timing']
+        self.assertIn('total;dur=', header)
+        self.assertIn('db;dur=', header)
+        self.assertIn('serializer;dur=', header)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'api-offer-list')
+        self.assertGreater(record['db_queries'], 0)
+
+    def test_template_and_pdf(self):
+        self.assertIn('template;dur=', self.client.get(reverse('home'))['Server-Timing'])
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('api-offer-export-pdf', args=[self.offer.pk]))
+        self.assertIn('pdf;dur=', response['Server-Timing'])
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_not_sampled(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('api-offer-list')))
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='password', is_staff=True)
+
+    def test_requires_staff_or_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        with override_settings(METRICS_TOKEN='secret'):
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+    def test_request_and_business_metrics(self):
+        from .metrics import APPLICATIONS, REQUESTS
+        before = REQUESTS.get(view='api-offer-list', method='GET', status='200')
+        applications = APPLICATIONS.get()
+        self.client.get(reverse('api-offer-list'))
+        offer = StageOffer.objects.create(
+            title='Offer', state='Validée', contact_email='test@test.com',
+            organisme='Test Org', contact_name='Tester', description='Desc'
+        )
+        Candidature.objects.create(student=self.staff, offer=offer)
+        self.assertEqual(REQUESTS.get(view='api-offer-list', method='GET', status='200'), before + 1)
+        self.assertEqual(APPLICATIONS.get(), applications + 1)
+
+        self.client.force_login(self.staff)
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_request_duration_seconds_bucket{view="api-offer-list",le="+Inf"}', body)
+        self.assertIn('http_request_db_queries_count{view="api-offer-list"}', body)
+        self.assertIn('stages_applications_total ', body)
+
+    def test_multiprocess_aggregation(self):
+        from .metrics import registry, APPLICATIONS
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        # Instantané d'un worker terminé : ses compteurs restent comptés, pas ses jauges
+        with open(os.path.join(directory, '999999999.json'), 'w') as f:
+            json.dump({'stages_applications_total': [[[], 5]], 'http_requests_in_progress': [[[], 3]]}, f)
+        with override_settings(METRICS_DIR=directory):
+            collected = registry.collect()
+        self.assertEqual(collected['stages_applications_total'][()], APPLICATIONS.get() + 5)
+        self.assertLess(collected['http_requests_in_progress'].get((), 0), 3)
+
+
+class SlowQueryTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='password', is_staff=True)
+        StageOffer.objects.create(
+            title='Offer', state='Validée', contact_email='test@test.com',
+            organisme='Test Org', contact_name='Tester', description='Desc'
+        )
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_logs_query_with_plan(self):
+        with self.assertLogs('stages.slowqueries', 'WARNING') as logs:
+            self.client.get(reverse('api-offer-list'))
+        entries = [json.loads(record.getMessage()) for record in logs.records]
+        select = next(e for e in entries if 'FROM "stages_stageoffer"' in e['sql'])
+        self.assertEqual(select['view'], 'api-offer-list')
+        self.assertTrue(any('stages_stageoffer' in line for line in select['plan']))
+
+    def test_explain_uses_statement_connection(self):
+        other = mock.MagicMock(vendor='postgresql')
+        cursor = other.cursor.return_value.__enter__.return_value
+        cursor.fetchall.return_value = [('Seq Scan on stages_stageoffer',)]
+        logger = SlowQueryLogger(threshold_ms=0)
+        with self.assertLogs('stages.slowqueries', 'WARNING') as logs:
+            logger(lambda *args: None, 'SELECT 1', (), False, {'connection': other})
+        cursor.execute.assert_called_once_with('EXPLAIN SELECT 1', ())
+        self.assertEqual(json.loads(logs.records[0].getMessage())['plan'], ['Seq Scan on stages_stageoffer'])
+
+    def test_admin_page_groups_entries(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        log = os.path.join(directory, 'slow.log')
+        with open(log, 'w') as f:
+            for pk, duration in [(1, 120), (2, 300)]:
+                f.write(json.dumps({
+                    'time': '2026-01-01T00:00:00', 'duration_ms': duration, 'view': 'api-offer-detail',
+                    'sql': f'SELECT * FROM "stages_stageoffer" WHERE id = {pk}', 'params': '()',
+                    'plan': ['SCAN stages_stageoffer'],
+                }) + '\n')
+        self.assertEqual(self.client.get(reverse('admin_slow_queries')).status_code, 302)
+        self.client.force_login(self.staff)
+        with override_settings(SLOW_QUERY_LOG=log):
+            response = self.client.get(reverse('admin_slow_queries'))
+        groups = response.context['groups']
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(groups[0]['count'], 2)
+        self.assertEqual(groups[0]['max_ms'], 300)
+        self.assertTrue(groups[0]['full_scan'])
+
+
+class BackfillTests(TestCase):
+    def setUp(self):
+        for i in range(5):
+            StageOffer.objects.create(
+                title=f'Offer {i}', state='Validée', contact_email='test@test.com',
+                organisme='Test Org', contact_name='Tester', description='Desc'
+            )
+
+    def test_dry_run_writes_nothing(self):
+        call_command('backfill_offer_filters', '--dry-run', stdout=StringIO())
+        self.assertEqual(StageOffer.objects.filter(city__isnull=True).count(), 5)
+        self.assertFalse(BackfillCheckpoint.objects.exists())
+
+    def test_resumes_from_checkpoint(self):
+        call_command('backfill_offer_filters', '--batch-size=2', '--limit=3', stdout=StringIO())
+        self.assertEqual(StageOffer.objects.filter(city__isnull=True).count(), 2)
+        checkpoint = BackfillCheckpoint.objects.get(name='offer_filters')
+        self.assertIsNone(checkpoint.completed_at)
+
+        call_command('backfill_offer_filters', '--batch-size=2', stdout=StringIO())
+        self.assertEqual(StageOffer.objects.filter(city__isnull=True).count(), 0)
+        checkpoint.refresh_from_db()
+        self.assertEqual(checkpoint.processed, 5)
+        self.assertIsNotNone(checkpoint.completed_at)
+
+    def test_written_batches_invalidate_cache(self):
+        from django.core.cache import cache
+        from .cache import cached
+        cache.clear()
+        cached(('offers',), 'cities', lambda: 'avant')
+        call_command('backfill_offer_filters', '--dry-run', stdout=StringIO())
+        self.assertEqual(cached(('offers',), 'cities', lambda: 'après'), 'avant')
+        call_command('backfill_offer_filters', stdout=StringIO())
+        self.assertEqual(cached(('offers',), 'cities', lambda: 'après'), 'après')
+
+    def test_limit_reaching_the_last_row_completes(self):
+        call_command('backfill_offer_filters', '--limit=5', stdout=StringIO())
+        self.assertIsNotNone(BackfillCheckpoint.objects.get(name='offer_filters').completed_at)
+
+    def test_resumed_spread_uses_first_reference_date(self):
+        import datetime
+        from django.utils import timezone
+        student = User.objects.create_user(username='student')
+        for offer in StageOffer.objects.all():
+            Candidature.objects.create(student=student, offer=offer)
+        first = timezone.now() - datetime.timedelta(days=30)
+        with mock.patch('stages.backfill.timezone.now', return_value=first):
+            call_command('spread_dates', '--limit=2', '--seed=1', stdout=StringIO())
+        call_command('spread_dates', '--seed=1', stdout=StringIO())
+        resumed = list(Candidature.objects.order_by('pk').values_list('date_candidature', flat=True))
+
+        with mock.patch('stages.backfill.timezone.now', return_value=first):
+            call_command('spread_dates', '--restart', '--seed=1', stdout=StringIO())
+        self.assertEqual(list(Candidature.objects.order_by('pk').values_list('date_candidature', flat=True)), resumed)
+
+
+class PrecompressedAssetTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        os.makedirs(os.path.join(self.directory, 'css'))
+        os.makedirs(os.path.join(self.directory, 'assets'))
+        self.css = b'body { color: #333; }\n' * 100
+        for name in ['css/site.0123456789ab.css', 'css/site.css', 'assets/index-Bh9xB3k7.js', 'index.html']:
+            with open(os.path.join(self.directory, name), 'wb') as f:
+                f.write(self.css)
+
+    def test_compress_file_writes_smaller_variants(self):
+        import gzip
+        from .assets import brotli, compress_file
+        path = os.path.join(self.directory, 'css/site.css')
+        written = compress_file(path)
+        self.assertIn(path + '.gz', written)
+        with gzip.open(path + '.gz') as f:
+            self.assertEqual(f.read(), self.css)
+        self.assertEqual(os.path.exists(path + '.br'), brotli is not None)
+        # Variantes à jour : rien à réécrire
+        self.assertEqual(compress_file(path), [])
+
+    def test_static_file_negotiates_encoding(self):
+        from .assets import compress_tree
+        compress_tree(self.directory)
+        url = '/static/css/site.0123456789ab.css'
+        with override_settings(STATIC_ROOT=self.directory):
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+            self.assertEqual(response['Content-Type'], 'text/css')
+            self.assertIn('Accept-Encoding', response['Vary'])
+
+            response = self.client.get(url)
+            self.assertFalse(response.has_header('Content-Encoding'))
+            self.assertEqual(b''.join(response.streaming_content), self.css)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+            self.assertIn('no-cache', self.client.get('/static/css/site.css')['Cache-Control'])
+            self.assertEqual(self.client.get('/static/../settings.py').status_code, 404)
+
+    def test_spa_routes_fall_back_to_index(self):
+        with override_settings(SPA_ROOT=self.directory, SPA_INDEX_MAX_AGE=60):
+            response = self.client.get('/app/offres/12')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Cache-Control'], 'public, max-age=60, must-revalidate')
+            response = self.client.get('/app/assets/index-Bh9xB3k7.js')
+            self.assertIn('immutable', response['Cache-Control'])
+            self.assertEqual(self.client.get('/app/assets/missing.js').status_code, 404)
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        for i in range(10):
+            StageOffer.objects.create(
+                title=f'Offer {i}', state='Validée', contact_email='rh@company.com',
+                organisme='Company', contact_name='Tester', description='Desc ' * 50
+            )
+
+    def test_api_responses_are_negotiated(self):
+        import gzip
+        plain = self.client.get(reverse('api-offer-list'))
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        response = self.client.get(reverse('api-offer-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertLess(len(response.content), len(plain.content))
+        self.assertEqual(json.loads(gzip.decompress(response.content)), plain.json())
+
+        with override_settings(COMPRESSION_MIN_SIZE=10 ** 9):
+            response = self.client.get(reverse('api-offer-list'), HTTP_ACCEPT_ENCODING='gzip')
+            self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_negotiation_order(self):
+        from .compression import CODECS, negotiate
+        self.assertEqual(negotiate('gzip, deflate', ['zstd', 'br', 'gzip']), 'gzip')
+        self.assertIsNone(negotiate('gzip;q=0, identity', ['gzip']))
+        # Préférence du client avant celle du serveur
+        self.assertEqual(negotiate('gzip, br;q=0.5', ['br', 'gzip']), 'gzip')
+        if 'zstd' in CODECS:
+            self.assertEqual(negotiate('gzip, br, zstd', ['zstd', 'br', 'gzip']), 'zstd')
+
+    def test_streaming_compression_flushes_each_chunk(self):
+        import zlib
+        from .compression import CODECS, brotli, compress_stream, zstandard
+        decompress = {
+            'gzip': lambda body: zlib.decompress(body, 31),
+            'br': lambda body: brotli.decompress(body),
+            'zstd': lambda body: zstandard.ZstdDecompressor().decompressobj().decompress(body),
+        }
+        chunks = [b'{"id": %d, "title": "Offer"}\n' % i for i in range(100)]
+        for encoding in CODECS:
+            compressed = list(compress_stream(iter(chunks), encoding, 3))
+            self.assertGreater(len(compressed), 1)
+            self.assertEqual(decompress[encoding](b''.join(compressed)), b''.join(chunks))
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    def test_same_output_as_drf(self):
+        import datetime
+        import decimal
+        import uuid
+        from django.utils import timezone
+        from django.utils.translation import gettext_lazy
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import FastJSONRenderer
+        data = {
+            'created': timezone.now(),
+            'paris': datetime.datetime(2025, 3, 1, 12, 30, tzinfo=datetime.timezone(datetime.timedelta(hours=1))),
+            'day': datetime.date(2025, 3, 1),
+            'amount': decimal.Decimal('12.50'),
+            'label': gettext_lazy('Validée'),
+            'id': uuid.uuid4(),
+            'text': 'ligne\u2028suivante é',
+            'nested': [{'n': 1, 'ok': True, 'none': None}],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(
+            FastJSONRenderer().render(data, 'application/json; indent=2'),
+            JSONRenderer().render(data, 'application/json; indent=2'),
+        )
+
+    def test_parser(self):
+        from rest_framework.exceptions import ParseError
+        from .renderers import FastJSONParser
+        self.assertEqual(FastJSONParser().parse(BytesIO('{"titre": "Stage é"}'.encode())), {'titre': 'Stage é'})
+        for body in [b'{"a": ', b'{"a": NaN}']:
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(BytesIO(body))
+
+
+class StartupImportTests(SimpleTestCase):
+    def test_parse_importtime_subtree(self):
+        from .importtime import parse_importtime, subtree
+        records = parse_importtime(
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       100 |        100 | django.urls\n'
+            'import time:        50 |         50 |     reportlab.lib\n'
+            'import time:        30 |         80 |   stages.pdf_generator\n'
+            'import time:        20 |        100 | config.urls\n'
+        )
+        self.assertEqual([r.name for r in subtree(records, 'config.urls')], ['reportlab.lib', 'stages.pdf_generator'])
+        self.assertEqual((records[1].depth, records[1].self_us), (2, 50))
+
+    def test_lazy_module_loads_on_first_use(self):
+        import sys
+        from .lazy import lazy_import
+        module = lazy_import('stages.emails')
+        with mock.patch.object(module, 'send_registration_email') as send:
+            sys.modules['stages.emails'].send_registration_email(None)
+        send.assert_called_once()
+        self.assertEqual(module.send_registration_email, sys.modules['stages.emails'].send_registration_email)
+
+    def test_urlconf_does_not_import_heavy_subsystems(self):
+        from .importtime import profile_imports
+        report = profile_imports(runs=1)
+        self.assertGreater(report['urlconf_ms'], 0)
+        self.assertEqual(report['eager_lazy_modules'], [])
+
+
+class TieredCacheTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.manager = User.objects.create_user(username='manager', password='password')
+        self.manager.groups.add(Group.objects.create(name='Responsable'))
+
+    def test_local_lru_evicts_and_expires(self):
+        from .cache import LocalLRU
+        lru = LocalLRU(max_entries=2, timeout=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
+        lru.set('d', 4, timeout=0)
+        self.assertIsNone(lru.get('d'))
+        with mock.patch('stages.cache.time.monotonic', return_value=10 ** 9):
+            self.assertIsNone(lru.get('a'))
+
+    def test_local_tier_in_front_of_shared(self):
+        from django.core.cache import cache
+        from .cache import shared_cache
+        cache.set('key', 'value')
+        self.assertEqual(shared_cache().get('key'), 'value')
+        # Supprimé par un autre worker : la copie locale sert jusqu'à LOCAL_TIMEOUT
+        shared_cache().delete('key')
+        self.assertEqual(cache.get('key'), 'value')
+        cache.local.clear()
+        self.assertIsNone(cache.get('key'))
+
+    def test_write_bumps_namespace_for_every_worker(self):
+        from django.core.cache import cache
+        from .cache import cached
+        compute = mock.Mock(side_effect=[1, 2])
+        self.assertEqual(cached(('offers',), 'answer', compute), 1)
+        cache.local.clear()
+        self.assertEqual(cached(('offers',), 'answer', compute), 1)
+        StageOffer.objects.create(
+            title='Offer', contact_email='rh@company.com', organisme='Company',
+            contact_name='Tester', description='Desc'
+        )
+        # Un autre worker (niveau local intact) lit la nouvelle version dans le cache partagé
+        self.assertEqual(cached(('offers',), 'answer', compute), 2)
+        self.assertEqual(compute.call_count, 2)
+
+    def test_dashboard_stats_follow_writes(self):
+        c = Client()
+        c.force_login(self.manager)
+        for name in ['api-dashboard-stats', 'api-async-dashboard-stats']:
+            self.assertEqual(c.get(reverse(name)).json()['total_offers'], StageOffer.objects.count())
+            # Utilisateur de la session et son rôle seulement
+            with self.assertNumQueries(2):
+                c.get(reverse(name))
+            StageOffer.objects.create(
+                title='Offer', contact_email='rh@company.com', organisme='Company',
+                contact_name='Tester', description='Desc'
+            )
+            self.assertEqual(c.get(reverse(name)).json()['total_offers'], StageOffer.objects.count())
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Instantané SQLite')
+class ReportRoutingTests(TransactionTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.snapshot = os.path.join(self.directory, 'reports.sqlite3')
+        self.student = User.objects.create_user(username='student', password='password')
+        self.student.groups.add(Group.objects.create(name='Etudiant'))
+        self.offer = StageOffer.objects.create(
+            title='Offer', state='Validée', contact_email='rh@company.com',
+            organisme='Company', contact_name='Tester', description='Desc'
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_snapshot_copies_committed_data(self):
+        import sqlite3
+        from .dbrouter import refresh_snapshot
+        refresh_snapshot(self.snapshot)
+        copy = sqlite3.connect(self.snapshot)
+        try:
+            self.assertEqual(copy.execute('SELECT COUNT(*) FROM stages_stageoffer').fetchone()[0], 1)
+        finally:
+            copy.close()
+
+    def test_reports_read_replica_until_a_write(self):
+        from .dbrouter import ReportRouter, refresh_snapshot, reporting
+        router = ReportRouter()
+        with override_settings(REPORTS_SNAPSHOT_PATH=self.snapshot), \
+                mock.patch('stages.dbrouter.reports_configured', return_value=True):
+            self.assertIsNone(router.db_for_read(StageOffer))
+            with reporting():
+                # Pas d'instantané : base principale, sans copie pendant la requête
+                self.assertIsNone(router.db_for_read(StageOffer))
+                self.assertFalse(os.path.exists(self.snapshot))
+                refresh_snapshot(self.snapshot)
+                self.assertEqual(router.db_for_read(StageOffer), 'reports')
+                # Sessions et utilisateurs restent sur la base principale
+                self.assertIsNone(router.db_for_read(User))
+                Favorite.objects.create(student=self.student, offer=self.offer)
+                self.assertIsNone(router.db_for_read(StageOffer))
+
+    def test_pinned_client_never_gets_cached_snapshot_values(self):
+        from django.core.cache import cache
+        from .cache import cached
+        from .dbrouter import start_routing, stop_routing
+
+        def request(compute, pinned=False):
+            state, token = start_routing(pinned)
+            state.reporting = True
+            try:
+                return cached(('offers',), 'report', compute)
+            finally:
+                stop_routing(token)
+
+        cache.clear()
+        with mock.patch('stages.dbrouter.reports_configured', return_value=True):
+            self.assertEqual(request(lambda: 'ancien'), 'ancien')
+            StageOffer.objects.create(
+                title='Offer 2', state='Validée', contact_email='rh@company.com',
+                organisme='Company', contact_name='Tester', description='Desc'
+            )
+            # Instantané pas encore rafraîchi : la valeur recalculée après l'écriture est périmée
+            self.assertEqual(request(lambda: 'ancien'), 'ancien')
+            # Le client qui vient d'écrire lit la base principale, sans l'entrée issue de l'instantané
+            self.assertEqual(request(lambda: 'nouveau', pinned=True), 'nouveau')
+            self.assertEqual(request(lambda: 'autre', pinned=True), 'nouveau')
+
+    def test_client_is_pinned_to_primary_after_a_write(self):
+        c = Client()
+        c.force_login(self.student)
+        response = c.get(reverse('api-offer-list'))
+        self.assertNotIn('stages_primary', response.cookies)
+        response = c.post(reverse('api-toggle-favorite', args=[self.offer.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('stages_primary', response.cookies)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Réglages propres à SQLite')
+class SQLiteTuningTests(SimpleTestCase):
+    def test_readers_do_not_block_behind_writers(self):
+        from django.conf import settings
+        from .dbstress import stress
+        result = stress(settings.DATABASES['default']['OPTIONS'], writers=3, readers=4, duration=1.0, hold=0.05)
+        self.assertGreater(result['commits'], 0)
+        self.assertEqual(result['lock_errors'], 0)
+        # Aucune lecture n'attend la fin d'une transaction d'écriture (50 ms)
+        self.assertLess(result['read_p99_ms'], 50)
+
+    @override_settings(DB_LOCK_RETRY_DELAY=0)
+    def test_retry_on_lock(self):
+        from django.db import OperationalError
+        from .dbretry import retry_on_lock
+        calls = []
+
+        @retry_on_lock(attempts=3)
+        def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'ok'
+
+        self.assertEqual(flaky(), 'ok')
+        self.assertEqual(len(calls), 3)
+
+        @retry_on_lock
+        def broken():
+            calls.append(1)
+            raise OperationalError('no such table: nope')
+
+        calls.clear()
+        with self.assertRaises(OperationalError):
+            broken()
+        self.assertEqual(len(calls), 1)
+
+
+class BulkModerationTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='password', is_staff=True)
+        self.company = User.objects.create_user(username='company', password='password')
+        self.offers = [
+            StageOffer.objects.create(
+                title=f'Offer {i}', contact_email=f'rh{i}@company.com', organisme='Company',
+                contact_name='Tester', description='Desc'
+            )
+            for i in range(3)
+        ]
+        self.offers[2].state = 'Validée'
+        self.offers[2].save()
+        self.url = reverse('api-offer-bulk-moderate')
+
+    def test_bulk_validate_single_update_and_queued_emails(self):
+        from django.core import mail
+        from .cache import versioned_key
+        from .models import QueuedEmail
+        c = Client()
+        c.force_login(self.admin)
+        ids = [offer.pk for offer in self.offers] + [999999]
+        key_before = versioned_key(('offers',), 'k')
+        with self.assertNumQueries(6):
+            # Utilisateur, SAVEPOINT, SELECT, UPDATE, INSERT des e-mails, RELEASE
+            response = c.post(self.url, {'ids': ids, 'action': 'validate'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['updated'], 2)
+        self.assertEqual([r['result'] for r in data['results']], ['updated', 'updated', 'unchanged', 'not_found'])
+        self.assertEqual(StageOffer.objects.filter(state='Validée').count(), 3)
+        self.assertNotEqual(versioned_key(('offers',), 'k'), key_before)
+
+        # Aucun envoi pendant la requête : le worker envoie la file
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(QueuedEmail.objects.filter(kind='offer_validated').count(), 2)
+        call_command('send_queued_emails', stdout=StringIO())
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['rh0@company.com', 'rh1@company.com'])
+        self.assertFalse(QueuedEmail.objects.filter(sent_at__isnull=True).exists())
+
+    def test_rejects_non_staff_and_invalid_input(self):
+        c = Client()
+        c.force_login(self.company)
+        response = c.post(self.url, {'ids': [self.offers[0].pk], 'action': 'refuse'}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        c.force_login(self.admin)
+        for payload in [{'ids': [1], 'action': 'close'}, {'ids': [], 'action': 'refuse'}, {'ids': ['x'], 'action': 'refuse'}]:
+            response = c.post(self.url, payload, content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(StageOffer.objects.filter(state='Refusée').exists())
+
+    def test_failed_sends_are_retried(self):
+        from django.core import mail
+        from .emails import queue_emails, send_queued
+        from .models import QueuedEmail
+        queue_emails('offer_refused', [('Sujet', 'Corps', 'a@test.com'), None, ('Sujet', 'Corps', 'b@test.com')])
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('SMTP')):
+            self.assertEqual(send_queued(), (0, 2))
+        self.assertEqual(QueuedEmail.objects.filter(attempts=1, last_error='SMTP').count(), 2)
+        self.assertEqual(send_queued(), (2, 0))
+        self.assertEqual(len(mail.outbox), 2)
+
+
+class BulkCandidatureStatusTests(TestCase):
+    def setUp(self):
+        group_company = Group.objects.create(name='Entreprise')
+        group_student = Group.objects.create(name='Etudiant')
+        self.company = User.objects.create_user(username='company', password='password', email='rh@company.com')
+        self.company.groups.add(group_company)
+        own = StageOffer.objects.create(
+            title='Own', state='Validée', contact_email='rh@company.com', organisme='Company',
+            contact_name='Tester', description='Desc', company=self.company
+        )
+        other = StageOffer.objects.create(
+            title='Other', state='Validée', contact_email='rh@other.com', organisme='Other',
+            contact_name='Tester', description='Desc'
+        )
+        self.candidatures = []
+        for i, offer in enumerate([own, own, own, other]):
+            student = User.objects.create_user(username=f'student{i}', password='password', email=f'student{i}@test.com')
+            student.groups.add(group_student)
+            self.candidatures.append(Candidature.objects.create(offer=offer, student=student))
+        self.candidatures[1].status = 'Acceptée'
+        self.candidatures[1].save()
+        self.url = reverse('api-candidature-bulk-status')
+
+    def test_bulk_status_checks_ownership_in_one_query(self):
+        from .models import QueuedEmail
+        c = Client()
+        c.force_login(self.company)
+        ids = [candidature.pk for candidature in self.candidatures]
+        with self.assertNumQueries(7):
+            # Utilisateur, rôle, SAVEPOINT, SELECT avec la propriété, UPDATE, INSERT des e-mails, RELEASE
+            response = c.post(self.url, {'ids': ids, 'status': 'Acceptée'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['result'] for r in response.json()['results']], ['updated', 'unchanged', 'updated', 'not_found'])
+        self.assertEqual(
+            list(Candidature.objects.order_by('pk').values_list('status', flat=True)),
+            ['Acceptée', 'Acceptée', 'Acceptée', 'En attente'],
+        )
+        self.assertEqual(
+            sorted(QueuedEmail.objects.filter(kind='application_status').values_list('to', flat=True)),
+            ['student0@test.com', 'student2@test.com'],
+        )
+
+    def test_back_to_pending_sends_nothing_and_students_are_refused(self):
+        from .models import QueuedEmail
+        c = Client()
+        c.force_login(self.company)
+        response = c.post(self.url, {'ids': [self.candidatures[1].pk], 'status': 'En attente'}, content_type='application/json')
+        self.assertEqual(response.json()['updated'], 1)
+        self.assertFalse(QueuedEmail.objects.exists())
+        c.force_login(self.candidatures[0].student)
+        response = c.post(self.url, {'ids': [self.candidatures[0].pk], 'status': 'Acceptée'}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+
+class FavoriteFlagTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(username='student', password='password')
+        self.student.groups.add(Group.objects.create(name='Etudiant'))
+        self.offers = [
+            StageOffer.objects.create(
+                title=f'Offer {i}', state='Validée', contact_email='rh@company.com',
+                organisme='Company', contact_name='Tester', description='Desc'
+            )
+            for i in range(4)
+        ]
+        Favorite.objects.create(student=self.student, offer=self.offers[1])
+        Favorite.objects.create(student=self.student, offer=self.offers[3])
+
+    def test_offer_list_embeds_is_favorite(self):
+        c = Client()
+        c.force_login(self.student)
+        expected = {self.offers[1].pk, self.offers[3].pk}
+        for name in ['api-offer-list', 'api-async-offer-list']:
+            data = c.get(reverse(name)).json()
+            self.assertEqual({offer['id'] for offer in data if offer['is_favorite']}, expected)
+        self.assertTrue(c.get(reverse('api-offer-detail', args=[self.offers[1].pk])).json()['is_favorite'])
+        self.assertTrue(all(offer['is_favorite'] for offer in c.get(reverse('api-favorites')).json()))
+        # Anonyme : jamais favori, sans requête supplémentaire
+        self.assertFalse(any(offer['is_favorite'] for offer in Client().get(reverse('api-offer-list')).json()))
+
+    def test_student_in_several_groups_manages_favorites(self):
+        # Premier groupe (plus petit pk) : Responsable ; l'appartenance à Etudiant suffit
+        user = User.objects.create_user(username='both', password='password')
+        user.groups.add(Group.objects.create(name='Responsable'), Group.objects.get(name='Etudiant'))
+        c = Client()
+        c.force_login(user)
+        response = c.post(reverse('api-toggle-favorite', args=[self.offers[0].pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(c.get(reverse('api-is-favorite', args=[self.offers[0].pk])).json()['is_favorite'])
+        self.assertEqual([offer['id'] for offer in c.get(reverse('api-favorites')).json()], [self.offers[0].pk])
+        # is_favorite des offres et identifiants : pas de règle du premier groupe non plus
+        for name in ['api-offer-list', 'api-async-offer-list']:
+            data = c.get(reverse(name)).json()
+            self.assertEqual([offer['id'] for offer in data if offer['is_favorite']], [self.offers[0].pk])
+        self.assertEqual(c.get(reverse('api-favorite-ids')).json(), {'ids': [self.offers[0].pk]})
+        for name in ['api-async-favorites', 'api-async-is-favorite']:
+            args = [self.offers[0].pk] if name == 'api-async-is-favorite' else []
+            self.assertEqual(c.get(reverse(name, args=args)).status_code, 200)
+        self.assertTrue(c.get(reverse('api-async-is-favorite', args=[self.offers[0].pk])).json()['is_favorite'])
+
+    def test_favorite_ids_etag(self):
+        from django.core.cache import cache
+        cache.clear()
+        c = Client()
+        c.force_login(self.student)
+        url = reverse('api-favorite-ids')
+        response = c.get(url)
+        self.assertEqual(response.json(), {'ids': [self.offers[1].pk, self.offers[3].pk]})
+        etag = response['ETag']
+        # Liste en cache : utilisateur de la session seulement
+        with self.assertNumQueries(1):
+            self.assertEqual(c.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Les favoris d'un autre étudiant n'invalident pas cette liste
+        other = User.objects.create_user(username='other', password='password')
+        Favorite.objects.create(student=other, offer=self.offers[0])
+        with self.assertNumQueries(1):
+            self.assertEqual(c.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        c.post(reverse('api-toggle-favorite', args=[self.offers[0].pk]))
+        response = c.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['ids']), 3)
+        self.assertNotEqual(response['ETag'], etag)
@@ -0,0 +1,116 @@
+"""
+Mesure du temps passé par requête HTTP : base de données, sérialisation DRF,
+rendu des gabarits, génération PDF et envoi d'e-mails.
+
+ServerTimingMiddleware ouvre une mesure pour les requêtes échantillonnées
+(SERVER_TIMING_SAMPLE_RATE) ; le code instrumenté ajoute son temps via timed(nom),
+utilisable comme gestionnaire de contexte ou décorateur et sans effet hors mesure.
+Le résultat est exposé dans l'en-tête Server-Timing et journalisé en JSON
+(logger 'stages.timing').
+"""
+import time
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template import TemplateDoesNotExist
+
+
+_current = ContextVar('stages_request_timings', default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.durations = {}
+        self.counts = {}
+        self.depth = {}
+        self.started = {}
+
+    def add(self, name, duration, count=1):
+        self.durations[name] = self.durations.get(name, 0.0) + duration
+        self.counts[name] = self.counts.get(name, 0) + count
+
+    def __call__(self, execute, sql, params, many, context):
+        """execute_wrapper : temps et nombre de requêtes SQL"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add('db', time.perf_counter() - started)
+
+
+def current_timings():
+    return _current.get()
+
+
+def start_timings():
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def stop_timings(token):
+    _current.reset(token)
+
+
+class timed(ContextDecorator):
+    """
+    Ajoute la durée du bloc à la mesure `name` de la requête en cours.
+    Les blocs imbriqués de même nom (sérialiseurs imbriqués, listes) ne sont comptés qu'une fois.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        timings = _current.get()
+        if timings is not None:
+            depth = timings.depth.get(self.name, 0)
+            timings.depth[self.name] = depth + 1
+            if depth == 0:
+                timings.started[self.name] = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        timings = _current.get()
+        if timings is not None and self.name in timings.depth:
+            timings.depth[self.name] -= 1
+            if timings.depth[self.name] == 0:
+                timings.add(self.name, time.perf_counter() - timings.started.pop(self.name))
+        return False
+
+
+class TimedSerializerMixin:
+    """Comptabilise to_representation dans la mesure 'serializer'"""
+
+    def to_representation(self, instance):
+        with timed('serializer'):
+            return super().to_representation(instance)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        with timed('template'):
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Moteur DjangoTemplates dont les rendus sont comptabilisés dans la mesure 'template'"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def server_timing_header(timings, total):
+    parts = [f'total;dur={total * 1000:.1f}']
+    for name in sorted(timings.durations):
+        duration = timings.durations[name] * 1000
+        if name == 'db':
+            parts.append(f'db;dur={duration:.1f};desc="{timings.counts[name]} queries"')
+        else:
+            parts.append(f'{name};dur={duration:.1f}')
+    return ', '.join(parts)
@@ -27,6 +27,7 @@ urlpatterns = [
     path('student/my-candidatures/', views.StudentCandidatureListView.as_view(), name='student_candidature_list'),
     path('student/candidature/<int:pk>/withdraw/', views.withdraw_candidature, name='withdraw_candidature'),
     path('student/profile/edit/', views.profile_edit, name='profile_edit'),
+    path('student/<int:user_id>/cv/', views.download_student_cv, name='student_cv_download'),
 
     # Manager (suite)
     path('manager/offer/<int:pk>/candidates/', views.ManagerOfferCandidatesView.as_view(), name='manager_offer_candidates'),
@@ -34,6 +35,8 @@ urlpatterns = [
 
     # Admin
     path('admin/dashboard/', views.AdminDashboardView.as_view(), name='admin_dashboard'),
+    path('admin/reports/students/', views.AdminStudentReportView.as_view(), name='admin_student_report'),
+    path('admin/slow-queries/', views.AdminSlowQueryView.as_view(), name='admin_slow_queries'),
     path('admin/offers/', views.AdminOfferListView.as_view(), name='admin_offer_list'),
     path('admin/offer/<int:pk>/state/<str:new_state>/', views.admin_change_state, name='admin_change_state'),
     path('admin/users/', views.AdminUserListView.as_view(), name='admin_user_list'),
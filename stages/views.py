@@ -2,19 +2,27 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.views.generic import CreateView, ListView, DetailView, TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.db.models import Count
+from django.db import transaction
+from django.db.models import Count, Q
 from django.db.models.functions import TruncMonth
 from django.utils import timezone
 from datetime import timedelta
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from .models import StageOffer, Candidature, StudentProfile
 from .forms import StageOfferForm, StageOfferFormAuthenticated, StudentProfileForm, CustomUserCreationForm
 import json
 import csv
-from django.http import HttpResponse
+import hmac
+import os
+from django.conf import settings
+from django.http import HttpResponse, Http404
 from django.core.serializers.json import DjangoJSONEncoder
 from django.contrib.auth.models import User, Group
 from django.contrib import messages
+from . import reports, cv_index, slowqueries
+from .sendfile import sendfile_response
+from .metrics import registry, OFFER_VALIDATIONS
+from .dbretry import retry_on_lock
 
 # Helper function for home page
 def home(request):
@@ -98,11 +106,17 @@ class CompanyOfferCandidatesView(LoginRequiredMixin, UserPassesTestMixin, ListVi
 
     def get_queryset(self):
         self.offer = get_object_or_404(StageOffer, pk=self.kwargs['pk'])
-        return Candidature.objects.filter(offer=self.offer).order_by('date_candidature')
+        qs = Candidature.objects.filter(offer=self.offer).order_by('date_candidature')
+        # Recherche par mots-clés dans le texte des CV (classement par pertinence)
+        q = self.request.GET.get('q')
+        if q:
+            return cv_index.rank_candidatures(qs, q)
+        return qs
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['offer'] = self.offer
+        context['q'] = self.request.GET.get('q', '')
         return context
 
 # Action pour accepter/refuser un candidat
@@ -166,6 +180,8 @@ def validate_or_refuse_offer(request, pk, action):
         offer.state = 'Refusée'
         messages.warning(request, f"Offre '{offer.title}' refusée.")
     offer.save()
+    if action in ('validate', 'refuse'):
+        OFFER_VALIDATIONS.inc(action=action)
     return redirect('manager_offer_list')
 
 # 2.3 Vues pour l'Étudiant
@@ -199,24 +215,30 @@ class StudentOfferDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView
 
 @login_required
 @user_passes_test(is_etudiant)
+@retry_on_lock
 def apply_for_offer(request, pk):
-    offer = get_object_or_404(StageOffer, pk=pk)
+    get_object_or_404(StageOffer, pk=pk)
     
-    # Check if already applied
-    if Candidature.objects.filter(student=request.user, offer=offer).exists():
-        return redirect('student_offer_detail', pk=pk)
-
-    # Check max candidatures
-    count = Candidature.objects.filter(offer=offer).count()
-    if count < 5:
-        Candidature.objects.create(student=request.user, offer=offer)
+    # Vérifications et création dans la même transaction (IMMEDIATE sous SQLite, verrou
+    # de ligne sous PostgreSQL) : deux candidatures simultanées ne dépassent pas la limite
+    with transaction.atomic():
+        offer = StageOffer.objects.select_for_update().get(pk=pk)
         
-        # Check if max reached AFTER registration
-        new_count = Candidature.objects.filter(offer=offer).count()
-        if new_count >= 5:
-            offer.state = 'Clôturée'
-            offer.closing_reason = "Automatique : Limite de 5 candidatures atteinte"
-            offer.save()
+        # Check if already applied
+        if Candidature.objects.filter(student=request.user, offer=offer).exists():
+            return redirect('student_offer_detail', pk=pk)
+        
+        # Check max candidatures
+        count = Candidature.objects.filter(offer=offer).count()
+        if count < 5:
+            Candidature.objects.create(student=request.user, offer=offer)
+            
+            # Check if max reached AFTER registration
+            if count + 1 >= 5:
+                offer.state = 'Clôturée'
+                offer.closing_reason = "Automatique : Limite de 5 candidatures atteinte"
+                # Seulement ces champs : une modification concurrente de l'offre est conservée
+                offer.save(update_fields=['state', 'closing_reason'])
     
     return redirect('student_offer_detail', pk=pk)
 
@@ -285,15 +307,46 @@ class AdminDashboardView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
         context['chart_labels'] = json.dumps(labels, cls=DjangoJSONEncoder)
         context['chart_data'] = json.dumps(data, cls=DjangoJSONEncoder)
         
-        # Bonus: Stats per student
-        context['candidatures_per_student'] = (
-            Candidature.objects.values('student__username', 'student__email')
-            .annotate(total=Count('id'))
-            .order_by('-total')
-        )
+        # Bonus: Top N des étudiants (le rapport complet est paginé sur admin_student_report)
+        context['candidatures_per_student'] = reports.top_students()
+        context['top_students_limit'] = reports.DASHBOARD_TOP_STUDENTS
         
         return context
 
+# Rapport paginé : candidatures par étudiant
+class AdminStudentReportView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
+    template_name = 'stages/admin_student_report.html'
+
+    def test_func(self):
+        return is_admin(self.request.user)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page, sort, search = reports.paginate_student_report(self.request.GET)
+        context['page_obj'] = page
+        context['stats'] = page.object_list
+        context['sort'] = sort
+        context['q'] = search
+        return context
+
+class AdminSlowQueryView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
+    template_name = 'stages/admin_slow_queries.html'
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        entries = slowqueries.read_entries()
+        view = self.request.GET.get('view', '')
+        if view:
+            entries = [e for e in entries if e.get('view') == view]
+        context['groups'] = slowqueries.summarize(entries)[:100]
+        context['recent'] = entries[:50]
+        context['view'] = view
+        context['threshold'] = settings.SLOW_QUERY_THRESHOLD_MS
+        return context
+
 class AdminOfferListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
     model = StageOffer
     template_name = 'stages/admin_offer_list.html'
@@ -385,23 +438,25 @@ class StudentCandidatureListView(LoginRequiredMixin, UserPassesTestMixin, ListVi
 # Vue pour retirer une candidature
 @login_required
 @user_passes_test(is_etudiant)
+@retry_on_lock
 def withdraw_candidature(request, pk):
     candidature = get_object_or_404(Candidature, pk=pk, student=request.user)
     offer = candidature.offer
     
-    # Supprimer la candidature
-    candidature.delete()
-    messages.success(request, "Candidature retirée avec succès.")
-
-    # Logique intelligente : Réouvrir l'offre si elle était clôturée pour cause de limite atteinte
-    # et qu'on repasse sous la barre des 5.
-    if offer.state == 'Clôturée' and offer.closing_reason and "Limite de 5 candidatures atteinte" in offer.closing_reason:
-        current_count = offer.candidature_set.count()
-        if current_count < 5:
-            offer.state = 'Validée'
-            offer.closing_reason = None
-            offer.save()
+    with transaction.atomic():
+        # Supprimer la candidature
+        candidature.delete()
+
+        # Logique intelligente : Réouvrir l'offre si elle était clôturée pour cause de limite atteinte
+        # et qu'on repasse sous la barre des 5.
+        if offer.state == 'Clôturée' and offer.closing_reason and "Limite de 5 candidatures atteinte" in offer.closing_reason:
+            current_count = offer.candidature_set.count()
+            if current_count < 5:
+                offer.state = 'Validée'
+                offer.closing_reason = None
+                offer.save()
 
+    messages.success(request, "Candidature retirée avec succès.")
     return redirect('student_candidature_list')
 
 # Vue pour le responsable pour voir les candidats d'une offre
@@ -415,11 +470,17 @@ class ManagerOfferCandidatesView(LoginRequiredMixin, UserPassesTestMixin, ListVi
 
     def get_queryset(self):
         self.offer = get_object_or_404(StageOffer, pk=self.kwargs['pk'])
-        return Candidature.objects.filter(offer=self.offer).order_by('date_candidature')
+        qs = Candidature.objects.filter(offer=self.offer).order_by('date_candidature')
+        # Recherche par mots-clés dans le texte des CV (classement par pertinence)
+        q = self.request.GET.get('q')
+        if q:
+            return cv_index.rank_candidatures(qs, q)
+        return qs
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['offer'] = self.offer
+        context['q'] = self.request.GET.get('q', '')
         return context
 
 # Vue pour éditer le profil étudiant
@@ -466,7 +527,7 @@ def export_candidates_csv(request, pk):
         try:
             profile = cand.student.studentprofile
             phone = profile.phone
-            cv_url = request.build_absolute_uri(profile.cv.url) if profile.cv else "Aucun CV"
+            cv_url = request.build_absolute_uri(reverse('student_cv_download', args=[cand.student_id])) if profile.cv else "Aucun CV"
         except StudentProfile.DoesNotExist:
             phone = "N/A"
             cv_url = "Pas de profil"
@@ -479,4 +540,43 @@ def export_candidates_csv(request, pk):
             cv_url
         ])
 
-    return response
\ No newline at end of file
+    return response
+
+def can_view_student_cv(user, student):
+    """
+    Le CV est visible par l'étudiant lui-même, les administrateurs, et les
+    responsables / entreprises des offres auxquelles l'étudiant a candidaté.
+    """
+    if user == student or is_admin(user):
+        return True
+    candidatures = Candidature.objects.filter(student=student)
+    if user.groups.filter(name='Responsable').exists():
+        return candidatures.exists()
+    if user.groups.filter(name='Entreprise').exists():
+        return candidatures.filter(Q(offer__company=user) | Q(offer__contact_email=user.email)).exists()
+    return False
+
+# Téléchargement protégé du CV d'un étudiant
+@login_required
+def download_student_cv(request, user_id):
+    profile = get_object_or_404(StudentProfile.objects.select_related('user'), user_id=user_id)
+    if not profile.cv or not can_view_student_cv(request.user, profile.user):
+        raise Http404("CV introuvable")
+
+    extension = os.path.splitext(profile.cv.name)[1]
+    try:
+        return sendfile_response(request, profile.cv.storage, profile.cv.name, filename=f"CV_{profile.user.username}{extension}")
+    except FileNotFoundError:
+        raise Http404("CV introuvable")
+
+
+def metrics(request):
+    """Export Prometheus : réservé au staff ou au collecteur muni de METRICS_TOKEN"""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorization = request.headers.get('Authorization', '')
+    authorized = request.user.is_staff or (token and hmac.compare_digest(authorization, f'Bearer {token}'))
+    if not authorized:
+        response = HttpResponse('Authentification requise', status=401, content_type='text/plain')
+        response['WWW-Authenticate'] = 'Bearer realm="metrics"'
+        return response
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
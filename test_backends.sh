@@ -0,0 +1,14 @@
+#!/bin/bash
+
+# Lance la même suite de tests sur SQLite puis sur PostgreSQL.
+# PostgreSQL : base locale décrite par DB_NAME / DB_USER / DB_PASSWORD / DB_HOST / DB_PORT
+# (l'utilisateur doit pouvoir créer la base de test test_<DB_NAME>).
+set -e
+
+source venv/bin/activate
+
+echo "🧪 Tests sur SQLite..."
+DB_ENGINE=sqlite python manage.py test stages
+
+echo "🐘 Tests sur PostgreSQL..."
+DB_ENGINE=postgresql python manage.py test stages
@@ -5,6 +5,8 @@ import { componentTagger } from "lovable-tagger";
 
 // https://vitejs.dev/config/
 export default defineConfig(({ mode }) => ({
+  // Servi par Django sous /app/ : VITE_BASE=/app/ npm run build
+  base: process.env.VITE_BASE || "/",
   server: {
     host: "::",
     port: 8080,